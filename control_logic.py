@@ -60,6 +60,18 @@ logging.basicConfig( # configure the logging module to write mode, overwriting t
 
 logging.info("Starting control_logic.py script...\n") # log the start of the script
 
+##### set runtime mode #####
+
+HEADLESS = True # skip all HighGUI windows, preview is served over HTTP instead
+HEADLESS_LOOP_PERIOD = 0.001 # longest the headless loop waits for a new frame before handling commands
+PREVIEW_ALL_INTERFACES = False # serve the unauthenticated preview on every interface instead of only this machine, trusted networks only
+RECORD_CAMERA = False # record the camera's original JPEGs for field sessions
+RECORDING_DIRECTORY = "/home/matthewthomasbeck/Projects/Robot_Dog/recordings" # where recording sessions are written
+RUN_VISION = True # run person detection in its own process, off the control interpreter
+MODEL_XML = "/home/matthewthomasbeck/Projects/Robot_Dog/model/person-detection-0200.xml" # person detection model
+FOLLOW_PERSON = False # start in person-follow mode, channel 7 switches it on (+) and off (-)
+FOLLOW_CHANNELS = ('channel-3', 'channel-4', 'channel-5', 'channel-6') # receiver channels ignored while following
+
 
 ########## IMPORT DEPENDENCIES ##########
 
@@ -70,10 +82,22 @@ from initialize.initialize_servos import * # import servo initialization functio
 from initialize.initialize_camera import * # import camera initialization functions
 from initialize.initialize_opencv import * # import opencv initialization functions
 
+##### import vision functions #####
+
+from vision.mjpeg_splitter import * # import MJPEG frame splitter
+from vision.frame_source import * # import camera, recording and synthetic frame sources
+from vision.frame_capture import * # import camera capture thread and frame mailbox
+from vision.camera_supervisor import * # import camera supervisor
+from vision.preview_server import * # import MJPEG over HTTP preview server
+from vision.frame_recorder import * # import indexed MJPEG recorder
+from vision.qos_governor import * # import loop deadline governor
+from vision.vision_worker import * # import vision process and shared memory handoff
+
 ##### import movement functions #####
 
 from movement.standing.standing_inplace import * # import standing functions
 from movement.walking.manual_walking import * # import walking functions
+from movement.following.person_follow import * # import person-follow behavior
 
 
 
@@ -90,18 +114,40 @@ def runRobot():  # central function that runs the robot
 
     ##### set vairables #####
 
-    global CHANNEL_DATA
-    CHANNEL_DATA = {pin: 1500 for pin in PWM_PINS}  # initialize with neutral values
     decoders = []  # define decoders as empty list
     IS_NEUTRAL = False # assume robot is not in neutral standing position until neutralStandingPosition() is called
 
+    ##### start vision process #####
+
+    vision = None
+    vision_result = None # newest VisionResult from the vision process
+
+    if RUN_VISION: # fork before the camera threads exist
+
+        vision = VisionWorker(MODEL_XML, width=640, height=480).start()
+
+    follower = PersonFollower(frame_size=(640, 480)) if vision is not None else None # needs detections
+
+    if follower is not None:
+
+        follower.enable(FOLLOW_PERSON)
+
     ##### initialize camera #####
 
-    camera_process = start_camera_process(width=640, height=480, framerate=30)
+    camera = CameraSupervisor(width=640, height=480, framerate=30) # restarts rpicam-vid if it dies or stalls
+
+    try: # try to launch rpicam-vid
 
-    if camera_process is None:
+        camera.start()
+
+    except RuntimeError:
 
         logging.error("ERROR (control_logic.py): Failed to start camera process. Exiting...\n")
+
+        if vision is not None:
+
+            vision.stop()
+
         exit(1)
 
     ##### initialize PWM decoders #####
@@ -123,42 +169,111 @@ def runRobot():  # central function that runs the robot
 
         logging.error(f"ERROR (control_logic.py): Failed to move to neutral standing position in runRobot: {e}\n")
 
-    mjpeg_buffer = b''  # Initialize buffer for MJPEG frames
+    ##### start camera capture #####
+
+    recorder = FrameRecorder(RECORDING_DIRECTORY).start() if RECORD_CAMERA else None # writes on its own thread
+
+    capture = CameraCaptureThread(camera, taps=[recorder.record] if recorder else None)  # drains the camera pipe off the control thread
+    capture.start()
+
+    ##### start qos governor #####
+
+    governor = QoSGovernor(camera=camera, vision=vision) # sheds inference, decode size and then camera resolution when vision work falls behind
+
+    ##### start preview server #####
+
+    preview = None
+
+    try: # preview is optional, the robot runs without it
+
+        preview = PreviewServer(host="0.0.0.0" if PREVIEW_ALL_INTERFACES else PREVIEW_HOST, port=PREVIEW_PORT)
+        preview.add_metrics('camera', camera.stats)
+        preview.add_metrics('qos', governor.stats)
+
+        if follower is not None:
+
+            preview.add_metrics('follow', follower.stats)
+
+        preview.start()
+
+    except OSError as e:
+
+        logging.error(f"ERROR (control_logic.py): Failed to start preview server on port {PREVIEW_PORT}: {e}\n")
 
     try:
         while True:
-            # Read chunk of data from the camera process
-            chunk = camera_process.stdout.read(4096)
-            if not chunk:
+            # Stop if the camera supervisor gave up, the capture thread ends with it
+            if capture.ended:
                 logging.error("ERROR (control_logic.py): Camera process stopped sending data.")
                 break
 
-            mjpeg_buffer += chunk
+            if HEADLESS:
+                # Wake up as soon as a frame arrives, or after one loop period to handle commands
+                frame = capture.mailbox.wait(HEADLESS_LOOP_PERIOD)
+                loop_time = governor.begin_loop() # time spent waiting for a frame is not loop work
 
-            # Attempt to decode a single frame and display
-            prev_len = len(mjpeg_buffer)
-            mjpeg_buffer = decode_and_show_frame(mjpeg_buffer)
+            else:
+                # Decode and display the newest frame, never blocking the control path
+                loop_time = governor.begin_loop()
+                frame = capture.mailbox.take()
 
-            if mjpeg_buffer is None:
-                # If something went very wrong, stop
-                logging.warning("WARNING (control_logic.py): decode_and_show_frame returned None. Stopping.")
-                break
-            elif len(mjpeg_buffer) == prev_len:
-                # Means no complete JPEG was found (incomplete frame)
-                # If the buffer grows too large, reset it
-                if len(mjpeg_buffer) > 65536:
-                    logging.warning("WARNING (control_logic.py): MJPEG buffer overflow. Resetting buffer.")
-                    mjpeg_buffer = b''
-
-            # Check if 'q' was pressed in the imshow window
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                logging.info("Exiting camera feed display.")
-                break
+                if frame is not None:
+                    decode_and_show_frame(frame.data)
+
+                # Check if 'q' was pressed in the imshow window
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    logging.info("Exiting camera feed display.")
+                    break
+
+                loop_time = governor.stage("display", loop_time)
+
+            # Pass the camera's original JPEG bytes to preview clients, no decode or re-encode
+            if frame is not None and preview is not None:
+                preview.publish(frame.data)
+                loop_time = governor.stage("preview", loop_time)
+
+            # Hand the frame to the vision process and keep its newest detections, never waiting for it
+            if vision is not None:
+                if frame is not None:
+                    vision.submit(frame)
 
-            # Handle commands
-            commands = interpretCommands(CHANNEL_DATA)
+                result = vision.latest()
+                if result is not None:
+                    vision_result = result
+                    governor.result(result.completed - result.timestamp) # the work the levels shed happens in the worker
+
+                # Carry on driving by hand if the vision process died, e.g. its model failed to compile
+                if vision.failed:
+                    logging.error("ERROR (control_logic.py): Vision process died, running without vision.\n")
+                    vision.stop()
+                    vision = governor.vision = None
+
+                    if follower is not None:
+                        follower.enable(False)
+                        logging.info(f"Person follow statistics: {follower.stats()}\n")
+                        follower = None
+
+                loop_time = governor.stage("vision", loop_time)
+
+            # Steer toward the followed person at the follow rate, from the newest fresh detections
+            if follower is not None:
+                follower.update(vision_result)
+                if follower.step() is not None:
+                    IS_NEUTRAL = False
+
+                loop_time = governor.stage("follow", loop_time, budgeted=False) # servo writes, no level sheds them
+
+            # Handle commands, channel 7 switches following and the follower owns the legs while on
+            commands = interpretCommands() # debounced on the pwm edges, whatever this loop's rate
             for channel, (action, intensity) in commands.items():
-                IS_NEUTRAL = executeCommands(channel, action, intensity, IS_NEUTRAL)
+                if follower is not None and channel == 'channel-7' and action in ('+', '-'):
+                    follower.enable(action == '+')
+                elif follower is None or not follower.enabled or channel not in FOLLOW_CHANNELS:
+                    IS_NEUTRAL = executeCommands(channel, action, intensity, IS_NEUTRAL)
+            governor.stage("commands", loop_time, budgeted=False) # gaits block for seconds, no level sheds them
+
+            # Judge the vision work against its deadline, stepping quality down or back up
+            governor.end_loop()
 
     except KeyboardInterrupt:
         logging.info("KeyboardInterrupt received. Exiting...\n")
@@ -174,11 +289,29 @@ def runRobot():  # central function that runs the robot
             decoder.cancel()
 
         ##### close camera #####
-        if camera_process.poll() is None:
-            camera_process.terminate()
-            camera_process.wait()
+        camera.stop()
+        capture.stop()
+        logging.info(f"Camera capture published {capture.mailbox.published} frames, dropped {capture.mailbox.dropped}.\n")
+        logging.info(f"Camera supervisor statistics: {camera.stats()}\n")
+        logging.info(f"QoS governor statistics: {governor.stats()}\n")
+
+        if follower is not None:
+            logging.info(f"Person follow statistics: {follower.stats()}\n")
+
+        ##### close vision process #####
+        if vision is not None:
+            vision.stop()
+
+        ##### close recorder #####
+        if recorder is not None:
+            recorder.stop()
+
+        ##### close preview #####
+        if preview is not None:
+            preview.stop()
 
-        cv2.destroyAllWindows()
+        if not HEADLESS:
+            cv2.destroyAllWindows()
 
         ##### clean up GPIO and pigpio #####
         pi.stop()
@@ -188,9 +321,9 @@ def runRobot():  # central function that runs the robot
 
 ########## PWM CALLBACK ##########
 
-def pwmCallback(gpio, pulseWidth): # function to set pulse width to channel data
+def pwmCallback(gpio, pulseWidth, tick): # function to pass a pulse width and its edge tick to the debouncer
 
-    CHANNEL_DATA[gpio] = pulseWidth # set channel data to pulse width
+    recordPulse(gpio, pulseWidth, tick) # time how long the channel holds its zone
 
 
 ########## INTERPRET COMMANDS ##########
@@ -53,18 +53,34 @@ def kill_existing_camera_processes():
 
 ########## CREATE CAMERA PIPELINE ##########
 
-def start_camera_process():
+def start_camera_process(width=1280, height=720, framerate=30, codec="mjpeg", kill_existing=True):
+    """
+    Starts rpicam-vid writing to stdout. codec="mjpeg" gives a JPEG stream for
+    MJPEGSplitter, codec="yuv420" gives fixed-size raw I420 frames for YUV420Reader.
+    kill_existing clears stray camera processes first; restarts of a process we own
+    skip it. stderr is a pipe that must be drained (CameraSupervisor does this).
+    """
     try:
-        kill_existing_camera_processes()
+        if kill_existing:
+            kill_existing_camera_processes()
 
         # Optimize rpicam-vid settings
         camera_process = subprocess.Popen(
-            ["rpicam-vid", "--width", "1280", "--height", "720", "--framerate", "30", "--timeout", "0", "--output", "-", "--codec", "mjpeg", "--nopreview"],
+            [
+                "rpicam-vid",
+                "--width", str(width),
+                "--height", str(height),
+                "--framerate", str(framerate),
+                "--timeout", "0",
+                "--output", "-",
+                "--codec", codec,
+                "--nopreview"
+            ],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             bufsize=0
         )
-        logging.info("Camera process started successfully with rpicam-vid.")
+        logging.info(f"Camera process started successfully with rpicam-vid ({width}x{height} {codec}).")
         return camera_process
     except Exception as e:
         logging.error(f"ERROR (initialize_camera.py): Failed to start camera process: {e}\n")
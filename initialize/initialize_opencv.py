@@ -18,101 +18,274 @@
 
 ########## IMPORT DEPENDENCIES ##########
 
-from openvino.runtime import Core
+from openvino.runtime import Core, Layout, Type, get_version
+from openvino.preprocess import PrePostProcessor, ResizeAlgorithm, ColorFormat
 import numpy as np
 import cv2
-import subprocess
+import collections
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+
+from initialize.initialize_camera import start_camera_process # single rpicam-vid launcher, used by RpicamFrameSource
+
+
+########## CREATE DEPENDENCIES ##########
+
+MODEL_DEVICE_PRIORITY = ("MYRIAD", "CPU") # devices tried in order when the requested one is missing or fails
+MODEL_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model") # IRs, variant paths are relative to it
+MODEL_CACHE_DIRECTORY = os.path.join(MODEL_DIRECTORY, "cache") # compiled blobs
+MODEL_HASH_CHUNK = 1 << 20 # bytes hashed at a time
+
+# IRs for the same person detection task; xml is relative to MODEL_DIRECTORY, input_size is (width, height).
+# Variants besides the checked-in one follow the Open Model Zoo downloader layout and are only used once downloaded.
+ModelVariant = collections.namedtuple('ModelVariant', ['name', 'xml', 'precision', 'input_size'])
+MODEL_VARIANTS = {variant.name: variant for variant in (
+    ModelVariant("person-detection-0200", "person-detection-0200.xml", "FP16", (256, 256)), # checked in, runs on the NCS2
+    ModelVariant("person-detection-0200-fp32", "intel/person-detection-0200/FP32/person-detection-0200.xml", "FP32", (256, 256)),
+    ModelVariant("person-detection-0200-int8", "intel/person-detection-0200/FP16-INT8/person-detection-0200.xml", "FP16-INT8", (256, 256)),
+    ModelVariant("person-detection-0201", "intel/person-detection-0201/FP16/person-detection-0201.xml", "FP16", (384, 384)),
+    ModelVariant("person-detection-0202", "intel/person-detection-0202/FP16/person-detection-0202.xml", "FP16", (512, 512)),
+)}
+MODEL_REFERENCE_VARIANT = "person-detection-0200" # variant the others are compared against
 
 
 ########## FUNCTION DEFINITIONS ##########
 
-def start_camera_process(width=640, height=480, framerate=30):
+def model_variant_path(model):
     """
-    Starts the rpicam-vid process to output MJPEG data via stdout.
-    Returns the Popen object (camera_process).
+    Resolves a MODEL_VARIANTS name to the absolute path of its IR. Anything else is taken
+    to be a path to an .xml already and returned unchanged.
     """
-    try:
-        camera_process = subprocess.Popen(
-            [
-                "rpicam-vid",
-                "--width", str(width),
-                "--height", str(height),
-                "--framerate", str(framerate),
-                "--timeout", "0",
-                "--output", "-",
-                "--codec", "mjpeg",
-                "--nopreview"
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=0
-        )
-        return camera_process
-    except Exception as e:
-        print(f"ERROR (initialize_opencv.py): Failed to start camera process: {e}\n")
-        return None
+    variant = MODEL_VARIANTS.get(model)
+    return os.path.join(MODEL_DIRECTORY, variant.xml) if variant is not None else model
+
+
+def available_model_variants():
+    """
+    Returns the names of the MODEL_VARIANTS whose IR (.xml and .bin) is on disk, in
+    registry order.
+    """
+    available = []
+    for name in MODEL_VARIANTS:
+        xml_path = model_variant_path(name)
+        if os.path.exists(xml_path) and os.path.exists(os.path.splitext(xml_path)[0] + ".bin"):
+            available.append(name)
+    return available
+
+
+def bake_preprocessing(model, frame_size):
+    """
+    Moves the per-frame preprocessing into the model graph with PrePostProcessor: the
+    compiled model takes a decoded uint8 BGR frame, [1, height, width, 3], and converts it
+    to float, to RGB, to the model input size and to NCHW on the device.
+    Returns the model with preprocessing added.
+    """
+    width, height = frame_size
+    ppp = PrePostProcessor(model)
+    ppp.input().tensor() \
+        .set_element_type(Type.u8) \
+        .set_layout(Layout("NHWC")) \
+        .set_color_format(ColorFormat.BGR) \
+        .set_spatial_static_shape(height, width)
+    ppp.input().preprocess() \
+        .convert_element_type(Type.f32) \
+        .convert_color(ColorFormat.RGB) \
+        .resize(ResizeAlgorithm.RESIZE_LINEAR)
+    ppp.input().model().set_layout(Layout("NCHW"))
+    return ppp.build()
+
+
+def reshape_batch(model, batch_size):
+    """
+    Reshapes the model input to a batch of batch_size images, keeping the rest of its
+    shape. person-detection-0200 then reports the detections of every image in one
+    [1, 1, batch_size * 200, 7] output, told apart by the image_id column.
+    Returns the model, reshaped in place.
+    """
+    shape = model.input(0).get_partial_shape()
+    shape[0] = batch_size
+    model.reshape(shape)
+    return model
+
+
+def model_cache_key(model_xml_path, device_name, frame_size=None, batch_size=1, config=None):
+    """
+    Names the compiled blob of a model: a hash of the IR (.xml and .bin), of the baked
+    preprocessing, of the batch size and of the plugin config, the device and the
+    OpenVINO version, so any change recompiles.
+    Returns the blob file name without directory.
+    """
+    digest = hashlib.sha256()
+    for path in (model_xml_path, model_xml_path.replace(".xml", ".bin")):
+        with open(path, "rb") as model_file:
+            for chunk in iter(lambda: model_file.read(MODEL_HASH_CHUNK), b""):
+                digest.update(chunk)
+    digest.update(repr(frame_size).encode())
+    if batch_size != 1: # keep the keys of existing single image blobs
+        digest.update(f"batch={batch_size}".encode())
+    if config: # a blob compiled with other plugin properties must not be imported for these
+        digest.update(f"config={sorted(config.items())!r}".encode())
+    name = os.path.splitext(os.path.basename(model_xml_path))[0]
+    version = re.sub(r"[^A-Za-z0-9.]+", "_", get_version())
+    return f"{name}-{device_name}-{version}-{digest.hexdigest()[:16]}.blob"
 
 
-def load_and_compile_model(model_xml_path, device_name="MYRIAD"):
+def compile_on_device(ie, model_xml_path, device_name, frame_size, cache_directory, timings, batch_size=1, config=None):
     """
-    Loads and compiles an OpenVINO model.
-    Returns compiled_model, input_layer, output_layer.
+    Imports the model's compiled blob from the cache, or reads and compiles the IR and
+    stores the blob for the next launch. Raises if the device cannot take the model.
+    Returns the compiled model.
     """
+    blob_path = None
+    if cache_directory is not None:
+        blob_path = os.path.join(cache_directory, model_cache_key(model_xml_path, device_name, frame_size, batch_size, config))
+
+        if os.path.exists(blob_path):
+            start = time.perf_counter()
+            try:
+                with open(blob_path, "rb") as blob_file:
+                    compiled_model = ie.import_model(io.BytesIO(blob_file.read()), device_name, config or {})
+                timings['import_ms'] = (time.perf_counter() - start) * 1000
+                timings['cache_hit'] = True
+                return compiled_model
+            except Exception as e: # if the blob is corrupt or the plugin changed...
+                print(f"WARNING (initialize_opencv.py): Discarding cached blob {blob_path}: {e}")
+                os.remove(blob_path)
+
+    start = time.perf_counter()
+    model = ie.read_model(model=model_xml_path)
+    if batch_size != 1:
+        model = reshape_batch(model, batch_size)
+    if frame_size is not None:
+        model = bake_preprocessing(model, frame_size)
+    timings['read_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    compiled_model = ie.compile_model(model=model, device_name=device_name, config=config or {})
+    timings['compile_ms'] = (time.perf_counter() - start) * 1000
+    timings['cache_hit'] = False
+
+    if blob_path is not None:
+        temporary_path = f"{blob_path}.{os.getpid()}.tmp" # processes compiling the same model at once never share a file
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+            blob = compiled_model.export_model()
+            if isinstance(blob, io.BytesIO): # newer OpenVINO releases return a stream instead of bytes
+                blob = blob.getvalue()
+            with open(temporary_path, "wb") as blob_file:
+                blob_file.write(blob)
+            os.replace(temporary_path, blob_path) # never leave a half written blob behind
+        except Exception as e: # if the plugin cannot export, just compile every launch
+            print(f"WARNING (initialize_opencv.py): Could not cache compiled model: {e}")
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    return compiled_model
+
+
+def load_and_compile_model(model_xml_path, device_name="MYRIAD", frame_size=None,
+                           cache_directory=MODEL_CACHE_DIRECTORY, timings=None, batch_size=1, config=None):
+    """
+    Loads and compiles an OpenVINO model, trying device_name first and then the rest of
+    MODEL_DEVICE_PRIORITY. model_xml_path is a path to the IR or a MODEL_VARIANTS name.
+    Compiled blobs are cached in cache_directory (None disables the cache), so a warm
+    launch only imports the blob.
+    With frame_size=(width, height) the preprocessing is baked into the model, which then
+    takes decoded uint8 BGR frames of that size (see bake_preprocessing).
+    With batch_size > 1 the model takes that many images per request (see reshape_batch),
+    e.g. the tiles of one frame.
+    config, if given, holds plugin properties for compiling or importing, e.g.
+    {"INFERENCE_NUM_THREADS": 1} for one of several CPU models sharing the cores.
+    timings, if given, is filled with device, cache_hit, read_ms, compile_ms or import_ms
+    and total_ms.
+    Returns compiled_model, input_layer, output_layer, or three Nones if no device works.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    model_xml_path = model_variant_path(model_xml_path)
     ie = Core()
-    try:
-        model_bin_path = model_xml_path.replace(".xml", ".bin")
-        model = ie.read_model(model=model_xml_path)
-        compiled_model = ie.compile_model(model=model, device_name=device_name)
+    available = {device.split(".")[0] for device in ie.available_devices} # MYRIAD.1.2-ma2480 -> MYRIAD
+    devices = [device_name] + [device for device in MODEL_DEVICE_PRIORITY if device != device_name]
+
+    for device in devices:
+        if device not in available:
+            print(f"WARNING (initialize_opencv.py): {device} not found, trying the next device.")
+            continue
+
+        try:
+            compiled_model = compile_on_device(ie, model_xml_path, device, frame_size, cache_directory, timings, batch_size, config)
+        except Exception as e:
+            print(f"ERROR (initialize_opencv.py): Failed to load/compile model on {device}: {e}\n")
+            continue
+
         input_layer = compiled_model.input(0)
         output_layer = compiled_model.output(0)
-        print(f"Model loaded and compiled on {device_name}.")
+        timings['device'] = device
+        timings['total_ms'] = (time.perf_counter() - start) * 1000
+        source = "cached blob" if timings['cache_hit'] else "IR"
+        print(f"Model loaded and compiled on {device} from {source} in {timings['total_ms']:.0f} ms.")
         print(f"Model input shape: {input_layer.shape}")
         return compiled_model, input_layer, output_layer
-    except Exception as e:
-        print(f"ERROR (initialize_opencv.py): Failed to load/compile model: {e}\n")
-        return None, None, None
+
+    print(f"ERROR (initialize_opencv.py): Failed to load/compile model on any of {devices}.\n")
+    return None, None, None
 
 
 def test_with_dummy_input(compiled_model, input_layer, output_layer):
     """
     Sends dummy input to the compiled model to ensure it works.
+    Returns True if inference ran.
     """
     if compiled_model is None or input_layer is None or output_layer is None:
         print("ERROR (initialize_opencv.py): Model is not properly initialized.\n")
-        return
+        return False
 
     try:
         dummy_input_shape = input_layer.shape
-        dummy_input = np.ones(dummy_input_shape, dtype=np.float32)
-        _ = compiled_model([dummy_input])[output_layer]  # Just run inference to test
+        dummy_input = np.ones(dummy_input_shape, dtype=input_layer.get_element_type().to_dtype())
+        request = compiled_model.create_infer_request() # own request, safe next to the inference loop's
+        request.infer({0: dummy_input})  # Just run inference to test
         print("Dummy input test passed!")
+        return True
     except Exception as e:
         print(f"ERROR (initialize_opencv.py): Dummy input test failed: {e}\n")
+        return False
+
+
+def start_model_warm_up(compiled_model, input_layer, output_layer, timings=None):
+    """
+    Runs the dummy input test on a background thread, so the first inference on MYRIAD
+    (which uploads the graph) overlaps with camera startup instead of delaying it.
+    timings, if given, gets warm_up_ms and warm_up_passed.
+    Returns the thread; join it before relying on the model.
+    """
+    timings = {} if timings is None else timings
+
+    def warm_up():
+        start = time.perf_counter()
+        timings['warm_up_passed'] = test_with_dummy_input(compiled_model, input_layer, output_layer)
+        timings['warm_up_ms'] = (time.perf_counter() - start) * 1000
+
+    thread = threading.Thread(target=warm_up, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 
-def decode_and_show_frame(mjpeg_buffer):
-    """
-    Attempts to extract a JPEG from mjpeg_buffer, decode it, and display it.
-    Returns the updated buffer after extracting a frame, or None if decoding fails.
-    """
-    # Look for JPEG frame markers
-    start_idx = mjpeg_buffer.find(b'\xff\xd8')  # JPEG start
-    end_idx = mjpeg_buffer.find(b'\xff\xd9')    # JPEG end
-
-    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-        # Extract the JPEG data
-        frame_data = mjpeg_buffer[start_idx:end_idx + 2]
-        updated_buffer = mjpeg_buffer[end_idx + 2:]  # remove the processed frame
-        # Decode
-        frame = cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), cv2.IMREAD_COLOR)
-        if frame is not None:
-            # Display
-            cv2.imshow("Robot Camera", frame)
-            return updated_buffer
-        else:
-            # Decoding failed, return updated buffer but log a warning
-            print("WARNING (initialize_opencv.py): Failed to decode frame.")
-            return updated_buffer
+def decode_and_show_frame(frame_data):
+    """
+    Decodes a single JPEG frame handed out by MJPEGSplitter and displays it.
+    Returns the decoded frame, or None if decoding fails.
+    """
+    frame = cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is not None:
+        # Display
+        cv2.imshow("Robot Camera", frame)
+        return frame
     else:
-        # No complete frame found; return existing buffer
-        return mjpeg_buffer
+        # Decoding failed, log a warning so the caller can skip this frame
+        print("WARNING (initialize_opencv.py): Failed to decode frame.")
+        return None
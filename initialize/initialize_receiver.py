@@ -20,31 +20,17 @@
 
 ##### control libraries #####
 
-import pigpio # import pigpio library for PWM control
-import time # import time library for time functions
+import collections # import collections for the channel spec record
+import pigpio # import pigpio library for PWM control and edge tick arithmetic
 
 
 ########## CREATE DEPENDENCIES ##########
 
-##### set counters and timestamps for each channel #####
-
-CHANNEL_COUNTERS = { # set channel counters to 0 for channel requests with channel intensity
-
-    'channel-0': 0, 'channel-1': 0, 'channel-2': 0, 'channel-3': 0,
-    'channel-4': 0, 'channel-5': 0, 'channel-6': 0, 'channel-7': 0,
-}
-
-CHANNEL_TIMESTAMPS = { # set channel timestamps to current time for channel requests
-
-    'channel-0': time.time(), 'channel-1': time.time(), 'channel-2': time.time(), 'channel-3': time.time(),
-    'channel-4': time.time(), 'channel-5': time.time(), 'channel-6': time.time(), 'channel-7': time.time()
-}
-
 ##### channel registry hyperparameters #####
 
-JOYSTICK_THRESHOLD = 40 # number of times condition must be met to trigger a request on a joystick channel
-TOGGLE_THRESHOLD = 40 # number of times condition must be met to trigger a request on a button channel
-TIME_FRAME = 0.10017 # time frame for condition to be met, default: 0.100158
+JOYSTICK_HOLD_MS = 60 # milliseconds a joystick must hold a zone to fire, it fires again every JOYSTICK_HOLD_MS while held
+TOGGLE_HOLD_MS = 100 # milliseconds a switch must hold a position to fire, it fires again every TOGGLE_HOLD_MS while held
+PULSE_GAP_MS = 100 # a longer gap between pulses means the signal dropped out and restarts the hold
 DEADBAND_HIGH = 1600 # deadband high for PWM signal
 DEADBAND_LOW = 1400 # deadband low for PWM signal
 
@@ -76,6 +62,44 @@ PWM_PINS = [ # define PWM pins
     extraChannel7, # default: 26
 ]
 
+##### channel spec table #####
+
+# kind is 'joystick' (intensity 1-10, neutral zone reported) or 'toggle' (intensity 0, neutral zone ignored), low, neutral
+# and high are the actions for a pulse below, inside and above the deadband (None ignores it), hold_ms the debounce time
+ChannelSpec = collections.namedtuple('ChannelSpec', ['name', 'pin', 'kind', 'low', 'neutral', 'high', 'hold_ms'])
+
+CHANNEL_SPECS = (
+
+    ChannelSpec('channel-0', tiltUpDownChannel0, 'toggle', 'TILT DOWN', None, 'TILT UP', TOGGLE_HOLD_MS),
+    ChannelSpec('channel-1', triggerShootChannel1, 'toggle', 'NEUTRAL', None, 'TRIGGER SHOOT', TOGGLE_HOLD_MS),
+    ChannelSpec('channel-2', squatUpDownChannel2, 'toggle', 'SQUAT DOWN', None, 'SQUAT UP', TOGGLE_HOLD_MS),
+    ChannelSpec('channel-3', rotateLeftRightChannel3, 'joystick', 'ROTATE LEFT', 'NEUTRAL', 'ROTATE RIGHT', JOYSTICK_HOLD_MS),
+    ChannelSpec('channel-4', lookUpDownChannel4, 'joystick', 'LOOK DOWN', 'NEUTRAL', 'LOOK UP', JOYSTICK_HOLD_MS),
+    ChannelSpec('channel-5', moveForwardBackwardChannel5, 'joystick', 'MOVE FORWARD', 'NEUTRAL', 'MOVE BACKWARD', JOYSTICK_HOLD_MS),
+    ChannelSpec('channel-6', shiftLeftRightChannel6, 'joystick', 'SHIFT LEFT', 'NEUTRAL', 'SHIFT RIGHT', JOYSTICK_HOLD_MS),
+    ChannelSpec('channel-7', extraChannel7, 'toggle', '+', None, '-', TOGGLE_HOLD_MS),
+)
+
+##### interpreter table and per-channel state #####
+
+# one flat row per channel, unpacked straight into loop variables: index, name, pin, (low, neutral, high) actions,
+# joystick flag and hold time in microseconds, the unit of pigpio edge ticks
+CHANNEL_TABLE = tuple(
+    (index, spec.name, spec.pin, (spec.low, spec.neutral, spec.high), spec.kind == 'joystick', spec.hold_ms * 1000)
+    for index, spec in enumerate(CHANNEL_SPECS)
+)
+CHANNEL_ROWS = {row[2]: row for row in CHANNEL_TABLE} # pin -> table row, for the edge callback
+
+# written by recordPulse() on the pigpio callback thread, by channel index
+CHANNEL_ZONES = [1] * len(CHANNEL_SPECS) # zone of the latest pulse: 0 below, 1 inside, 2 above the deadband
+CHANNEL_HOLD_STARTS = [0] * len(CHANNEL_SPECS) # edge tick of the first pulse in the current zone
+CHANNEL_LAST_TICKS = [None] * len(CHANNEL_SPECS) # edge tick of the latest pulse
+CHANNEL_NEXT_FIRES = [0] * len(CHANNEL_SPECS) # microseconds held at which the channel fires next
+CHANNEL_FIRED = [(0, None, 0)] * len(CHANNEL_SPECS) # (fire count, action, intensity) of the latest fire, replaced whole
+
+# read by interpretCommands() on the control thread
+CHANNEL_SEEN = [0] * len(CHANNEL_SPECS) # fire count last turned into a command
+
 
 
 
@@ -105,12 +129,14 @@ class PWMDecoder: # class to decode PWM signals
 
     def _cbf(self, gpio, level, tick): # function to decode pwm signal
 
-        if self.last_tick is not None: # if last tick is not None...
+        if level == 1: # rising edge starts a pulse
 
-            self.tick = tick # set tick
-            self.callback(gpio, tick - self.last_tick) # call callback with gpio and tick - last tick
+            self.last_tick = tick # set last tick to tick
 
-        self.last_tick = tick # set last tick to tick
+        elif level == 0 and self.last_tick is not None: # falling edge ends it, the time since the rising edge is the pulse width
+
+            self.tick = tick # set tick
+            self.callback(gpio, pigpio.tickDiff(self.last_tick, tick), tick) # call callback with gpio, pulse width and edge tick
 
     ##### cancel PWM signal decoding #####
 
@@ -133,232 +159,59 @@ def getJoystickIntensity(pulse_width, min_val, max_val): # return a value from 1
     return max(1, min(intensity, 10))  # Ensure value is between 1-10
 
 
+########## PULSE DEBOUNCER ##########
+
+def recordPulse(gpio, pulse_width, tick): # function to time how long a channel holds its zone from pwm edge ticks, firing once held long enough
+
+    index, name, pin, actions, joystick, hold = CHANNEL_ROWS[gpio]
+    zone = 0 if pulse_width < DEADBAND_LOW else (2 if pulse_width > DEADBAND_HIGH else 1)
+    last_tick = CHANNEL_LAST_TICKS[index]
+    CHANNEL_LAST_TICKS[index] = tick
+
+    ##### a new zone, or the signal dropped out, starts a new hold #####
+
+    if zone != CHANNEL_ZONES[index] or last_tick is None or pigpio.tickDiff(last_tick, tick) > PULSE_GAP_MS * 1000:
+
+        CHANNEL_ZONES[index] = zone
+        CHANNEL_HOLD_STARTS[index] = tick
+        CHANNEL_NEXT_FIRES[index] = hold
+
+    action = actions[zone]
+
+    if action is None: # toggle channel resting in the deadband
+
+        return
+
+    ##### fire once held long enough, then every hold while held #####
+
+    held = pigpio.tickDiff(CHANNEL_HOLD_STARTS[index], tick) # microseconds, wraps with the 32-bit tick
+
+    if held >= CHANNEL_NEXT_FIRES[index]:
+
+        CHANNEL_NEXT_FIRES[index] = held + hold # counted from this pulse, so a late pulse never fires a burst
+        intensity = getJoystickIntensity(pulse_width, DEADBAND_LOW, DEADBAND_HIGH) if joystick and zone != 1 else 0
+        CHANNEL_FIRED[index] = (CHANNEL_FIRED[index][0] + 1, action, intensity) # one assignment, the control thread never sees half of it
+
+
 ########## COMMAND INTERPRETER ##########
 
-def interpretCommands(channel_data): # function to interpret commands from PWM signal data
-
-    ##### set variables #####
-
-    commands = { # create dictionary of commands
-
-        'channel-0': ('NEUTRAL', 0), # set channel 0 to neutral for silence
-        'channel-1': ('NEUTRAL', 0), # set channel 1 to neutral for silence
-        'channel-2': ('NEUTRAL', 0), # set channel 2 to neutral for silence
-        'channel-7':  ('NEUTRAL', 0), # set channel 7 to neutral for silence
-    }
-
-    current_time = time.time() # set current time to current time
-
-    ##### tilt channel 0 #####
-
-    if channel_data[tiltUpDownChannel0] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-0'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-0'] = 0
-        CHANNEL_COUNTERS['channel-0'] += 1
-        CHANNEL_TIMESTAMPS['channel-0'] = current_time
-        if CHANNEL_COUNTERS['channel-0'] >= TOGGLE_THRESHOLD:
-            commands['channel-0'] = ('TILT DOWN', 0)
-            CHANNEL_COUNTERS['channel-0'] = 0
-    elif channel_data[tiltUpDownChannel0] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-0'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-0'] = 0
-        CHANNEL_COUNTERS['channel-0'] += 1
-        CHANNEL_TIMESTAMPS['channel-0'] = current_time
-        if CHANNEL_COUNTERS['channel-0'] >= TOGGLE_THRESHOLD:
-            commands['channel-0'] = ('TILT UP', 0)
-            CHANNEL_COUNTERS['channel-0'] = 0
-
-    ##### trigger channel 1 #####
-
-    if channel_data[triggerShootChannel1] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-1'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-1'] = 0
-        CHANNEL_COUNTERS['channel-1'] += 1
-        CHANNEL_TIMESTAMPS['channel-1'] = current_time
-        if CHANNEL_COUNTERS['channel-1'] >= TOGGLE_THRESHOLD:
-            commands['channel-1'] = ('NEUTRAL', 0)
-            CHANNEL_COUNTERS['channel-1'] = 0
-    elif channel_data[triggerShootChannel1] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-1'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-1'] = 0
-        CHANNEL_COUNTERS['channel-1'] += 1
-        CHANNEL_TIMESTAMPS['channel-1'] = current_time
-        if CHANNEL_COUNTERS['channel-1'] >= TOGGLE_THRESHOLD:
-            commands['channel-1'] = ('TRIGGER SHOOT', 0)
-            CHANNEL_COUNTERS['channel-1'] = 0
-
-    ##### squat channel 2 #####
-
-    if channel_data[squatUpDownChannel2] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-2'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-2'] = 0
-        CHANNEL_COUNTERS['channel-2'] += 1
-        CHANNEL_TIMESTAMPS['channel-2'] = current_time
-        if CHANNEL_COUNTERS['channel-2'] >= TOGGLE_THRESHOLD:
-            commands['channel-2'] = ('SQUAT DOWN', 0)
-            CHANNEL_COUNTERS['channel-2'] = 0
-    elif channel_data[squatUpDownChannel2] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-2'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-2'] = 0
-        CHANNEL_COUNTERS['channel-2'] += 1
-        CHANNEL_TIMESTAMPS['channel-2'] = current_time
-        if CHANNEL_COUNTERS['channel-2'] >= TOGGLE_THRESHOLD:
-            commands['channel-2'] = ('SQUAT UP', 0)
-            CHANNEL_COUNTERS['channel-2'] = 0
-
-    ##### rotation channel 3 #####
-
-    if channel_data[rotateLeftRightChannel3] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-3'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-3'] = 0
-        CHANNEL_COUNTERS['channel-3'] += 1
-        CHANNEL_TIMESTAMPS['channel-3'] = current_time
-
-        if CHANNEL_COUNTERS['channel-3'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[rotateLeftRightChannel3], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-3'] = ('MOVE FORWARD', intensity)
-            CHANNEL_COUNTERS['channel-3'] = 0
-
-    elif DEADBAND_LOW <= channel_data[rotateLeftRightChannel3] <= DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-3'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-3'] = 0
-        CHANNEL_COUNTERS['channel-3'] += 1
-        CHANNEL_TIMESTAMPS['channel-3'] = current_time
-
-        if CHANNEL_COUNTERS['channel-3'] >= JOYSTICK_THRESHOLD:
-            commands['channel-3'] = ('NEUTRAL', 0)
-            CHANNEL_COUNTERS['channel-3'] = 0
-
-    elif channel_data[rotateLeftRightChannel3] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-3'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-3'] = 0
-        CHANNEL_COUNTERS['channel-3'] += 1
-        CHANNEL_TIMESTAMPS['channel-3'] = current_time
-
-        if CHANNEL_COUNTERS['channel-3'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[rotateLeftRightChannel3], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-3'] = ('MOVE BACKWARD', intensity)
-            CHANNEL_COUNTERS['channel-3'] = 0
-
-    ##### look channel 4 #####
-
-    if channel_data[lookUpDownChannel4] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-4'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-4'] = 0
-        CHANNEL_COUNTERS['channel-4'] += 1
-        CHANNEL_TIMESTAMPS['channel-4'] = current_time
-
-        if CHANNEL_COUNTERS['channel-4'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[lookUpDownChannel4], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-4'] = ('MOVE FORWARD', intensity)
-            CHANNEL_COUNTERS['channel-4'] = 0
-
-    elif DEADBAND_LOW <= channel_data[lookUpDownChannel4] <= DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-4'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-4'] = 0
-        CHANNEL_COUNTERS['channel-4'] += 1
-        CHANNEL_TIMESTAMPS['channel-4'] = current_time
-
-        if CHANNEL_COUNTERS['channel-4'] >= JOYSTICK_THRESHOLD:
-            commands['channel-4'] = ('NEUTRAL', 0)
-            CHANNEL_COUNTERS['channel-4'] = 0
-
-    elif channel_data[lookUpDownChannel4] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-4'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-4'] = 0
-        CHANNEL_COUNTERS['channel-4'] += 1
-        CHANNEL_TIMESTAMPS['channel-4'] = current_time
-
-        if CHANNEL_COUNTERS['channel-4'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[lookUpDownChannel4], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-4'] = ('MOVE BACKWARD', intensity)
-            CHANNEL_COUNTERS['channel-4'] = 0
-
-    ##### move channel 5 #####
-
-    if channel_data[moveForwardBackwardChannel5] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-5'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-5'] = 0
-        CHANNEL_COUNTERS['channel-5'] += 1
-        CHANNEL_TIMESTAMPS['channel-5'] = current_time
-
-        if CHANNEL_COUNTERS['channel-5'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[moveForwardBackwardChannel5], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-5'] = ('MOVE FORWARD', intensity)
-            CHANNEL_COUNTERS['channel-5'] = 0
-
-    elif DEADBAND_LOW <= channel_data[moveForwardBackwardChannel5] <= DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-5'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-5'] = 0
-        CHANNEL_COUNTERS['channel-5'] += 1
-        CHANNEL_TIMESTAMPS['channel-5'] = current_time
-
-        if CHANNEL_COUNTERS['channel-5'] >= JOYSTICK_THRESHOLD:
-            commands['channel-5'] = ('NEUTRAL', 0)
-            CHANNEL_COUNTERS['channel-5'] = 0
-
-    elif channel_data[moveForwardBackwardChannel5] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-5'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-5'] = 0
-        CHANNEL_COUNTERS['channel-5'] += 1
-        CHANNEL_TIMESTAMPS['channel-5'] = current_time
-
-        if CHANNEL_COUNTERS['channel-5'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[moveForwardBackwardChannel5], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-5'] = ('MOVE BACKWARD', intensity)
-            CHANNEL_COUNTERS['channel-5'] = 0
-
-    ##### shift channel 6 #####
-
-    if channel_data[shiftLeftRightChannel6] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-6'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-6'] = 0
-        CHANNEL_COUNTERS['channel-6'] += 1
-        CHANNEL_TIMESTAMPS['channel-6'] = current_time
-
-        if CHANNEL_COUNTERS['channel-6'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[shiftLeftRightChannel6], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-6'] = ('MOVE LEFT', intensity)
-            CHANNEL_COUNTERS['channel-6'] = 0
-
-    elif DEADBAND_LOW <= channel_data[shiftLeftRightChannel6] <= DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-6'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-6'] = 0
-        CHANNEL_COUNTERS['channel-6'] += 1
-        CHANNEL_TIMESTAMPS['channel-6'] = current_time
-
-        if CHANNEL_COUNTERS['channel-6'] >= JOYSTICK_THRESHOLD:
-            commands['channel-6'] = ('NEUTRAL', 0)
-            CHANNEL_COUNTERS['channel-6'] = 0
-
-    elif channel_data[shiftLeftRightChannel6] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-6'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-6'] = 0
-        CHANNEL_COUNTERS['channel-6'] += 1
-        CHANNEL_TIMESTAMPS['channel-6'] = current_time
-
-        if CHANNEL_COUNTERS['channel-6'] >= JOYSTICK_THRESHOLD:
-            intensity = getJoystickIntensity(channel_data[shiftLeftRightChannel6], DEADBAND_LOW, DEADBAND_HIGH)
-            commands['channel-6'] = ('MOVE RIGHT', intensity)
-            CHANNEL_COUNTERS['channel-6'] = 0
-
-    ##### extra channel 7 #####
-
-    if channel_data[extraChannel7] < DEADBAND_LOW:
-        if current_time - CHANNEL_TIMESTAMPS['channel-7'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-7'] = 0
-        CHANNEL_COUNTERS['channel-7'] += 1
-        CHANNEL_TIMESTAMPS['channel-7'] = current_time
-        if CHANNEL_COUNTERS['channel-7'] >= TOGGLE_THRESHOLD:
-            commands['channel-7'] = ('+', 0)
-            CHANNEL_COUNTERS['channel-7'] = 0
-    elif channel_data[extraChannel7] > DEADBAND_HIGH:
-        if current_time - CHANNEL_TIMESTAMPS['channel-7'] > TIME_FRAME:
-            CHANNEL_COUNTERS['channel-7'] = 0
-        CHANNEL_COUNTERS['channel-7'] += 1
-        CHANNEL_TIMESTAMPS['channel-7'] = current_time
-        if CHANNEL_COUNTERS['channel-7'] >= TOGGLE_THRESHOLD:
-            commands['channel-7'] = ('-', 0)
-            CHANNEL_COUNTERS['channel-7'] = 0
+def interpretCommands(): # function to collect the commands fired since the last call
+
+    ##### latency is set by the hold times and pwm edges, not by how often this runs #####
+
+    commands = {} # only channels that fired since the last pass
+    fired = CHANNEL_FIRED # local names, looked up once per pass instead of once per channel
+    seen = CHANNEL_SEEN
+
+    ##### evaluate all channels in one pass #####
+
+    for index, name, pin, actions, joystick, hold in CHANNEL_TABLE:
+
+        count, action, intensity = fired[index]
+
+        if count != seen[index]: # fired at least once since the last pass, the newest fire wins
+
+            seen[index] = count
+            commands[name] = (action, intensity)
 
     return commands # return channel requests
@@ -168,6 +168,28 @@ def setTarget(channel, target, speed, acceleration): # function to set target po
         logging.error("ERROR (initialize_servos.py): Failed to move servo.\n") # print failure statement
 
 
+########## MOVE SEVERAL SERVOS ##########
+
+def setTargets(targets): # function to set target positions of several servos in one serial write
+
+    ##### send only target commands, servos keep the speed and acceleration they were last given #####
+
+    try: # attempt to move desired servos
+
+        command = bytearray()
+
+        for channel, target in targets.items(): # 4 bytes per servo instead of setTarget's 12, which matters at 9600 baud
+
+            target = int(round(target * 4)) # convert target from microseconds to quarter-microseconds
+            command += bytearray([0x84, channel, target & 0x7F, (target >> 7) & 0x7F])
+
+        MAESTRO.write(command)
+
+    except: # if movement failed...
+
+        logging.error("ERROR (initialize_servos.py): Failed to move servos.\n") # print failure statement
+
+
 ########## MOVE LEG ##########
 
 def moveLeg(leg_name, target_x, target_y, target_z, min_speed, min_acceleration):
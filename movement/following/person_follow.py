@@ -0,0 +1,311 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import collections # import collections for command records and latency history
+import threading # import threading to guard the statistics the preview thread reads
+import time # import time for the control rate and latency
+import logging # import logging for debugging
+import numpy as np # import numpy for box math and latency percentiles
+
+##### import necessary functions #####
+
+import initialize.initialize_servos as initialize_servos # import servo logic functions
+from vision.detection_postprocess import detection_boxes, iou_matrix # import box helpers
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### follow command record #####
+
+# yaw is -1 (turn right) to 1 (turn left), forward is -1 (back off) to 1 (close in), sequence is the camera frame
+# the command came from and latency the seconds from that frame's capture to the servo command being written
+FollowCommand = collections.namedtuple('FollowCommand', ['yaw', 'forward', 'sequence', 'latency'])
+
+##### follow hyperparameters #####
+
+FOLLOW_RATE = 20 # control ticks per second
+FOLLOW_STALE_AFTER = 0.3 # seconds after capture a detection is too old to steer by
+FOLLOW_TARGET_HEIGHT = 0.6 # box height, as a fraction of the frame height, at the distance to keep
+FOLLOW_YAW_GAIN = 1.5 # yaw per unit of horizontal offset, the offset runs from -1 at the left edge to 1 at the right edge
+FOLLOW_FORWARD_GAIN = 2.0 # forward per unit of box height error
+FOLLOW_DEADBAND = 0.05 # offsets and height errors below this count as on target
+FOLLOW_LOCK_IOU = 0.3 # smallest IoU with the last target box to keep following the same person
+FOLLOW_LATENCY_HISTORY = 300 # latencies kept for the metrics
+
+##### follow pose #####
+
+FOLLOW_YAW_SWING = 0.3 # fraction of each hip's range from neutral used at full yaw
+FOLLOW_LEAN_SWING = 0.2 # fraction of each upper leg's range from neutral used at full forward
+FOLLOW_YAW_SIGNS = {'FL': 1, 'FR': -1, 'BL': -1, 'BR': 1} # hip direction per leg that twists the body left
+
+
+
+
+
+#######################################################
+############### PERSON FOLLOW MOVEMENTS ###############
+#######################################################
+
+
+########## FOLLOW POSE ##########
+
+def jointTarget(config, amount): # function to return a joint position amount (-1 to 1) of the way from neutral to full front or full back
+
+    end = config['FULL_FRONT'] if amount >= 0 else config['FULL_BACK']
+
+    return config['NEUTRAL'] + abs(amount) * (end - config['NEUTRAL'])
+
+
+def followPose(yaw, forward): # function to twist toward and lean at the target in one serial write
+
+    ##### stand-in for a turning and walking gait: the stance turns and leans instead of stepping #####
+
+    targets = {}
+
+    for leg, joints in initialize_servos.LEG_CONFIG.items():
+
+        hip = joints['hip']
+        upper = joints['upper']
+        hip['CUR_POS'] = jointTarget(hip, FOLLOW_YAW_SIGNS[leg] * yaw * FOLLOW_YAW_SWING)
+        upper['CUR_POS'] = jointTarget(upper, forward * FOLLOW_LEAN_SWING)
+        targets[hip['servo']] = hip['CUR_POS']
+        targets[upper['servo']] = upper['CUR_POS']
+
+    initialize_servos.setTargets(targets)
+
+
+
+
+
+###############################################
+############### PERSON FOLLOWER ###############
+###############################################
+
+
+########## PERSON FOLLOWER ##########
+
+class PersonFollower: # class turning detections of a person into yaw and forward commands
+
+    """
+    Follows one person with the newest VisionResult from the vision process. step() is
+    called every control loop but only acts at the fixed control rate; each tick uses the
+    newest result it has not acted on yet, and results captured longer than stale_after
+    ago are dropped instead of steered by. The person is kept by IoU with the last target
+    box, falling back to the largest box once lost. Its box center sets yaw and its height
+    against FOLLOW_TARGET_HEIGHT sets forward, both proportional and clipped to -1 to 1.
+    A fresh frame without anyone stops the robot; switching follow off does too.
+
+    Every command is timed from the frame's capture (glass) to the servo command being
+    written (actuation); both timestamps are time.monotonic(), which the vision process
+    shares. actuate(yaw, forward) writes the command, followPose by default.
+    """
+
+    ##### initialize follower #####
+
+    def __init__(self, frame_size=(640, 480), rate=FOLLOW_RATE, stale_after=FOLLOW_STALE_AFTER, actuate=followPose): # function to start disabled, without a target
+
+        self.frame_size = frame_size # (width, height) the detection boxes are in, unless a result carries its own
+        self.period = 1.0 / rate # seconds between control ticks
+        self.stale_after = stale_after # seconds after capture a detection is dropped
+        self.actuate = actuate # function writing yaw and forward to the servos
+        self.enabled = False # whether step() drives the legs
+        self.result = None # newest VisionResult not acted on yet
+        self.last_sequence = 0 # sequence of the newest result taken
+        self.target = None # (x0, y0, x1, y1) of the person followed, None without one
+        self.target_timestamp = None # capture time of the frame the target was last seen in
+        self.next_tick = None # monotonic time of the next control tick
+
+        ##### statistics #####
+
+        self.ticks = 0 # control ticks while enabled
+        self.commands = 0 # commands written
+        self.stale = 0 # results dropped as stale
+        self.lost = 0 # times the target was lost
+        self.latencies = collections.deque(maxlen=FOLLOW_LATENCY_HISTORY) # recent glass-to-actuation seconds
+        self.stats_lock = threading.Lock() # protects latencies while stats() copies them from the preview thread
+
+    ##### enable and disable #####
+
+    def enable(self, enabled=True): # function to switch follow mode, a new follow starts without a target and turning it off straightens the stance
+
+        if enabled == self.enabled: # the receiver repeats the switch while it is held
+
+            return
+
+        logging.info(f"Person follow {'enabled' if enabled else 'disabled'}.\n")
+        self.enabled = enabled
+        self.target = None
+        self.next_tick = None
+
+        if not enabled: # do not leave the legs twisted and leaning in the last follow pose
+
+            self.actuate(0.0, 0.0)
+
+    ##### new detections #####
+
+    def update(self, result): # function to take a VisionResult, ignoring any not newer than the last one taken
+
+        if result is not None and result.sequence > self.last_sequence:
+
+            self.result = result
+            self.last_sequence = result.sequence
+
+    ##### control tick #####
+
+    def step(self, now=None): # function to act on the newest result once a tick is due, returns the FollowCommand written or None
+
+        if not self.enabled:
+
+            return None
+
+        now = time.monotonic() if now is None else now
+
+        if self.next_tick is not None and now < self.next_tick:
+
+            return None
+
+        if self.next_tick is None or now - self.next_tick > self.period: # first tick, or the loop fell behind
+
+            self.next_tick = now
+
+        self.next_tick += self.period
+        self.ticks += 1
+        result, self.result = self.result, None
+
+        if result is not None and now - result.timestamp > self.stale_after:
+
+            self.stale += 1
+            result = None
+
+        if result is None: # nothing new, the servos hold the last command
+
+            if self.target is not None and now - self.target_timestamp > self.stale_after: # detections stopped, do not keep steering blind
+
+                self._lose("no recent detections")
+                self.actuate(0.0, 0.0)
+
+            return None
+
+        ##### pick the person and compute the command #####
+
+        box = self._select(result.detections)
+
+        if box is None:
+
+            if self.target is not None:
+
+                self._lose(f"nobody in frame {result.sequence}")
+
+            yaw, forward = 0.0, 0.0 # stop until someone shows up
+
+        else:
+
+            self.target = box
+            self.target_timestamp = result.timestamp
+            yaw, forward = self._command(box, result.frame_size if result.frame_size[0] else self.frame_size)
+
+        ##### write the command and time it from the glass #####
+
+        self.actuate(yaw, forward)
+        latency = time.monotonic() - result.timestamp
+
+        with self.stats_lock:
+
+            self.latencies.append(latency)
+
+        self.commands += 1
+        logging.debug(f"Follow frame {result.sequence}: yaw {yaw:+.2f}, forward {forward:+.2f}, glass-to-actuation {latency * 1000:.1f} ms.\n")
+
+        return FollowCommand(yaw, forward, result.sequence, latency)
+
+    ##### lose target #####
+
+    def _lose(self, reason): # function to forget the target
+
+        self.lost += 1
+        self.target = None
+        logging.info(f"Person follow lost its target: {reason}.\n")
+
+    ##### select target #####
+
+    def _select(self, detections): # function to return the box of the person to follow, or None
+
+        if not len(detections):
+
+            return None
+
+        boxes = detection_boxes(detections)
+
+        if self.target is not None:
+
+            overlap = iou_matrix(np.array([self.target], dtype=np.float32), boxes)[0]
+
+            if overlap.max() >= FOLLOW_LOCK_IOU:
+
+                return tuple(boxes[overlap.argmax()].tolist())
+
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+        return tuple(boxes[areas.argmax()].tolist()) # largest is most likely the closest
+
+    ##### compute command #####
+
+    def _command(self, box, frame_size): # function to turn a target box in a frame of frame_size into (yaw, forward)
+
+        width, height = frame_size
+        x0, y0, x1, y1 = box
+        offset = (x0 + x1) / width - 1 # -1 at the left edge, 1 at the right edge
+        error = FOLLOW_TARGET_HEIGHT - (y1 - y0) / height # positive while too far away
+        yaw = 0.0 if abs(offset) < FOLLOW_DEADBAND else float(np.clip(-FOLLOW_YAW_GAIN * offset, -1, 1))
+        forward = 0.0 if abs(error) < FOLLOW_DEADBAND else float(np.clip(FOLLOW_FORWARD_GAIN * error, -1, 1))
+
+        return yaw, forward
+
+    ##### report statistics #####
+
+    def stats(self): # function to summarize commands, dropped results and glass-to-actuation latency
+
+        latency = None
+
+        with self.stats_lock: # snapshot, the control thread keeps appending
+
+            latencies = list(self.latencies)
+
+        if latencies:
+
+            milliseconds = np.array(latencies) * 1000
+            latency = {
+                'mean_ms': round(float(milliseconds.mean()), 3),
+                'p50_ms': round(float(np.percentile(milliseconds, 50)), 3),
+                'p95_ms': round(float(np.percentile(milliseconds, 95)), 3),
+                'max_ms': round(float(milliseconds.max()), 3),
+            }
+
+        return {
+            'enabled': self.enabled,
+            'following': self.target is not None,
+            'ticks': self.ticks,
+            'commands': self.commands,
+            'stale': self.stale,
+            'lost': self.lost,
+            'glass_to_actuation': latency,
+        }
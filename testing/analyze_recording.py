@@ -0,0 +1,158 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from initialize.initialize_opencv import load_and_compile_model
+from vision.frame_recorder import RecordingReader, list_segments
+from vision.frame_decode import FrameDecoder, jpeg_dimensions, decoded_frame_size
+from vision.inference_engine import FrameInferRequest
+from vision.detection_postprocess import postprocess_detections, scale_detections
+from vision.detection_store import DetectionStore, STORED_DETECTION_DTYPE
+
+WORKER = {}  # per worker process: model request, decoder and open segments
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def plan_shards(segments, chunk_frames, done):
+    """
+    Splits every segment into ranges of chunk_frames index positions.
+
+    :param segments: Segment paths from list_segments.
+    :param chunk_frames: Frames per range.
+    :param done: (segment, start, end) ranges already in the detections file.
+    :return: (ranges still to analyse, total frames in the recording).
+    """
+    shards = []
+    total = 0
+    for segment, path in enumerate(segments):
+        reader = RecordingReader(path)
+        count = len(reader)
+        reader.close()
+        total += count
+        for start in range(0, count, chunk_frames):
+            shard = (segment, start, min(start + chunk_frames, count))
+            if shard not in done:
+                shards.append(shard)
+    return shards, total
+
+
+def start_worker(model_xml_path, segments, frame_size, threads):
+    """
+    Pool initializer: compiles this worker's own CPU model with preprocessing baked in
+    for the decoded frame size.
+
+    :param model_xml_path: Path to person-detection-0200.xml.
+    :param segments: Segment paths.
+    :param frame_size: (width, height) of the first recorded frame, the model is baked for it.
+    :param threads: CPU inference threads per worker.
+    """
+    compiled_model, _, _ = load_and_compile_model(
+        model_xml_path, "CPU", decoded_frame_size(frame_size),
+        config={"INFERENCE_NUM_THREADS": threads, "NUM_STREAMS": 1},
+    )
+    WORKER.update(request=FrameInferRequest(compiled_model) if compiled_model is not None else None,
+                  decoder=FrameDecoder(frame_size=frame_size), segments=segments, frame_size=frame_size, readers={})
+
+
+def analyse_shard(shard):
+    """
+    Runs detection over one frame range of one segment. The QoS governor may have
+    restarted the camera at another resolution mid-session, so every frame's size is
+    read from its JPEG header and its boxes are scaled to it.
+
+    :param shard: (segment, start, end) index positions.
+    :return: (segment, start, end, STORED_DETECTION_DTYPE rows in camera pixels, set of (width, height) seen).
+    """
+    if WORKER["request"] is None:  # raised here, a failing initializer would just be restarted by the pool
+        raise RuntimeError("model failed to compile on CPU")
+    segment, start, end = shard
+    readers = WORKER["readers"]
+    if segment not in readers:
+        readers[segment] = RecordingReader(WORKER["segments"][segment])
+    reader = readers[segment]
+    rows = []
+    sizes = set()
+
+    for position in range(start, end):
+        data = reader.frame(position)
+        width, height = jpeg_dimensions(data) or WORKER["frame_size"]
+        sizes.add((width, height))
+        frame = WORKER["decoder"].decode(data)  # re-picks the decode scale when the size changes
+        if frame is None:
+            continue
+        detections = postprocess_detections(WORKER["request"].infer(frame), (frame.shape[1], frame.shape[0]))
+        detections = scale_detections(detections, width / frame.shape[1], height / frame.shape[0])
+        stored = np.zeros(len(detections), dtype=STORED_DETECTION_DTYPE)
+        stored['frame'] = reader.index['frame'][position]
+        stored['timestamp'] = reader.index['timestamp'][position]
+        for name in detections.dtype.names:
+            stored[name] = detections[name]
+        rows.append(stored)
+
+    detections = np.concatenate(rows) if rows else np.zeros(0, dtype=STORED_DETECTION_DTYPE)
+    return segment, start, end, detections, sizes
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Person detection over a recorded session on every core")
+    parser.add_argument("session", help="Recording session directory (segment_NNNN.mjpeg + .idx)")
+    parser.add_argument("--model", required=True, help="Path to person-detection-0200.xml")
+    parser.add_argument("--output", help="Detections file, resumed if it exists (default: <session>/detections.bin)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes, one CPU model each")
+    parser.add_argument("--threads", type=int, default=1, help="Inference threads per worker")
+    parser.add_argument("--chunk-frames", type=int, default=300, help="Frames per work unit and per stored chunk")
+    args = parser.parse_args()
+
+    segments = list_segments(args.session)
+    if not segments:
+        sys.exit(f"No segments in {args.session}")
+
+    store = DetectionStore(args.output or os.path.join(args.session, "detections.bin"))
+    shards, total = plan_shards(segments, args.chunk_frames, store.done)
+    pending = sum(end - start for _, start, end in shards)
+    print(f"{total} frames in {len(segments)} segments, {total - pending} already analysed, {pending} to go.")
+
+    # Bake the model for the first frame's size, workers handle frames of other sizes as they come
+    frame_size = None
+    for path in segments:
+        reader = RecordingReader(path)
+        if len(reader):  # a segment can be empty, e.g. when the robot stopped right after opening it
+            frame_size = jpeg_dimensions(reader.frame(0))
+        reader.close()
+        if frame_size is not None:
+            break
+    if frame_size is None:
+        sys.exit(f"No frames in {args.session}")
+
+    # Fork workers before any model exists in this process; results stream into the store as ranges finish
+    start = time.perf_counter()
+    analysed = 0
+    sizes = set()
+    context = multiprocessing.get_context("fork")
+    try:
+        with context.Pool(args.workers, start_worker, (args.model, segments, frame_size, args.threads)) as pool:
+            for segment, first_position, end, detections, shard_sizes in pool.imap_unordered(analyse_shard, shards):
+                store.append(segment, first_position, end, detections)
+                sizes |= shard_sizes
+                analysed += end - first_position
+                elapsed = time.perf_counter() - start
+                print(f"\r{analysed}/{pending} frames, {analysed / elapsed:.1f} frames/s", end="", flush=True)
+    finally:
+        store.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\nAnalysed {analysed} frames in {elapsed:.1f} s with {args.workers} workers "
+          f"({analysed / max(elapsed, 1e-9):.1f} frames/s), {store.rows} detections in {store.path}.")
+    if len(sizes) > 1:  # the camera was reconfigured during the session, boxes are in each frame's own pixels
+        print(f"Frame size changed during the session: {', '.join(f'{w}x{h}' for w, h in sorted(sizes, reverse=True))}.")
@@ -0,0 +1,114 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from initialize.initialize_opencv import load_and_compile_model
+from vision.frame_source import create_frame_source
+from vision.frame_decode import FrameDecoder
+from vision.inference_engine import AsyncInferenceEngine
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def preprocess(frame):
+    """
+    Same preprocessing as testing/test_opencv.py: BGR to RGB, 256x256, NCHW float32.
+
+    :param frame: Decoded BGR frame.
+    :return: Input blob.
+    """
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    input_blob = cv2.resize(frame_rgb, (256, 256)).transpose(2, 0, 1)
+    return np.expand_dims(input_blob, axis=0).astype(np.float32)
+
+
+def run_pipeline(compiled_model, output_layer, source, decoder, frame_count, depth):
+    """
+    Reads, decodes, preprocesses and infers frame_count frames.
+
+    :param compiled_model: The compiled OpenVINO model.
+    :param output_layer: The model's output layer.
+    :param source: Started FrameSource.
+    :param decoder: FrameDecoder for the source.
+    :param frame_count: Number of frames to process.
+    :param depth: Infer requests in flight, 0 for synchronous inference.
+    :return: (fps, latencies) where latencies run from capture to result in seconds.
+    """
+    engine = AsyncInferenceEngine(compiled_model, depth) if depth else None
+    latencies = []
+    sequences = []
+    start = time.perf_counter()
+
+    for _ in range(frame_count):
+        source_frame = source.read()
+        if source_frame is None:
+            break
+
+        input_blob = preprocess(decoder.decode(source_frame.data))
+
+        if engine is None:
+            compiled_model([input_blob])[output_layer]
+            latencies.append(time.monotonic() - source_frame.timestamp)
+            sequences.append(source_frame.sequence)
+        else:
+            engine.submit(input_blob, source_frame.sequence, source_frame.timestamp)
+            for result in engine.ready():
+                latencies.append(result.completed - result.context)
+                sequences.append(result.sequence)
+
+    if engine is not None:
+        for result in engine.drain():
+            latencies.append(result.completed - result.context)
+            sequences.append(result.sequence)
+
+    elapsed = time.perf_counter() - start
+
+    if sequences != sorted(sequences):
+        print("WARNING: results were delivered out of frame order")
+
+    return len(latencies) / elapsed, np.array(latencies)
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput vs latency of synchronous and pipelined inference")
+    parser.add_argument("--model", required=True, help="Path to person-detection-0200.xml")
+    parser.add_argument("--device", default="MYRIAD")
+    parser.add_argument("--source", default="synthetic", help='"synthetic", "camera" or a recording path')
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--framerate", type=int, help="Pace the source, unthrottled if omitted")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--depths", default="0,1,2,4,8", help="Comma separated in-flight depths, 0 is synchronous")
+    args = parser.parse_args()
+
+    compiled_model, input_layer, output_layer = load_and_compile_model(args.model, args.device)
+    if compiled_model is None:
+        sys.exit(1)
+
+    print(f"{'depth':>8} {'fps':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+
+    for depth in (int(value) for value in args.depths.split(",")):
+        source = create_frame_source(args.source, args.width, args.height, None, args.framerate)
+        source.start()
+        decoder = FrameDecoder(target_size=(256, 256), frame_size=(args.width, args.height))
+
+        try:
+            run_pipeline(compiled_model, output_layer, source, decoder, 10, depth)  # warm up
+            fps, latencies = run_pipeline(compiled_model, output_layer, source, decoder, args.frames, depth)
+        finally:
+            source.stop()
+
+        latencies *= 1000
+        label = "sync" if depth == 0 else str(depth)
+        print(f"{label:>8} {fps:8.1f} {np.percentile(latencies, 50):8.2f} "
+              f"{np.percentile(latencies, 95):8.2f} {latencies.max():8.2f}")
@@ -0,0 +1,237 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from openvino.runtime import Core, get_version
+from initialize.initialize_opencv import load_and_compile_model
+from vision.frame_source import create_frame_source
+from vision.frame_decode import FrameDecoder
+from vision.detection_postprocess import postprocess_detections
+from vision.inference_engine import AsyncInferenceEngine
+
+STAGES = ("decode", "preprocess", "inference", "postprocess", "total")
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def load_frames(source_spec, clip_size, size, frame_count):
+    """
+    Builds the JPEG frames a configuration replays from memory, so file reads and pacing
+    stay out of the measurements. A recorded clip is decoded once and re-encoded at size,
+    which lets one clip cover every resolution in the sweep.
+
+    :param source_spec: "synthetic" or a recorded .mjpeg / .yuv clip.
+    :param clip_size: (width, height) of the recorded clip.
+    :param size: (width, height) to benchmark.
+    :param frame_count: Most distinct frames to keep.
+    :return: List of JPEG bytes.
+    """
+    if source_spec == "synthetic":
+        source = create_frame_source("synthetic", size[0], size[1])
+        with source:
+            return [bytes(frame.data) for frame in itertools.islice(source, frame_count)]
+
+    source = create_frame_source(source_spec, clip_size[0], clip_size[1], framerate=None)
+    decoder = FrameDecoder(frame_size=clip_size)
+    frames = []
+    with source:
+        for source_frame in itertools.islice(source, frame_count):
+            frame = decoder.decode(source_frame.data, full_resolution=True)
+            if frame is not None:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                frames.append(cv2.imencode(".jpg", frame)[1].tobytes())
+    return frames
+
+
+def preprocess(frame):
+    """
+    Same preprocessing as testing/test_opencv.py: BGR to RGB, 256x256, NCHW float32.
+
+    :param frame: Decoded BGR frame.
+    :return: Input blob.
+    """
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    input_blob = cv2.resize(frame_rgb, (256, 256)).transpose(2, 0, 1)
+    return np.expand_dims(input_blob, axis=0).astype(np.float32)
+
+
+def percentiles(seconds):
+    """
+    :param seconds: Latencies of one stage in seconds.
+    :return: p50/p95/p99 and mean in milliseconds.
+    """
+    milliseconds = np.asarray(seconds) * 1000
+    if not milliseconds.size:
+        return None
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "mean_ms": round(float(milliseconds.mean()), 3)}
+
+
+def run_configuration(configuration, model_xml_path, source_spec, clip_size, frame_count, warmup):
+    """
+    Benchmarks one configuration. Runs in its own process so the peak RSS belongs to it
+    alone.
+
+    :param configuration: Dict with device, width, height, decode (reduced / full) and
+        inflight (0 for synchronous inference).
+    :param model_xml_path: Path to person-detection-0200.xml.
+    :param source_spec: "synthetic" or a recorded clip.
+    :param clip_size: (width, height) of the recorded clip.
+    :param frame_count: Measured frames.
+    :param warmup: Frames run before measuring.
+    :return: The configuration with fps, per-stage latency percentiles and peak RSS.
+    """
+    sys.stdout = sys.stderr  # loader messages must not end up in the JSON report on stdout
+    size = (configuration["width"], configuration["height"])
+    frames = load_frames(source_spec, clip_size, size, frame_count)
+    compiled_model, _, output_layer = load_and_compile_model(model_xml_path, configuration["device"])
+    if compiled_model is None:
+        return dict(configuration, error="model failed to load")
+
+    decoder = FrameDecoder(target_size=(256, 256), frame_size=size)
+    full_resolution = configuration["decode"] == "full"
+    engine = AsyncInferenceEngine(compiled_model, configuration["inflight"]) if configuration["inflight"] else None
+    latencies = {stage: [] for stage in STAGES}
+    measured = 0
+    start = None
+
+    def finish(output, frame_size, started, measure):
+        postprocess_start = time.monotonic()
+        postprocess_detections(output, frame_size)
+        done = time.monotonic()
+        if measure:
+            latencies["postprocess"].append(done - postprocess_start)
+            latencies["total"].append(done - started)
+
+    for index in range(warmup + frame_count):
+        measure = index >= warmup
+        if measure and start is None:
+            start = time.perf_counter()
+
+        started = time.monotonic()
+        frame = decoder.decode(frames[index % len(frames)], full_resolution=full_resolution)
+        decoded = time.monotonic()
+        input_blob = preprocess(frame)
+        preprocessed = time.monotonic()
+        frame_size = (frame.shape[1], frame.shape[0])
+
+        if measure:
+            latencies["decode"].append(decoded - started)
+            latencies["preprocess"].append(preprocessed - decoded)
+            measured += 1
+
+        if engine is None:
+            output = compiled_model([input_blob])[output_layer]
+            if measure:
+                latencies["inference"].append(time.monotonic() - preprocessed)
+            finish(output, frame_size, started, measure)
+        else:
+            engine.submit(input_blob, index, (frame_size, started, measure))
+            for result in engine.ready():
+                result_size, result_started, result_measure = result.context
+                if result_measure:
+                    latencies["inference"].append(result.completed - result.submitted)
+                finish(result.output, result_size, result_started, result_measure)
+
+    if engine is not None:
+        for result in engine.drain():
+            result_size, result_started, result_measure = result.context
+            if result_measure:
+                latencies["inference"].append(result.completed - result.submitted)
+            finish(result.output, result_size, result_started, result_measure)
+
+    elapsed = time.perf_counter() - start
+    return dict(
+        configuration,
+        frames=measured,
+        fps=round(measured / elapsed, 2),
+        stages={stage: percentiles(values) for stage, values in latencies.items()},
+        peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # kilobytes on Linux
+    )
+
+
+def parse_size(text):
+    """
+    :param text: "WIDTHxHEIGHT".
+    :return: (width, height)
+    """
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inference benchmark across devices, resolutions, decode modes and in-flight depth")
+    parser.add_argument("--model", required=True, help="Path to person-detection-0200.xml")
+    parser.add_argument("--source", default="synthetic", help='"synthetic" or a recorded .mjpeg / .yuv clip')
+    parser.add_argument("--clip-size", type=parse_size, default=(640, 480), help="WIDTHxHEIGHT of the recorded clip")
+    parser.add_argument("--devices", nargs="+", help="Devices to sweep, CPU and MYRIAD if present by default")
+    parser.add_argument("--resolutions", nargs="+", type=parse_size, default=[(640, 480), (1280, 720)])
+    parser.add_argument("--decode", nargs="+", choices=("reduced", "full"), default=["reduced", "full"],
+                        help="DCT-domain reduced decode or full decode then resize")
+    parser.add_argument("--inflight", nargs="+", type=int, default=[0, 1, 2, 4],
+                        help="Infer requests in flight, 0 is synchronous")
+    parser.add_argument("--frames", type=int, default=200, help="Measured frames per configuration")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured frames per configuration")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    devices = args.devices
+    if devices is None:
+        available = {device.split(".")[0] for device in Core().available_devices}
+        devices = ["CPU"] + (["MYRIAD"] if "MYRIAD" in available else [])
+
+    configurations = [
+        {"device": device, "width": width, "height": height, "decode": decode, "inflight": inflight}
+        for device, (width, height), decode, inflight
+        in itertools.product(devices, args.resolutions, args.decode, args.inflight)
+    ]
+
+    # A fresh spawned process per configuration, so peak RSS and device state do not carry over
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for configuration in configurations:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_configuration, configuration, args.model, args.source,
+                                 args.clip_size, args.frames, args.warmup).result()
+        results.append(result)
+        if "error" in result:
+            print(f"{configuration}: {result['error']}", file=sys.stderr)
+        else:
+            total = result["stages"]["total"]
+            print(f"{result['device']:>6} {result['width']}x{result['height']} {result['decode']:>7} "
+                  f"inflight {result['inflight']}: {result['fps']:7.1f} fps, total p95 {total['p95_ms']:.1f} ms, "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+
+    report = {
+        "openvino": get_version(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "model": os.path.basename(args.model),
+        "source": args.source,
+        "frames": args.frames,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,119 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from vision.mjpeg_splitter import MJPEGSplitter
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def synthesize_stream(width=640, height=480, frame_count=300):
+    """
+    Builds an in-memory MJPEG stream when no recording is available.
+
+    :param width: Frame width.
+    :param height: Frame height.
+    :param frame_count: Number of frames in the stream.
+    :return: MJPEG bytes.
+    """
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    base = cv2.resize(base, (width, height), interpolation=cv2.INTER_CUBIC)  # camera-like smooth content
+    frames = []
+    for i in range(frame_count):
+        frame = np.roll(base, i * 4, axis=1)
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes())
+    return b"".join(frames)
+
+
+def split_with_concat(stream, chunk_size):
+    """
+    The original runRobot approach: bytes concatenation, full re-scan and 64 KB overflow reset.
+
+    :param stream: MJPEG bytes.
+    :param chunk_size: Bytes per read.
+    :return: Number of frames recovered.
+    """
+    mjpeg_buffer = b''
+    frames = 0
+    for offset in range(0, len(stream), chunk_size):
+        mjpeg_buffer += stream[offset:offset + chunk_size]
+        start_idx = mjpeg_buffer.find(b'\xff\xd8')
+        end_idx = mjpeg_buffer.find(b'\xff\xd9')
+        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+            frame_data = mjpeg_buffer[start_idx:end_idx + 2]
+            mjpeg_buffer = mjpeg_buffer[end_idx + 2:]
+            frames += 1
+        elif len(mjpeg_buffer) > 65536:
+            mjpeg_buffer = b''
+    return frames
+
+
+def split_with_ring_buffer(stream, chunk_size):
+    """
+    Feeds the same chunks through MJPEGSplitter.
+
+    :param stream: MJPEG bytes.
+    :param chunk_size: Bytes per read.
+    :return: Number of frames recovered.
+    """
+    splitter = MJPEGSplitter()
+    view = memoryview(stream)
+    frames = 0
+    for offset in range(0, len(stream), chunk_size):
+        splitter.feed(view[offset:offset + chunk_size])
+        for _ in splitter.frames():
+            frames += 1
+    return frames
+
+
+def run_benchmark(stream, chunk_size, repeats):
+    """
+    Times both splitters over the stream and prints throughput.
+
+    :param stream: MJPEG bytes.
+    :param chunk_size: Bytes per read.
+    :param repeats: Number of passes over the stream.
+    """
+    expected = stream.count(b'\xff\xd9')
+    print(f"Stream: {len(stream) / 1e6:.1f} MB, {expected} frames, {chunk_size} byte reads")
+
+    for name, splitter in (("bytes concat", split_with_concat), ("ring buffer", split_with_ring_buffer)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            frames = splitter(stream, chunk_size)
+        elapsed = (time.perf_counter() - start) / repeats
+        if frames < expected:  # throughput of a splitter that throws frames away is not comparable
+            print(f"{name:>12}: WARNING only {frames}/{expected} frames recovered, throughput not comparable")
+            continue
+        print(
+            f"{name:>12}: {len(stream) / elapsed / 1e6:8.1f} MB/s, "
+            f"{frames / elapsed:9.1f} frames/s, {frames}/{expected} frames recovered"
+        )
+
+
+########## MAIN EXECUTION ##########
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MJPEG splitter throughput benchmark")
+    parser.add_argument("recording", nargs="?", help="MJPEG stream recorded with rpicam-vid --codec mjpeg -o file")
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--width", type=int, default=640, help="Synthetic frame width, the robot's camera resolution by default")
+    parser.add_argument("--height", type=int, default=480, help="Synthetic frame height")
+    args = parser.parse_args()
+
+    if args.recording:
+        with open(args.recording, "rb") as recording:
+            stream = recording.read()
+    else:
+        stream = synthesize_stream(args.width, args.height)
+
+    run_benchmark(stream, args.chunk_size, args.repeats)
@@ -0,0 +1,61 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from initialize.initialize_opencv import load_and_compile_model, start_model_warm_up
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def timed_startup(model_xml_path, device_name, cache_directory, frame_size):
+    """
+    Loads the model and runs the warm-up inference, like the robot does at launch.
+
+    :param model_xml_path: Path to the model XML file.
+    :param device_name: First device to try.
+    :param cache_directory: Compiled-blob cache, None to always compile.
+    :param frame_size: (width, height) to bake preprocessing for, or None.
+    :return: Timings filled in by the loader and the warm-up.
+    """
+    timings = {}
+    compiled_model, input_layer, output_layer = load_and_compile_model(
+        model_xml_path, device_name, frame_size, cache_directory, timings
+    )
+    if compiled_model is None:
+        sys.exit(1)
+    start_model_warm_up(compiled_model, input_layer, output_layer, timings).join()
+    return timings
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold vs warm model startup with the compiled-blob cache")
+    parser.add_argument("--model", required=True, help="Path to person-detection-0200.xml")
+    parser.add_argument("--device", default="MYRIAD")
+    parser.add_argument("--frame-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="Bake preprocessing for this decoded frame size")
+    parser.add_argument("--runs", type=int, default=3, help="Warm launches to time")
+    args = parser.parse_args()
+
+    frame_size = tuple(args.frame_size) if args.frame_size else None
+    cache_directory = tempfile.mkdtemp(prefix="model_cache_")  # empty cache, so the first launch is cold
+
+    try:
+        rows = [("no cache", timed_startup(args.model, args.device, None, frame_size)),
+                ("cold", timed_startup(args.model, args.device, cache_directory, frame_size))]
+        rows += [(f"warm {run + 1}", timed_startup(args.model, args.device, cache_directory, frame_size))
+                 for run in range(args.runs)]
+    finally:
+        shutil.rmtree(cache_directory)
+
+    print(f"\n{'launch':>10} {'device':>8} {'read':>8} {'compile':>8} {'import':>8} {'load':>8} {'warm-up':>8}  (ms)")
+    for label, timings in rows:
+        print(f"{label:>10} {timings['device']:>8} {timings.get('read_ms', 0):8.0f} {timings.get('compile_ms', 0):8.0f} "
+              f"{timings.get('import_ms', 0):8.0f} {timings['total_ms']:8.0f} {timings['warm_up_ms']:8.0f}")
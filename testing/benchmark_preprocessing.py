@@ -0,0 +1,86 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from initialize.initialize_opencv import load_and_compile_model
+from vision.frame_source import SyntheticFrameSource
+from vision.frame_decode import FrameDecoder, decoded_frame_size
+from vision.inference_engine import FrameInferRequest
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def python_preprocess(frame):
+    """
+    The per-frame preprocessing testing/test_opencv.py does without a baked model.
+
+    :param frame: Decoded BGR frame.
+    :return: Float NCHW input blob.
+    """
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    input_blob = cv2.resize(frame_rgb, (256, 256)).transpose(2, 0, 1)
+    return np.expand_dims(input_blob, axis=0).astype(np.float32)
+
+
+def time_per_frame(function, frames, repeats):
+    """
+    Times function over every frame, repeats times.
+
+    :param function: Callable taking one decoded frame.
+    :param frames: Decoded frames.
+    :param repeats: Passes over frames.
+    :return: Mean milliseconds per frame.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for frame in frames:
+            function(frame)
+    return (time.perf_counter() - start) * 1000 / (repeats * len(frames))
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Python preprocessing vs preprocessing baked into the model")
+    parser.add_argument("--model", required=True, help="Path to person-detection-0200.xml")
+    parser.add_argument("--device", default="MYRIAD")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    # Decode a synthetic clip the way the inference loop does
+    source = SyntheticFrameSource(args.width, args.height, frame_count=args.frames).start()
+    decoder = FrameDecoder(target_size=(256, 256), frame_size=(args.width, args.height))
+    frames = [decoder.decode(frame.data) for frame in source]
+    frame_size = decoded_frame_size((args.width, args.height))
+    print(f"Decoded frames: {frames[0].shape[1]}x{frames[0].shape[0]}, baked for {frame_size[0]}x{frame_size[1]}")
+
+    plain_model, _, plain_output = load_and_compile_model(args.model, args.device)
+    baked_model, _, _ = load_and_compile_model(args.model, args.device, frame_size)
+    if plain_model is None or baked_model is None:
+        sys.exit(1)
+    frame_request = FrameInferRequest(baked_model)
+
+    # Both paths should find the same people
+    plain = plain_model([python_preprocess(frames[0])])[plain_output][0][0]
+    baked = frame_request.infer(frames[0])[0][0]
+    print(f"Max confidence difference between paths: {np.abs(plain[:, 2] - baked[:, 2]).max():.4f}")
+
+    preprocess_ms = time_per_frame(python_preprocess, frames, args.repeats)
+    plain_ms = time_per_frame(lambda frame: plain_model([python_preprocess(frame)])[plain_output], frames, args.repeats)
+    baked_ms = time_per_frame(frame_request.infer, frames, args.repeats)
+
+    print(f"Python preprocessing only:        {preprocess_ms:7.3f} ms/frame")
+    print(f"Python preprocessing + inference: {plain_ms:7.3f} ms/frame")
+    print(f"Baked preprocessing + inference:  {baked_ms:7.3f} ms/frame")
+    print(f"Saved per frame:                  {plain_ms - baked_ms:7.3f} ms")
@@ -0,0 +1,319 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from initialize.initialize_receiver import (
+    interpretCommands, recordPulse, getJoystickIntensity, PWM_PINS, DEADBAND_LOW, DEADBAND_HIGH,
+    tiltUpDownChannel0, triggerShootChannel1, squatUpDownChannel2, rotateLeftRightChannel3,
+    lookUpDownChannel4, moveForwardBackwardChannel5, shiftLeftRightChannel6, extraChannel7,
+)
+
+# the loop-counted debounce settings the original interpreter used
+JOYSTICK_THRESHOLD = 40
+TOGGLE_THRESHOLD = 40
+TIME_FRAME = 0.10017
+LEGACY_COUNTERS = {f'channel-{index}': 0 for index in range(8)}
+LEGACY_TIMESTAMPS = {f'channel-{index}': time.time() for index in range(8)}
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def interpret_with_if_chains(channel_data):
+    """
+    The original interpretCommands: one copy-pasted block per channel, dict lookups and
+    time.time() throughout, a pre-filled commands dict, and debouncing counted in loop
+    passes.
+
+    :param channel_data: Pulse width per GPIO pin.
+    :return: Commands dict.
+    """
+    ##### set variables #####
+
+    commands = { # create dictionary of commands
+
+        'channel-0': ('NEUTRAL', 0), # set channel 0 to neutral for silence
+        'channel-1': ('NEUTRAL', 0), # set channel 1 to neutral for silence
+        'channel-2': ('NEUTRAL', 0), # set channel 2 to neutral for silence
+        'channel-7':  ('NEUTRAL', 0), # set channel 7 to neutral for silence
+    }
+
+    current_time = time.time() # set current time to current time
+
+    ##### tilt channel 0 #####
+
+    if channel_data[tiltUpDownChannel0] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-0'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-0'] = 0
+        LEGACY_COUNTERS['channel-0'] += 1
+        LEGACY_TIMESTAMPS['channel-0'] = current_time
+        if LEGACY_COUNTERS['channel-0'] >= TOGGLE_THRESHOLD:
+            commands['channel-0'] = ('TILT DOWN', 0)
+            LEGACY_COUNTERS['channel-0'] = 0
+    elif channel_data[tiltUpDownChannel0] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-0'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-0'] = 0
+        LEGACY_COUNTERS['channel-0'] += 1
+        LEGACY_TIMESTAMPS['channel-0'] = current_time
+        if LEGACY_COUNTERS['channel-0'] >= TOGGLE_THRESHOLD:
+            commands['channel-0'] = ('TILT UP', 0)
+            LEGACY_COUNTERS['channel-0'] = 0
+
+    ##### trigger channel 1 #####
+
+    if channel_data[triggerShootChannel1] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-1'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-1'] = 0
+        LEGACY_COUNTERS['channel-1'] += 1
+        LEGACY_TIMESTAMPS['channel-1'] = current_time
+        if LEGACY_COUNTERS['channel-1'] >= TOGGLE_THRESHOLD:
+            commands['channel-1'] = ('NEUTRAL', 0)
+            LEGACY_COUNTERS['channel-1'] = 0
+    elif channel_data[triggerShootChannel1] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-1'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-1'] = 0
+        LEGACY_COUNTERS['channel-1'] += 1
+        LEGACY_TIMESTAMPS['channel-1'] = current_time
+        if LEGACY_COUNTERS['channel-1'] >= TOGGLE_THRESHOLD:
+            commands['channel-1'] = ('TRIGGER SHOOT', 0)
+            LEGACY_COUNTERS['channel-1'] = 0
+
+    ##### squat channel 2 #####
+
+    if channel_data[squatUpDownChannel2] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-2'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-2'] = 0
+        LEGACY_COUNTERS['channel-2'] += 1
+        LEGACY_TIMESTAMPS['channel-2'] = current_time
+        if LEGACY_COUNTERS['channel-2'] >= TOGGLE_THRESHOLD:
+            commands['channel-2'] = ('SQUAT DOWN', 0)
+            LEGACY_COUNTERS['channel-2'] = 0
+    elif channel_data[squatUpDownChannel2] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-2'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-2'] = 0
+        LEGACY_COUNTERS['channel-2'] += 1
+        LEGACY_TIMESTAMPS['channel-2'] = current_time
+        if LEGACY_COUNTERS['channel-2'] >= TOGGLE_THRESHOLD:
+            commands['channel-2'] = ('SQUAT UP', 0)
+            LEGACY_COUNTERS['channel-2'] = 0
+
+    ##### rotation channel 3 #####
+
+    if channel_data[rotateLeftRightChannel3] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-3'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-3'] = 0
+        LEGACY_COUNTERS['channel-3'] += 1
+        LEGACY_TIMESTAMPS['channel-3'] = current_time
+
+        if LEGACY_COUNTERS['channel-3'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[rotateLeftRightChannel3], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-3'] = ('MOVE FORWARD', intensity)
+            LEGACY_COUNTERS['channel-3'] = 0
+
+    elif DEADBAND_LOW <= channel_data[rotateLeftRightChannel3] <= DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-3'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-3'] = 0
+        LEGACY_COUNTERS['channel-3'] += 1
+        LEGACY_TIMESTAMPS['channel-3'] = current_time
+
+        if LEGACY_COUNTERS['channel-3'] >= JOYSTICK_THRESHOLD:
+            commands['channel-3'] = ('NEUTRAL', 0)
+            LEGACY_COUNTERS['channel-3'] = 0
+
+    elif channel_data[rotateLeftRightChannel3] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-3'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-3'] = 0
+        LEGACY_COUNTERS['channel-3'] += 1
+        LEGACY_TIMESTAMPS['channel-3'] = current_time
+
+        if LEGACY_COUNTERS['channel-3'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[rotateLeftRightChannel3], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-3'] = ('MOVE BACKWARD', intensity)
+            LEGACY_COUNTERS['channel-3'] = 0
+
+    ##### look channel 4 #####
+
+    if channel_data[lookUpDownChannel4] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-4'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-4'] = 0
+        LEGACY_COUNTERS['channel-4'] += 1
+        LEGACY_TIMESTAMPS['channel-4'] = current_time
+
+        if LEGACY_COUNTERS['channel-4'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[lookUpDownChannel4], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-4'] = ('MOVE FORWARD', intensity)
+            LEGACY_COUNTERS['channel-4'] = 0
+
+    elif DEADBAND_LOW <= channel_data[lookUpDownChannel4] <= DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-4'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-4'] = 0
+        LEGACY_COUNTERS['channel-4'] += 1
+        LEGACY_TIMESTAMPS['channel-4'] = current_time
+
+        if LEGACY_COUNTERS['channel-4'] >= JOYSTICK_THRESHOLD:
+            commands['channel-4'] = ('NEUTRAL', 0)
+            LEGACY_COUNTERS['channel-4'] = 0
+
+    elif channel_data[lookUpDownChannel4] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-4'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-4'] = 0
+        LEGACY_COUNTERS['channel-4'] += 1
+        LEGACY_TIMESTAMPS['channel-4'] = current_time
+
+        if LEGACY_COUNTERS['channel-4'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[lookUpDownChannel4], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-4'] = ('MOVE BACKWARD', intensity)
+            LEGACY_COUNTERS['channel-4'] = 0
+
+    ##### move channel 5 #####
+
+    if channel_data[moveForwardBackwardChannel5] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-5'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-5'] = 0
+        LEGACY_COUNTERS['channel-5'] += 1
+        LEGACY_TIMESTAMPS['channel-5'] = current_time
+
+        if LEGACY_COUNTERS['channel-5'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[moveForwardBackwardChannel5], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-5'] = ('MOVE FORWARD', intensity)
+            LEGACY_COUNTERS['channel-5'] = 0
+
+    elif DEADBAND_LOW <= channel_data[moveForwardBackwardChannel5] <= DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-5'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-5'] = 0
+        LEGACY_COUNTERS['channel-5'] += 1
+        LEGACY_TIMESTAMPS['channel-5'] = current_time
+
+        if LEGACY_COUNTERS['channel-5'] >= JOYSTICK_THRESHOLD:
+            commands['channel-5'] = ('NEUTRAL', 0)
+            LEGACY_COUNTERS['channel-5'] = 0
+
+    elif channel_data[moveForwardBackwardChannel5] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-5'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-5'] = 0
+        LEGACY_COUNTERS['channel-5'] += 1
+        LEGACY_TIMESTAMPS['channel-5'] = current_time
+
+        if LEGACY_COUNTERS['channel-5'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[moveForwardBackwardChannel5], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-5'] = ('MOVE BACKWARD', intensity)
+            LEGACY_COUNTERS['channel-5'] = 0
+
+    ##### shift channel 6 #####
+
+    if channel_data[shiftLeftRightChannel6] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-6'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-6'] = 0
+        LEGACY_COUNTERS['channel-6'] += 1
+        LEGACY_TIMESTAMPS['channel-6'] = current_time
+
+        if LEGACY_COUNTERS['channel-6'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[shiftLeftRightChannel6], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-6'] = ('MOVE LEFT', intensity)
+            LEGACY_COUNTERS['channel-6'] = 0
+
+    elif DEADBAND_LOW <= channel_data[shiftLeftRightChannel6] <= DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-6'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-6'] = 0
+        LEGACY_COUNTERS['channel-6'] += 1
+        LEGACY_TIMESTAMPS['channel-6'] = current_time
+
+        if LEGACY_COUNTERS['channel-6'] >= JOYSTICK_THRESHOLD:
+            commands['channel-6'] = ('NEUTRAL', 0)
+            LEGACY_COUNTERS['channel-6'] = 0
+
+    elif channel_data[shiftLeftRightChannel6] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-6'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-6'] = 0
+        LEGACY_COUNTERS['channel-6'] += 1
+        LEGACY_TIMESTAMPS['channel-6'] = current_time
+
+        if LEGACY_COUNTERS['channel-6'] >= JOYSTICK_THRESHOLD:
+            intensity = getJoystickIntensity(channel_data[shiftLeftRightChannel6], DEADBAND_LOW, DEADBAND_HIGH)
+            commands['channel-6'] = ('MOVE RIGHT', intensity)
+            LEGACY_COUNTERS['channel-6'] = 0
+
+    ##### extra channel 7 #####
+
+    if channel_data[extraChannel7] < DEADBAND_LOW:
+        if current_time - LEGACY_TIMESTAMPS['channel-7'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-7'] = 0
+        LEGACY_COUNTERS['channel-7'] += 1
+        LEGACY_TIMESTAMPS['channel-7'] = current_time
+        if LEGACY_COUNTERS['channel-7'] >= TOGGLE_THRESHOLD:
+            commands['channel-7'] = ('+', 0)
+            LEGACY_COUNTERS['channel-7'] = 0
+    elif channel_data[extraChannel7] > DEADBAND_HIGH:
+        if current_time - LEGACY_TIMESTAMPS['channel-7'] > TIME_FRAME:
+            LEGACY_COUNTERS['channel-7'] = 0
+        LEGACY_COUNTERS['channel-7'] += 1
+        LEGACY_TIMESTAMPS['channel-7'] = current_time
+        if LEGACY_COUNTERS['channel-7'] >= TOGGLE_THRESHOLD:
+            commands['channel-7'] = ('-', 0)
+            LEGACY_COUNTERS['channel-7'] = 0
+
+    return commands # return channel requests
+
+
+
+def time_legacy(channel_data, number):
+    """
+    :param channel_data: Pulse width per GPIO pin, the same on every pass.
+    :param number: Passes to time.
+    :return: Microseconds per pass of the original interpreter.
+    """
+    return timeit.timeit(lambda: interpret_with_if_chains(channel_data), number=number) / number * 1e6
+
+
+def time_debounced(channel_data, number, pulse_period_us=20000):
+    """
+    Times the two halves of the edge-timed debouncer: recordPulse() once per pulse on
+    the pigpio callback thread and interpretCommands() once per control loop pass.
+
+    :param channel_data: Pulse width per GPIO pin, the same on every pulse.
+    :param number: Calls to time for each half.
+    :param pulse_period_us: Microseconds between a channel's pulses.
+    :return: (microseconds per pulse, microseconds per pass)
+    """
+    pulses = [(pin, channel_data[pin]) for pin in PWM_PINS]
+    state = {"tick": 0, "index": 0}
+
+    def pulse():
+        pin, pulse_width = pulses[state["index"]]
+        state["index"] = (state["index"] + 1) % len(pulses)
+        if state["index"] == 0:
+            state["tick"] = (state["tick"] + pulse_period_us) & 0xFFFFFFFF
+        recordPulse(pin, pulse_width, state["tick"])
+
+    per_pulse = timeit.timeit(pulse, number=number) / number * 1e6
+    per_pass = timeit.timeit(interpretCommands, number=number) / number * 1e6
+    return per_pulse, per_pass
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loop-counted copy-pasted receiver interpreter vs the edge-timed table")
+    parser.add_argument("--number", type=int, default=200000, help="Calls timed per case")
+    parser.add_argument("--loop-rate", type=float, default=1000, help="Control loop passes per second for the CPU estimate")
+    parser.add_argument("--pulse-rate", type=float, default=50, help="Pulses per second and channel from the receiver")
+    args = parser.parse_args()
+
+    idle = {pin: 1500 for pin in PWM_PINS}
+    driving = dict(idle)
+    driving[moveForwardBackwardChannel5] = 1100  # forward and turning, two joysticks outside the deadband
+    driving[rotateLeftRightChannel3] = 1800
+    pulses_per_second = args.pulse_rate * len(PWM_PINS)
+
+    for name, channel_data in (("idle", idle), ("driving", driving)):
+        legacy = time_legacy(channel_data, args.number)
+        per_pulse, per_pass = time_debounced(channel_data, args.number, int(1e6 / args.pulse_rate))
+        legacy_cpu = legacy * args.loop_rate / 1e4  # percent of one core
+        debounced_cpu = (per_pass * args.loop_rate + per_pulse * pulses_per_second) / 1e4
+        print(f"{name:>8}: if chains {legacy:5.2f} us/pass | table {per_pass:5.2f} us/pass + {per_pulse:5.2f} us/pulse | "
+              f"at {args.loop_rate:.0f} passes/s: {legacy_cpu:5.2f}% vs {debounced_cpu:5.2f}% of a core")
@@ -0,0 +1,112 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from initialize.initialize_opencv import load_and_compile_model
+from vision.frame_source import create_frame_source
+from vision.frame_decode import FrameDecoder, decoded_frame_size
+from vision.inference_engine import FrameInferRequest
+from vision.detection_postprocess import postprocess_detections, detection_boxes, iou_matrix
+from vision.object_tracker import ObjectTracker
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def run_tracker(frame_request, frames, detect_interval):
+    """
+    Runs the detector and tracker over a decoded clip the way the inference loop does.
+
+    :param frame_request: FrameInferRequest on a model with baked preprocessing.
+    :param frames: Decoded BGR frames.
+    :param detect_interval: Tracker detect interval, 1 runs the detector on every frame.
+    :return: Tracks per frame, the tracker and elapsed seconds.
+    """
+    tracker = ObjectTracker(detect_interval)
+    frame_size = (frames[0].shape[1], frames[0].shape[0])
+    tracks = []
+    start = time.perf_counter()
+    for frame in frames:
+        detections = None
+        if tracker.needs_detection():
+            detections = postprocess_detections(frame_request.infer(frame), frame_size)
+        tracks.append(tracker.step(detections))
+    return tracks, tracker, time.perf_counter() - start
+
+
+def id_stability(reference_tracks, tracks, iou_threshold=0.5):
+    """
+    Compares tracks against the detector-every-frame reference, frame by frame.
+
+    :param reference_tracks: Tracks per frame with the detector on every frame.
+    :param tracks: Tracks per frame under test.
+    :param iou_threshold: Smallest IoU for a track to cover a reference track.
+    :return: ID switches (a reference track changing which track covers it), matched
+        reference boxes and their mean IoU.
+    """
+    covering_id = {}  # reference track id -> track id that last covered it
+    switches = matched = 0
+    iou_total = 0.0
+    for reference, tested in zip(reference_tracks, tracks):
+        if not len(reference) or not len(tested):
+            continue
+        iou = iou_matrix(detection_boxes(reference), detection_boxes(tested))
+        best = iou.argmax(axis=1)
+        for row, column in enumerate(best.tolist()):
+            if iou[row, column] < iou_threshold:
+                continue
+            reference_id, track_id = int(reference['track_id'][row]), int(tested['track_id'][column])
+            if covering_id.get(reference_id, track_id) != track_id:
+                switches += 1
+            covering_id[reference_id] = track_id
+            matched += 1
+            iou_total += iou[row, column]
+    return switches, matched, iou_total / max(matched, 1)
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detector every frame vs detector every N frames with tracking")
+    parser.add_argument("--model", required=True, help="Path to person-detection-0200.xml")
+    parser.add_argument("--source", required=True, help="Recorded .mjpeg / .yuv clip")
+    parser.add_argument("--device", default="MYRIAD")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[2, 3, 5, 10])
+    args = parser.parse_args()
+
+    # Decode the whole clip up front so only detection and tracking are timed
+    source = create_frame_source(args.source, args.width, args.height, framerate=None)
+    decoder = FrameDecoder(frame_size=(args.width, args.height))
+    with source:
+        frames = [decoder.decode(frame.data) for frame in source]
+    frames = [frame for frame in frames if frame is not None]
+    print(f"Decoded {len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    compiled_model, _, _ = load_and_compile_model(args.model, args.device,
+                                                  decoded_frame_size((args.width, args.height), source.codec))
+    if compiled_model is None:
+        sys.exit(1)
+    frame_request = FrameInferRequest(compiled_model)
+
+    reference_tracks, reference_tracker, reference_seconds = run_tracker(frame_request, frames, 1)
+    reference_boxes = sum(len(tracks) for tracks in reference_tracks)
+
+    print(f"\n{'interval':>8} {'fps':>8} {'detector':>9} {'boxes/s':>9} {'ids':>5} {'switches':>9} {'recall':>7} {'mean IoU':>9}")
+    for interval in [1] + [interval for interval in args.intervals if interval > 1]:
+        if interval == 1:
+            tracks, tracker, seconds = reference_tracks, reference_tracker, reference_seconds
+        else:
+            tracks, tracker, seconds = run_tracker(frame_request, frames, interval)
+        switches, matched, mean_iou = id_stability(reference_tracks, tracks)
+        boxes = sum(len(frame_tracks) for frame_tracks in tracks)
+        unique_ids = len(np.unique(np.concatenate([frame_tracks['track_id'] for frame_tracks in tracks])))
+        print(f"{interval:>8} {len(frames) / seconds:8.1f} {tracker.detector_runs:>9} {boxes / seconds:9.1f} "
+              f"{unique_ids:>5} {switches:>9} {matched / max(reference_boxes, 1):7.2f} {mean_iou:9.3f}")
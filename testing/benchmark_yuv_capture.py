@@ -0,0 +1,118 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from vision.mjpeg_splitter import MJPEGSplitter
+from vision.frame_decode import FrameDecoder
+from vision.yuv_reader import YUV420Reader
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def write_synthetic_recordings(directory, width, height, frame_count):
+    """
+    Writes the same synthetic clip as an MJPEG stream and as raw I420 frames.
+
+    :param directory: Output directory.
+    :param width: Frame width.
+    :param height: Frame height.
+    :param frame_count: Number of frames.
+    :return: (mjpeg_path, yuv_path)
+    """
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    base = cv2.resize(base, (width, height), interpolation=cv2.INTER_CUBIC)
+    mjpeg_path = os.path.join(directory, "clip.mjpeg")
+    yuv_path = os.path.join(directory, "clip.yuv")
+
+    with open(mjpeg_path, "wb") as mjpeg_file, open(yuv_path, "wb") as yuv_file:
+        for i in range(frame_count):
+            frame = np.roll(base, i * 4, axis=1)
+            mjpeg_file.write(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes())
+            yuv_file.write(cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420).tobytes())
+
+    return mjpeg_path, yuv_path
+
+
+def run_mjpeg_path(path, model_size):
+    """
+    Splits, decodes at reduced scale and resizes every frame to the model input.
+
+    :param path: MJPEG recording.
+    :param model_size: (width, height) model input.
+    :return: Number of frames processed.
+    """
+    splitter = MJPEGSplitter()
+    decoder = FrameDecoder(target_size=model_size)
+    frames = 0
+    with open(path, "rb", buffering=0) as stream:
+        while splitter.fill_from(stream):
+            for frame_data in splitter.frames():
+                frame = decoder.decode(frame_data)
+                cv2.resize(frame, model_size)
+                frames += 1
+    return frames
+
+
+def run_yuv_path(path, width, height, model_size):
+    """
+    Reads raw frames into the preallocated pool and converts only the model-sized planes.
+
+    :param path: Raw I420 recording.
+    :param width: Frame width.
+    :param height: Frame height.
+    :param model_size: (width, height) model input.
+    :return: Number of frames processed.
+    """
+    frames = 0
+    with open(path, "rb", buffering=0) as stream:
+        reader = YUV420Reader(stream, width, height)
+        while True:
+            frame = reader.read()
+            if frame is None:
+                break
+            reader.to_bgr(frame, model_size)
+            frames += 1
+    return frames
+
+
+def measure(name, function, *args):
+    """
+    Prints CPU time and wall time per frame for one capture path.
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    frames = function(*args)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    print(f"{name:>6}: {frames} frames, {cpu / frames * 1000:6.2f} ms CPU/frame, {wall / frames * 1000:6.2f} ms wall/frame")
+
+
+########## MAIN EXECUTION ##########
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU per frame of the MJPEG and raw YUV420 capture paths")
+    parser.add_argument("--mjpeg", help="MJPEG recording (rpicam-vid --codec mjpeg -o clip.mjpeg)")
+    parser.add_argument("--yuv", help="Raw recording of the same scene (rpicam-vid --codec yuv420 -o clip.yuv)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    model_size = (256, 256)
+
+    with tempfile.TemporaryDirectory() as directory:
+        mjpeg_path, yuv_path = args.mjpeg, args.yuv
+        if mjpeg_path is None or yuv_path is None:
+            mjpeg_path, yuv_path = write_synthetic_recordings(directory, args.width, args.height, args.frames)
+
+        measure("mjpeg", run_mjpeg_path, mjpeg_path, model_size)
+        measure("yuv420", run_yuv_path, yuv_path, args.width, args.height, model_size)
@@ -0,0 +1,219 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from initialize.initialize_opencv import (load_and_compile_model, model_variant_path, available_model_variants,
+                                          MODEL_VARIANTS, MODEL_REFERENCE_VARIANT)
+from vision.frame_source import create_frame_source
+from vision.frame_recorder import RecordingReader, list_segments
+from vision.frame_decode import FrameDecoder, jpeg_dimensions
+from vision.inference_engine import FrameInferRequest
+from vision.detection_postprocess import postprocess_detections, detection_boxes, iou_matrix
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def load_frames(source_spec, clip_size, frame_count):
+    """
+    Reads the JPEG frames every variant runs on, from a recording session directory or a
+    recorded .mjpeg clip.
+
+    :param source_spec: Session directory (segment_NNNN.mjpeg + .idx) or .mjpeg clip.
+    :param clip_size: (width, height) of a clip, ignored for sessions.
+    :param frame_count: Most frames to keep.
+    :return: List of JPEG bytes.
+    """
+    if os.path.isdir(source_spec):
+        frames = []
+        for path in list_segments(source_spec):
+            reader = RecordingReader(path)
+            frames.extend(bytes(reader.frame(position)) for position in range(min(len(reader), frame_count - len(frames))))
+            reader.close()
+            if len(frames) >= frame_count:
+                break
+        return frames
+
+    source = create_frame_source(source_spec, clip_size[0], clip_size[1], framerate=None)
+    with source:
+        return [bytes(frame.data) for frame in itertools.islice(source, frame_count)]
+
+
+def percentiles(seconds):
+    """
+    :param seconds: Latencies in seconds.
+    :return: p50/p95/p99 and mean in milliseconds.
+    """
+    milliseconds = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "mean_ms": round(float(milliseconds.mean()), 3)}
+
+
+def run_variant(model, device_name, jpeg_frames, warmup):
+    """
+    Runs one variant over every frame. Runs in its own process so peak RSS belongs to it
+    alone; frames are decoded before the model is loaded, so the RSS the model adds is
+    reported separately.
+
+    :param model: MODEL_VARIANTS name or path to an IR.
+    :param device_name: Device to run on.
+    :param jpeg_frames: JPEG frames from load_frames.
+    :param warmup: Frames run before measuring.
+    :return: Report dict, plus the detections of every frame under "detections".
+    """
+    sys.stdout = sys.stderr  # loader messages must not end up in the JSON report on stdout
+    decoder = FrameDecoder()
+    frames = [decoder.decode(frame, full_resolution=True) for frame in jpeg_frames]
+    frame_size = (frames[0].shape[1], frames[0].shape[0])
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    timings = {}
+    compiled_model, _, _ = load_and_compile_model(model, device_name, frame_size, timings=timings)
+    if compiled_model is None:
+        return {"variant": model, "error": "model failed to load"}
+    request = FrameInferRequest(compiled_model)
+
+    for frame in frames[:warmup]:
+        request.infer(frame)
+
+    latencies = []
+    detections = []
+    start = time.perf_counter()
+    for frame in frames:
+        frame_start = time.monotonic()
+        detections.append(postprocess_detections(request.infer(frame), frame_size))
+        latencies.append(time.monotonic() - frame_start)
+    elapsed = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kilobytes on Linux
+    return {
+        "variant": model,
+        "device": timings["device"],
+        "fps": round(len(frames) / elapsed, 2),
+        "latency": percentiles(latencies),
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "model_rss_mb": round((peak_rss - rss_before) / 1024, 1),
+        "detections": detections,
+    }
+
+
+def agreement(reference, detections, iou_threshold):
+    """
+    Matches a variant's detections to the reference variant's, frame by frame, best IoU
+    first, each box matched at most once.
+
+    :param reference: Reference detections per frame.
+    :param detections: Detections per frame under test.
+    :param iou_threshold: Smallest IoU for two boxes to be the same person.
+    :return: Recall and precision against the reference and the mean IoU of matches.
+    """
+    reference_total = tested_total = matched = 0
+    iou_total = 0.0
+    for expected, found in zip(reference, detections):
+        reference_total += len(expected)
+        tested_total += len(found)
+        if not len(expected) or not len(found):
+            continue
+        iou = iou_matrix(detection_boxes(expected), detection_boxes(found))
+        while True:
+            row, column = np.unravel_index(iou.argmax(), iou.shape)
+            if iou[row, column] < iou_threshold:
+                break
+            matched += 1
+            iou_total += float(iou[row, column])
+            iou[row, :] = -1
+            iou[:, column] = -1
+    return {
+        "reference_detections": reference_total,
+        "detections": tested_total,
+        "recall": round(matched / reference_total, 4) if reference_total else None,
+        "precision": round(matched / tested_total, 4) if tested_total else None,
+        "mean_iou": round(iou_total / matched, 4) if matched else None,
+    }
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Side by side latency, memory and agreement of person detector variants")
+    parser.add_argument("source", help="Recording session directory or recorded .mjpeg clip")
+    parser.add_argument("--clip-size", default="640x480", help="WIDTHxHEIGHT of a clip")
+    parser.add_argument("--variants", nargs="+", help="MODEL_VARIANTS names or IR paths, every variant on disk by default")
+    parser.add_argument("--reference", default=MODEL_REFERENCE_VARIANT, help="Variant the others are compared against")
+    parser.add_argument("--device", default="CPU", help="Device every variant runs on")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to run")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured frames per variant")
+    parser.add_argument("--iou", type=float, default=0.5, help="Smallest IoU for a detection to match the reference")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02, help="Accuracy budget: recall a variant may lose")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    variants = args.variants or available_model_variants()
+    variants = [args.reference] + [variant for variant in variants if variant != args.reference]
+    for variant in variants:
+        if not os.path.exists(model_variant_path(variant)):
+            sys.exit(f"{variant}: no IR at {model_variant_path(variant)}")
+
+    width, height = (int(value) for value in args.clip_size.lower().split("x"))
+    frames = load_frames(args.source, (width, height), args.frames)
+    if not frames:
+        sys.exit(f"No frames in {args.source}")
+    width, height = jpeg_dimensions(frames[0])
+    print(f"{len(frames)} frames at {width}x{height}, {len(variants)} variants on {args.device}.", file=sys.stderr)
+
+    # A fresh spawned process per variant, so peak RSS and device state do not carry over
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for variant in variants:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(run_variant, variant, args.device, frames, args.warmup).result())
+
+    if "error" in results[0]:
+        sys.exit(f"Reference {args.reference}: {results[0]['error']}")
+
+    reference_detections = results[0]["detections"]
+    for result in results:
+        if "error" in result:
+            print(f"{result['variant']:>28}: {result['error']}", file=sys.stderr)
+            continue
+        result["agreement"] = agreement(reference_detections, result.pop("detections"), args.iou)
+        recall = result["agreement"]["recall"]
+        result["within_budget"] = recall is None or recall >= 1 - args.max_recall_drop
+        print(f"{result['variant']:>28} {result['device']:>6}: {result['fps']:7.1f} fps, p95 {result['latency']['p95_ms']:.1f} ms, "
+              f"model {result['model_rss_mb']:.0f} MB, recall {recall if recall is not None else '-'}", file=sys.stderr)
+
+    candidates = [result for result in results if result.get("within_budget")]
+    best = max(candidates, key=lambda result: result["fps"])["variant"]
+    print(f"Fastest within a {args.max_recall_drop:.0%} recall drop: {best}", file=sys.stderr)
+
+    report = {
+        "source": args.source,
+        "frames": len(frames),
+        "frame_size": [width, height],
+        "device": args.device,
+        "reference": args.reference,
+        "iou_threshold": args.iou,
+        "max_recall_drop": args.max_recall_drop,
+        "registry": {name: variant._asdict() for name, variant in MODEL_VARIANTS.items()},
+        "recommended": best,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,165 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+from vision.qos_governor import QoSGovernor, QOS_LEVELS, QOS_WINDOW
+
+
+########## FUNCTION DEFINITIONS ##########
+
+class SimulatedWorker:
+    """
+    Stands in for VisionWorker: submitted frames are handled one at a time, latest wins,
+    and each takes a time that shrinks with the decode reduction the governor sets.
+    """
+    def __init__(self, infer_ms, decode_ms):
+        self.infer_ms = infer_ms
+        self.decode_ms = decode_ms
+        self.inference_stride = 1
+        self.decode_reduction = 1
+        self.busy_until = 0.0
+        self.running = None  # (frame timestamp, completion time) of the frame being worked on
+        self.pending = None  # newest submitted frame timestamp the worker has not started on
+        self.quality_changes = []
+
+    def set_quality(self, inference_stride, decode_reduction):
+        self.inference_stride = inference_stride
+        self.decode_reduction = decode_reduction
+        self.quality_changes.append((inference_stride, decode_reduction))
+
+    def set_camera_size(self, width, height):
+        pass  # simulated frames carry no pixels
+
+    def cost(self):
+        return (self.infer_ms + self.decode_ms / self.decode_reduction ** 2) / 1000.0
+
+    def submit(self, sequence, timestamp):
+        if sequence % self.inference_stride == 0:
+            self.pending = timestamp  # overwrites a frame the worker did not get to
+
+    def results(self, now):
+        """
+        :param now: Simulated time.
+        :return: Latencies (capture to publish) of the results published up to now.
+        """
+        latencies = []
+        while True:
+            if self.running is None and self.pending is not None:
+                start = max(self.busy_until, self.pending)
+                self.running = (self.pending, start + self.cost())
+                self.pending = None
+            if self.running is None or self.running[1] > now:
+                return latencies
+            timestamp, completed = self.running
+            latencies.append(completed - timestamp)
+            self.busy_until = completed
+            self.running = None
+
+
+class SimulatedCamera:
+    """
+    Stands in for CameraSupervisor, only the framerate matters to the simulation.
+    """
+    def __init__(self, width=640, height=480, framerate=30):
+        self.width, self.height, self.framerate = width, height, framerate
+
+    def reconfigure(self, width, height, framerate):
+        self.width, self.height, self.framerate = width, height, framerate
+
+
+def simulate(worker, duration_s, loop_ms=1.0, load_changes=()):
+    """
+    Runs the control loop once per camera frame against a simulated worker, the way
+    runRobot does: the loop itself only takes loop_ms, the vision work happens in the
+    worker and reaches the governor through result().
+
+    :param worker: SimulatedWorker.
+    :param duration_s: Simulated seconds.
+    :param loop_ms: Milliseconds of budgeted loop work per frame.
+    :param load_changes: (time_s, infer_ms) changes of the worker's inference time.
+    :return: (governor, camera).
+    """
+    camera = SimulatedCamera()
+    governor = QoSGovernor(camera=camera, vision=worker)
+    load_changes = sorted(load_changes)
+    now, sequence = 0.0, 0
+    while now < duration_s:
+        while load_changes and load_changes[0][0] <= now:
+            worker.infer_ms = load_changes.pop(0)[1]
+        sequence += 1
+        loop_time = governor.begin_loop(now)
+        worker.submit(sequence, now)
+        for latency in worker.results(now):
+            governor.result(latency)
+        governor.stage("vision", loop_time, now + loop_ms / 1000.0)
+        governor.end_loop(now + loop_ms / 1000.0)
+        now += 1.0 / camera.framerate
+    return governor, camera
+
+
+def run_checks(overload_ms):
+    """
+    Drives the governor through the scenarios it has to get right and prints a line per
+    check.
+
+    :param overload_ms: Worker inference time per frame that overloads it at full quality.
+    :return: Number of failed checks.
+    """
+    failures = 0
+
+    def check(name, passed, detail):
+        nonlocal failures
+        failures += not passed
+        print(f"{'PASS' if passed else 'FAIL'}  {name}: {detail}")
+
+    window_s = QOS_WINDOW / 30.0
+
+    ##### a worker within budget keeps full quality #####
+
+    governor, _ = simulate(SimulatedWorker(infer_ms=8.0, decode_ms=3.0), 20 * window_s)
+    check("fast worker", governor.level.name == "full" and not governor.transitions,
+          f"level {governor.level.name} after {governor.loops} loops, {governor.result_misses} result misses")
+
+    ##### an overloaded worker steps down, although the loop itself stays fast #####
+
+    worker = SimulatedWorker(infer_ms=overload_ms, decode_ms=12.0)
+    governor, camera = simulate(worker, 20 * window_s)
+    vision_p95 = governor.stats()['stages']['vision']['p95_ms']
+    check("overloaded worker", governor.index > 0,
+          f"level {governor.level.name} with the vision stage at p95 {vision_p95} ms, transitions {[t.to_level for t in governor.transitions]}")
+    check("worker shed", worker.quality_changes and worker.quality_changes[-1] == (governor.level.inference_stride, governor.level.decode_reduction),
+          f"worker set to stride {worker.inference_stride}, 1/{worker.decode_reduction} decode")
+    check("settles", all(t.to_level == QOS_LEVELS[i + 1].name for i, t in enumerate(governor.transitions)),
+          f"only stepped down, settled at {governor.level.name}, camera {camera.width}x{camera.height} at {camera.framerate} fps")
+
+    ##### a heavier load keeps stepping until the worker fits its budget #####
+
+    governor, _ = simulate(SimulatedWorker(infer_ms=overload_ms + 15.0, decode_ms=12.0), 20 * window_s)
+    check("heavier load", governor.index >= 2,
+          f"level {governor.level.name}, transitions {[t.to_level for t in governor.transitions]}")
+
+    ##### the level comes back once the load is gone #####
+
+    worker = SimulatedWorker(infer_ms=overload_ms, decode_ms=12.0)
+    governor, _ = simulate(worker, 40 * window_s, load_changes=[(10 * window_s, 5.0)])
+    check("recovery", governor.level.name == "full" and len(governor.transitions) >= 2,
+          f"level {governor.level.name} after the load dropped, transitions {[t.to_level for t in governor.transitions]}")
+
+    return failures
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the QoS governor with a simulated vision worker")
+    parser.add_argument("--overload-ms", type=float, default=45.0,
+                        help="Worker inference time per frame that overloads it at full quality")
+    args = parser.parse_args()
+
+    failures = run_checks(args.overload_ms)
+    print(f"{failures} checks failed" if failures else "All checks passed")
+    sys.exit(1 if failures else 0)
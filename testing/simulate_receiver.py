@@ -0,0 +1,174 @@
+########## IMPORT DEPENDENCIES ##########
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
+
+import initialize.initialize_receiver as receiver
+from initialize.initialize_receiver import (
+    recordPulse, interpretCommands, PWM_PINS, JOYSTICK_HOLD_MS, TOGGLE_HOLD_MS, PULSE_GAP_MS,
+    moveForwardBackwardChannel5, extraChannel7,
+)
+
+
+########## FUNCTION DEFINITIONS ##########
+
+def reset_receiver():
+    """
+    Puts the debouncer back to its state at import, so every run starts from centered
+    sticks without any pulses seen.
+    """
+    channels = len(PWM_PINS)
+    receiver.CHANNEL_ZONES[:] = [1] * channels
+    receiver.CHANNEL_HOLD_STARTS[:] = [0] * channels
+    receiver.CHANNEL_LAST_TICKS[:] = [None] * channels
+    receiver.CHANNEL_NEXT_FIRES[:] = [0] * channels
+    receiver.CHANNEL_FIRED[:] = [(0, None, 0)] * channels
+    receiver.CHANNEL_SEEN[:] = [0] * channels
+
+
+def simulate(moves, duration_ms, loop_period_ms, stalls=(), dropouts=(), pulse_period_ms=20.0, tick_origin=0):
+    """
+    Replays a synthetic pulse timeline: every channel sends a pulse each pulse_period_ms
+    (channels staggered by 2 ms, as a receiver sends them one after another) carrying
+    the stick position at that moment, and the control loop calls interpretCommands()
+    every loop_period_ms except while stalled.
+
+    :param moves: (time_ms, pin, pulse_width) stick and switch movements.
+    :param duration_ms: Length of the timeline.
+    :param loop_period_ms: Milliseconds between control loop passes.
+    :param stalls: (start_ms, length_ms) spans the loop is blocked, e.g. by walkForward.
+    :param dropouts: (start_ms, length_ms) spans without any pulses, the signal is lost.
+    :param pulse_period_ms: Milliseconds between a channel's pulses.
+    :param tick_origin: pigpio tick (microseconds) at time 0, to test the 32-bit wrap.
+    :return: List of (time_ms, channel, action, intensity) as the loop received them.
+    """
+    reset_receiver()
+    events = []  # (time_ms, order, pin), pulses sort before a loop pass at the same time
+    for index, pin in enumerate(PWM_PINS):
+        time_ms = index * 2.0
+        while time_ms < duration_ms:
+            if not any(start <= time_ms < start + length for start, length in dropouts):
+                events.append((time_ms, 0, pin))
+            time_ms += pulse_period_ms
+
+    time_ms = 0.0
+    while time_ms < duration_ms:
+        stall = next(((start, length) for start, length in stalls if start <= time_ms < start + length), None)
+        if stall is not None:
+            time_ms = stall[0] + stall[1]
+            continue
+        events.append((time_ms, 1, None))
+        time_ms += loop_period_ms
+
+    positions = {pin: 1500 for pin in PWM_PINS}
+    moves = sorted(moves)
+    move_index = 0
+    received = []
+    for time_ms, order, pin in sorted(events):
+        while move_index < len(moves) and moves[move_index][0] <= time_ms:
+            _, moved_pin, pulse_width = moves[move_index]
+            positions[moved_pin] = pulse_width
+            move_index += 1
+        if order == 0:
+            recordPulse(pin, positions[pin], (tick_origin + int(round(time_ms * 1000))) & 0xFFFFFFFF)
+        else:
+            for channel, (action, intensity) in interpretCommands().items():
+                received.append((time_ms, channel, action, intensity))
+    return received
+
+
+def first(received, channel, action, after_ms=0.0):
+    """
+    :param received: Output of simulate().
+    :param channel: Channel name.
+    :param action: Action name.
+    :param after_ms: Ignore commands before this time.
+    :return: Time the loop first received the command, or None.
+    """
+    return next((time_ms for time_ms, name, command, _ in received
+                 if name == channel and command == action and time_ms >= after_ms), None)
+
+
+def run_checks(loop_rates):
+    """
+    Drives the debouncer through the scenarios it has to get right and prints a line per
+    check.
+
+    :param loop_rates: Control loop passes per second to compare.
+    :return: Number of failed checks.
+    """
+    failures = 0
+
+    def check(name, passed, detail):
+        nonlocal failures
+        failures += not passed
+        print(f"{'PASS' if passed else 'FAIL'}  {name}: {detail}")
+
+    forward = [(100.0, moveForwardBackwardChannel5, 1100), (500.0, moveForwardBackwardChannel5, 1500)]
+
+    ##### latency follows the hold time, not the loop rate #####
+
+    latencies = {}
+    for rate in loop_rates:
+        received = simulate(forward, 700, 1000.0 / rate)
+        received_at = first(received, 'channel-5', 'MOVE FORWARD')
+        latencies[rate] = None if received_at is None else received_at - 100.0
+        bound = JOYSTICK_HOLD_MS + 20.0 + 1000.0 / rate  # hold, up to a pulse period to see the move, up to a loop period to pick it up
+        check(f"forward at {rate:g} passes/s", latencies[rate] is not None and JOYSTICK_HOLD_MS <= latencies[rate] <= bound,
+              f"received {latencies[rate]} ms after the stick moved, expected {JOYSTICK_HOLD_MS}-{bound:.0f} ms")
+
+    ##### repeats while held, at the hold time #####
+
+    received = simulate(forward, 700, 1.0)
+    repeats = sum(1 for _, name, action, _ in received if name == 'channel-5' and action == 'MOVE FORWARD')
+    expected = int((500 - 100) // JOYSTICK_HOLD_MS)
+    check("repeat while held", abs(repeats - expected) <= 1, f"{repeats} commands in 400 ms, expected about {expected}")
+
+    ##### a blip shorter than the hold never fires #####
+
+    blip = [(100.0, moveForwardBackwardChannel5, 1100), (100.0 + JOYSTICK_HOLD_MS - 25, moveForwardBackwardChannel5, 1500)]
+    received = simulate(blip, 500, 1.0)
+    check("short blip", first(received, 'channel-5', 'MOVE FORWARD') is None,
+          f"{JOYSTICK_HOLD_MS - 25} ms stick blip fired {'nothing' if first(received, 'channel-5', 'MOVE FORWARD') is None else 'a command'}")
+
+    ##### a switch flipped while the loop is blocked is still delivered #####
+
+    flip = [(300.0, extraChannel7, 1000), (300.0 + TOGGLE_HOLD_MS + 100, extraChannel7, 1500)]
+    received = simulate(flip, 3000, 1.0, stalls=[(200.0, 2000.0)])
+    received_at = first(received, 'channel-7', '+')
+    check("switch during a 2 s block", received_at is not None and received_at <= 2201.0,
+          f"'+' received at {received_at} ms, the loop resumed at 2200 ms")
+
+    ##### 32-bit pigpio tick wrap inside a hold #####
+
+    received = simulate(forward, 700, 1.0, tick_origin=(1 << 32) - 130000)
+    wrapped = first(received, 'channel-5', 'MOVE FORWARD')
+    check("tick wrap", wrapped is not None and wrapped - 100.0 == latencies.get(1000, wrapped - 100.0),
+          f"received {None if wrapped is None else wrapped - 100.0} ms after the stick moved with the tick wrapping at 130 ms")
+
+    ##### a dropout longer than PULSE_GAP_MS restarts the hold #####
+
+    held = [(100.0, moveForwardBackwardChannel5, 1100), (1000.0, moveForwardBackwardChannel5, 1500)]
+    dropout_end = 140.0 + PULSE_GAP_MS + 60
+    received = simulate(held, 1000, 1.0, dropouts=[(140.0, PULSE_GAP_MS + 60)])
+    resumed = first(received, 'channel-5', 'MOVE FORWARD', after_ms=140.0)
+    check("signal dropout", resumed is not None and resumed - dropout_end >= JOYSTICK_HOLD_MS,
+          f"first command after the dropout {None if resumed is None else round(resumed - dropout_end, 1)} ms after pulses resumed")
+
+    return failures
+
+
+########## MAIN EXECUTION ##########
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the edge-timed receiver debouncer with synthetic pulse timelines")
+    parser.add_argument("--loop-rates", nargs="+", type=float, default=[1000, 100, 20],
+                        help="Control loop passes per second to compare")
+    args = parser.parse_args()
+
+    failures = run_checks(args.loop_rates)
+    print(f"{failures} checks failed" if failures else "All checks passed")
+    sys.exit(1 if failures else 0)
@@ -1,118 +1,178 @@
 ########## IMPORT DEPENDENCIES ##########
 
-from openvino.runtime import Core
 import numpy as np
 import cv2
-import subprocess
+import argparse
+import os
+import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # make repo modules importable
 
-########## FUNCTION DEFINITIONS ##########
-
-def load_and_compile_model(model_xml_path, device_name="MYRIAD"):
-    """
-    Loads and compiles an OpenVINO model.
-
-    :param model_xml_path: Path to the model XML file.
-    :param device_name: Device to compile the model on (e.g., CPU, MYRIAD).
-    :return: (compiled_model, input_layer, output_layer)
-    """
-    ie = Core()
-    try:
-        # The BIN path is derived by replacing .xml with .bin if needed:
-        # If you want to keep them separate, you can parametrize model_bin_path as well.
-        model_bin_path = model_xml_path.replace(".xml", ".bin")
-
-        model = ie.read_model(model=model_xml_path)
-        compiled_model = ie.compile_model(model=model, device_name=device_name)
-        input_layer = compiled_model.input(0)
-        output_layer = compiled_model.output(0)
-
-        print(f"Model loaded and compiled successfully on {device_name}.")
-        print(f"Model input shape: {input_layer.shape}")
-
-        return compiled_model, input_layer, output_layer
-    except Exception as e:
-        print(f"Failed to load and compile model: {e}")
-        exit(1)
+from vision.frame_source import create_frame_source
+from vision.frame_decode import FrameDecoder, decoded_frame_size
+from vision.annotated_writer import AnnotatedVideoWriter, draw_detections
+from vision.detection_postprocess import postprocess_detections, offset_detections
+from vision.scene_gate import SceneChangeGate
+from vision.object_tracker import ObjectTracker
+from vision.region_of_interest import RegionOfInterest
+from vision.tiled_inference import TiledInferRequest, tile_layout, TILE_SIZE
+from vision.qos_governor import QoSGovernor
+from vision.inference_engine import AsyncInferenceEngine, FrameInferRequest
+from initialize.initialize_opencv import load_and_compile_model, start_model_warm_up
 
 
-def test_with_dummy_input(compiled_model, input_layer, output_layer):
-    """
-    Sends dummy input to the compiled model to ensure it works.
-
-    :param compiled_model: The compiled OpenVINO model.
-    :param input_layer: The model's input layer.
-    :param output_layer: The model's output layer.
-    """
-    try:
-        dummy_input_shape = input_layer.shape
-        dummy_input = np.ones(dummy_input_shape, dtype=np.float32)
-        results = compiled_model([dummy_input])[output_layer]
-        print("Dummy input test passed!")
-    except Exception as e:
-        print(f"Error with dummy input: {e}")
-        exit(1)
-
+########## FUNCTION DEFINITIONS ##########
 
-def start_camera_process(width=640, height=480, framerate=30):
+def handle_detections(frame, results, sequence, annotated_writer=None, show_preview=True, tracker=None, roi=None,
+                      tiler=None):
     """
-    Starts the rpicam-vid process to output MJPEG data via stdout.
-
-    :param width: Desired camera width.
-    :param height: Desired camera height.
-    :param framerate: Desired framerate.
-    :return: Subprocess object.
+    Hands one frame's detections to the annotated writer and the preview window.
+
+    :param frame: Decoded BGR frame the detections belong to.
+    :param results: Raw model output, [1, 1, 200, 7], or None on a frame the detector
+        skipped because the tracker predicts it.
+    :param sequence: Source frame sequence number.
+    :param annotated_writer: Optional started AnnotatedVideoWriter.
+    :param show_preview: Draw detections and show them in a window in this process.
+    :param tracker: Optional ObjectTracker, steps once per frame and replaces the
+        detections with its tracks.
+    :param roi: Optional RegionOfInterest; results belong to its last planned region and
+        the detections steer the next one.
+    :param tiler: Optional TiledInferRequest the results came from; tile detections are
+        merged into frame coordinates.
+    :return: False once the user pressed q in the preview window.
     """
-    camera_process = subprocess.Popen(
-        [
-            "rpicam-vid", "--width", str(width), "--height", str(height),
-            "--framerate", str(framerate), "--timeout", "0",
-            "--output", "-", "--codec", "mjpeg", "--nopreview"
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        bufsize=0
-    )
-    return camera_process
-
-
-def inference_loop(compiled_model, input_layer, output_layer, camera_process):
+    detections = None
+    if results is not None and tiler is not None:
+        # Move every tile's boxes onto the frame and suppress duplicates across tiles
+        detections = tiler.postprocess(results, (frame.shape[1], frame.shape[0]))
+    elif results is not None and roi is not None:
+        # Scale to the cropped region, then move the boxes back onto the full frame
+        x0, y0, x1, y1 = roi.region
+        detections = offset_detections(postprocess_detections(results, (x1 - x0, y1 - y0)), x0, y0)
+    elif results is not None:
+        # Threshold, scale to the frame and suppress overlapping boxes in one vectorized pass
+        detections = postprocess_detections(results, (frame.shape[1], frame.shape[0]))
+
+    if tracker is not None:
+        # Correct the tracks with the detections, or just predict them on skipped frames
+        detections = tracker.step(detections)
+
+    if roi is not None:
+        roi.update(detections)
+
+    # Hand the undrawn frame to the writer process, it never blocks this loop
+    if annotated_writer is not None:
+        annotated_writer.submit(frame, detections, sequence)
+
+    if show_preview:
+        # Draw detections on the frame
+        draw_detections(frame, detections)
+
+        # Display the frame
+        cv2.imshow("OpenVINO Inference", frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            return False
+
+    return True
+
+
+def inference_loop(compiled_model, input_layer, output_layer, source, show_full_resolution=False,
+                   annotated_writer=None, show_preview=True, scene_gate=None, engine=None,
+                   baked_preprocessing=False, tracker=None, roi=None, tiled=False, qos_deadline=None):
     """
-    Continuously reads frames from the camera process, performs inference,
+    Continuously reads frames from a frame source, performs inference,
     and displays the resulting frames.
 
     :param compiled_model: The compiled OpenVINO model.
     :param input_layer: The model's input layer.
     :param output_layer: The model's output layer.
-    :param camera_process: The subprocess object capturing the camera feed.
+    :param source: Started FrameSource (camera, recording or synthetic).
+    :param show_full_resolution: Decode every frame at full size for the preview window
+        instead of the reduced size the model needs.
+    :param annotated_writer: Optional started AnnotatedVideoWriter; frames and raw
+        detections are handed to its process, which draws and encodes them.
+    :param show_preview: Draw detections and show them in a window in this process.
+    :param scene_gate: Optional SceneChangeGate; unchanged frames reuse the last result
+        instead of running inference.
+    :param engine: Optional AsyncInferenceEngine; frames are submitted without waiting and
+        their results handled in frame order as they complete.
+    :param baked_preprocessing: The model was compiled with frame_size and takes the
+        decoded uint8 BGR frame as-is.
+    :param tracker: Optional ObjectTracker (synchronous inference only); the detector
+        only runs when the tracker asks for it and tracks are predicted in between.
+    :param roi: Optional RegionOfInterest (synchronous inference without baked
+        preprocessing only); frames are decoded at full resolution and the model sees a
+        crop around the previous detections, or the whole frame on full scans.
+    :param tiled: The model was compiled for a batch of baked TILE_SIZE tiles; frames are
+        decoded at full resolution and all their tiles run in one request.
+    :param qos_deadline: Optional loop deadline in seconds (synchronous inference only);
+        a QoSGovernor skips inference frames and lowers the decode scale while the loop
+        misses it.
     """
-    mjpeg_buffer = b''
+    decoder = FrameDecoder(target_size=(256, 256), frame_size=(source.width, source.height))
+    frame_request = FrameInferRequest(compiled_model) if baked_preprocessing and engine is None else None
+    tiler = TiledInferRequest(compiled_model) if tiled else None
+    governor = QoSGovernor(qos_deadline, decoder=decoder) if qos_deadline else None
+    last_results = None
+    running = True
 
     try:
-        while True:
-            # Read MJPEG data
-            chunk = camera_process.stdout.read(4096)
-            if not chunk:
-                print("Camera process stopped sending data.")
+        while running:
+            # Judge the previous frame's loop, waiting for the source below is not loop work
+            if governor is not None:
+                governor.end_loop()
+
+            # Read the newest frame from the source
+            source_frame = source.read()
+            if source_frame is None:
+                print("Frame source stopped sending data.")
                 break
 
-            mjpeg_buffer += chunk
+            # Decode frame, scaled down in the DCT domain unless the preview wants full size
+            loop_time = governor.begin_loop() if governor is not None else None
+            frame = decoder.decode(source_frame.data, full_resolution=show_full_resolution or roi is not None or tiled)
+            if governor is not None:
+                loop_time = governor.stage("decode", loop_time)
+
+            if frame is not None:
+                try:
+                    # Reuse the last result while the scene is static
+                    if scene_gate is not None and not scene_gate.should_infer(frame):
+                        running = handle_detections(frame, scene_gate.result, source_frame.sequence,
+                                                    annotated_writer, show_preview, tracker, roi, tiler)
+                        continue
+
+                    # Shed inference on some frames while the loop is over budget
+                    if governor is not None and not governor.should_infer(source_frame.sequence) \
+                            and (tracker is not None or last_results is not None):
+                        running = handle_detections(frame, None if tracker is not None else last_results,
+                                                    source_frame.sequence, annotated_writer, show_preview,
+                                                    tracker, roi, tiler)
+                        continue
+
+                    # Let the tracker predict frames between detector runs
+                    if tracker is not None and not tracker.needs_detection():
+                        running = handle_detections(frame, None, source_frame.sequence,
+                                                    annotated_writer, show_preview, tracker, roi)
+                        continue
+
+                    if tiler is not None:
+                        # The tiles are copied straight out of the frame into the batch
+                        input_blob = None
+                    elif baked_preprocessing:
+                        # The model converts, resizes and transposes the frame itself
+                        input_blob = frame[np.newaxis]
+                    else:
+                        # Crop to the region around the previous detections, at full resolution
+                        model_frame = frame
+                        if roi is not None:
+                            x0, y0, x1, y1 = roi.plan((frame.shape[1], frame.shape[0]))
+                            model_frame = frame[y0:y1, x0:x1]
 
-            # Find JPEG frame markers
-            start_idx = mjpeg_buffer.find(b'\xff\xd8')
-            end_idx = mjpeg_buffer.find(b'\xff\xd9')
-
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                # Extract and decode frame
-                frame_data = mjpeg_buffer[start_idx:end_idx + 2]
-                mjpeg_buffer = mjpeg_buffer[end_idx + 2:]
-                frame = cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), cv2.IMREAD_COLOR)
-
-                if frame is not None:
-                    try:
                         # Convert frame to RGB if required by the model
                         # (some models expect BGR, some expect RGB; adjust as needed)
-                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                        frame_rgb = cv2.cvtColor(model_frame, cv2.COLOR_BGR2RGB)
 
                         # Resize frame to the model's expected input size (e.g., 300x300 or 256x256)
                         input_blob = cv2.resize(frame_rgb, (256, 256))
@@ -126,65 +186,149 @@ def inference_loop(compiled_model, input_layer, output_layer, camera_process):
                         # Ensure the data type is correct
                         input_blob = input_blob.astype(np.float32)
 
-                        # Perform inference
-                        results = compiled_model([input_blob])[output_layer]
-
-                        # Draw detections on the frame
-                        for detection in results[0][0]:
-                            confidence = detection[2]
-                            if confidence > 0.5:  # Confidence threshold
-                                xmin, ymin, xmax, ymax = map(
-                                    int,
-                                    detection[3:7] * [
-                                        frame.shape[1],
-                                        frame.shape[0],
-                                        frame.shape[1],
-                                        frame.shape[0]
-                                    ]
-                                )
-                                label = f"ID {int(detection[1])}: {confidence:.2f}"
-                                cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
-                                cv2.putText(
-                                    frame,
-                                    label,
-                                    (xmin, ymin - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX,
-                                    0.5,
-                                    (0, 255, 0),
-                                    2
-                                )
-
-                        # Display the frame
-                        cv2.imshow("OpenVINO Inference", frame)
-                        if cv2.waitKey(1) & 0xFF == ord('q'):
-                            break
-
-                    except Exception as inference_error:
-                        print(f"Error during inference: {inference_error}")
-                else:
-                    print("Failed to decode frame, skipping...")
+                    if engine is None:
+                        # Perform inference, through the reused input tensor if preprocessing is baked in
+                        if tiler is not None:
+                            results = tiler.infer(frame)
+                        elif frame_request is not None:
+                            results = frame_request.infer(frame)
+                        else:
+                            results = compiled_model([input_blob])[output_layer]
+
+                        if scene_gate is not None:
+                            scene_gate.store(results.copy()) # the request reuses its output buffer
+
+                        last_results = results
+                        if governor is not None:
+                            loop_time = governor.stage("inference", loop_time)
+
+                        running = handle_detections(frame, results, source_frame.sequence,
+                                                    annotated_writer, show_preview, tracker, roi, tiler)
+                        if governor is not None:
+                            governor.stage("output", loop_time)
+                    else:
+                        # Start inference and handle whatever earlier frames finished meanwhile,
+                        # each result becomes the gate's reference together with its own frame's thumbnail
+                        thumbnail = scene_gate.thumbnail.copy() if scene_gate is not None else None
+                        engine.submit(input_blob, source_frame.sequence, (frame, thumbnail))
+
+                        for result in engine.ready():
+                            result_frame, result_thumbnail = result.context
+                            if scene_gate is not None:
+                                scene_gate.store(result.output, result_thumbnail)
+
+                            if running and result.output is not None:
+                                running = handle_detections(result_frame, result.output, result.sequence,
+                                                            annotated_writer, show_preview)
+
+                except Exception as inference_error:
+                    print(f"Error during inference: {inference_error}")
+            else:
+                print("Failed to decode frame, skipping...")
+
+        # Handle the frames still in flight when the source ended
+        if engine is not None:
+            for result in engine.drain():
+                if running and result.output is not None:
+                    running = handle_detections(result.context[0], result.output, result.sequence,
+                                                annotated_writer, show_preview)
 
     finally:
+        if engine is not None:
+            engine.drain() # let requests in flight finish before the model goes away
+
+        if scene_gate is not None:
+            print(f"Scene gate skipped inference on {scene_gate.inferences_skipped} of {scene_gate.frames_checked} frames.")
+
+        if tracker is not None:
+            print(f"Tracker ran the detector on {tracker.detector_runs} of {tracker.frames} frames.")
+
+        if roi is not None:
+            print(f"Scanned the whole frame on {roi.full_scans} of {roi.frames} detector runs.")
+
+        if governor is not None:
+            print(f"QoS governor: {governor.stats()}")
+
         # Cleanup
-        cv2.destroyAllWindows()
-        camera_process.terminate()
-        camera_process.wait()
+        if show_preview:
+            cv2.destroyAllWindows()
+        source.stop()
 
 
 ########## MAIN EXECUTION ##########
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Person detection on a live or recorded frame source")
+    parser.add_argument("--source", default="camera", help='"camera", "synthetic" or a recording path')
+    parser.add_argument("--codec", choices=("mjpeg", "yuv420"), help="Frame codec, guessed from the recording if omitted")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--unthrottled", action="store_true", help="Replay recordings as fast as possible")
+    parser.add_argument("--annotated-output", help="Write an annotated video (.avi) from a separate process")
+    parser.add_argument("--no-preview", action="store_true", help="Do not draw or show detections in this process")
+    parser.add_argument("--scene-gate", action="store_true", help="Skip inference on frames where the scene has not changed")
+    parser.add_argument("--refresh-interval", type=int, default=30, help="Frames a result may be reused with --scene-gate")
+    parser.add_argument("--inflight", type=int, default=0, help="Infer requests in flight, 0 for synchronous inference")
+    parser.add_argument("--bake-preprocessing", action="store_true", help="Move color conversion, resize and layout into the model")
+    parser.add_argument("--track-interval", type=int, default=0, help="Track people and run the detector at most every N frames")
+    parser.add_argument("--roi", action="store_true", help="Crop the model input around the previous detections")
+    parser.add_argument("--full-scan-interval", type=int, default=10, help="Frames between full-frame scans with --roi")
+    parser.add_argument("--tiles", action="store_true", help="Detect far people on overlapping full resolution tiles in one batch")
+    parser.add_argument("--qos-deadline-ms", type=float, default=0, help="Shed inference and decode quality while loops take longer than this")
+    args = parser.parse_args()
+    if args.track_interval and args.inflight:
+        parser.error("--track-interval needs synchronous inference, drop --inflight")
+    if args.roi and (args.inflight or args.bake_preprocessing):
+        parser.error("--roi needs synchronous inference without --bake-preprocessing")
+    if args.qos_deadline_ms and args.inflight:
+        parser.error("--qos-deadline-ms needs synchronous inference, drop --inflight")
+    if args.tiles and (args.inflight or args.roi or args.bake_preprocessing):
+        parser.error("--tiles needs synchronous inference and bakes its own preprocessing, drop --inflight, --roi and --bake-preprocessing")
+
     # Adjust paths as needed
     MODEL_XML = "/home/matthewthomasbeck/Projects/Robot_Dog/model/person-detection-0200.xml"
     DEVICE_NAME = "MYRIAD"
 
-    # 1. Load and compile the model
-    compiled_model, input_layer, output_layer = load_and_compile_model(MODEL_XML, DEVICE_NAME)
+    # 0. Fork the annotated video writer before OpenVINO starts its threads
+    annotated_writer = None
+    if args.annotated_output:
+        annotated_writer = AnnotatedVideoWriter(args.annotated_output, args.width, args.height).start()
 
-    # 2. Test with dummy input
-    test_with_dummy_input(compiled_model, input_layer, output_layer)
+    # 1. Load and compile the model, with preprocessing baked in for the decoded frame size if asked
+    source = create_frame_source(
+        args.source, args.width, args.height, args.codec, None if args.unthrottled else 30
+    )
+    frame_size = None
+    batch_size = 1
+    if args.bake_preprocessing:
+        frame_size = decoded_frame_size((source.width, source.height), source.codec)
+    if args.tiles: # one batch of native resolution tiles per full resolution frame
+        frame_size = (TILE_SIZE, TILE_SIZE)
+        batch_size = len(tile_layout((source.width, source.height)))
+    # (from the compiled-blob cache when warm, falling back to CPU if the stick is missing)
+    timings = {}
+    compiled_model, input_layer, output_layer = load_and_compile_model(MODEL_XML, DEVICE_NAME, frame_size,
+                                                                       timings=timings, batch_size=batch_size)
+    if compiled_model is None:
+        exit(1)
+
+    # 2. Test with dummy input in the background while the frame source starts
+    warm_up = start_model_warm_up(compiled_model, input_layer, output_layer, timings)
 
-    # 3. Start the camera
-    camera_process = start_camera_process(width=640, height=480, framerate=30)
+    # 3. Start the frame source
+    source.start()
+    warm_up.join()
+    print(f"Model startup: {timings}")
 
     # 4. Run inference loop
-    inference_loop(compiled_model, input_layer, output_layer, camera_process)
+    try:
+        scene_gate = SceneChangeGate(refresh_interval=args.refresh_interval) if args.scene_gate else None
+        engine = AsyncInferenceEngine(compiled_model, args.inflight) if args.inflight > 0 else None
+        inference_loop(compiled_model, input_layer, output_layer, source,
+                       annotated_writer=annotated_writer, show_preview=not args.no_preview,
+                       scene_gate=scene_gate, engine=engine, baked_preprocessing=args.bake_preprocessing,
+                       tracker=ObjectTracker(args.track_interval) if args.track_interval else None,
+                       roi=RegionOfInterest(args.full_scan_interval) if args.roi else None, tiled=args.tiles,
+                       qos_deadline=args.qos_deadline_ms / 1000 or None)
+    finally:
+        if annotated_writer is not None:
+            annotated_writer.stop()
@@ -0,0 +1,313 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import multiprocessing # import multiprocessing for the writer process
+from multiprocessing import shared_memory # import shared memory for frame handoff
+import logging # import logging for debugging
+import numpy as np # import numpy for shared frame slots
+import cv2 # import opencv for drawing and encoding
+
+##### import necessary functions #####
+
+from vision.detection_postprocess import DETECTION_DTYPE, detection_boxes, scale_detections # import detection record
+from vision.object_tracker import TRACK_DTYPE # import track record, the slots hold either
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### writer hyperparameters #####
+
+WRITER_SLOTS = 4 # frames that can wait for the writer, the oldest is dropped beyond this
+WRITER_MAX_DETECTIONS = 200 # detections per frame, person-detection-0200 outputs at most 200
+WRITER_FOURCC = "MJPG" # codec of the annotated video
+
+##### slot states #####
+
+SLOT_FREE = 0 # slot can be written by the producer
+SLOT_WRITING = 1 # producer is copying a frame in
+SLOT_READY = 2 # frame waiting for the writer process
+SLOT_BUSY = 3 # writer process is drawing and encoding it
+
+##### slot table columns #####
+
+TABLE_STATE = 0 # slot state
+TABLE_SEQUENCE = 1 # frame sequence, orders READY slots oldest first
+TABLE_DETECTIONS = 2 # number of valid detection rows
+TABLE_HEIGHT = 3 # height of the frame in the slot
+TABLE_WIDTH = 4 # width of the frame in the slot
+TABLE_TRACKED = 5 # 1 if the slot holds tracks, whose track ids are drawn
+TABLE_COLUMNS = 6
+
+
+
+
+
+###############################################
+############### DRAW DETECTIONS ###############
+###############################################
+
+
+########## DRAW DETECTIONS ##########
+
+def draw_detections(frame, detections): # function to draw boxes and labels on a frame
+
+    """
+    Draws a DETECTION_DTYPE array (pixel boxes, already filtered by postprocess_detections)
+    onto frame in place. Tracks (TRACK_DTYPE) are labelled with their track id instead of
+    their class.
+    """
+
+    corners = detection_boxes(detections).astype(int)
+    tracked = 'track_id' in detections.dtype.names
+    labels = detections['track_id'] if tracked else detections['class']
+    prefix = "Track" if tracked else "ID"
+
+    for (x0, y0, x1, y1), label, score in zip(corners.tolist(), labels.tolist(), detections['score'].tolist()):
+
+        cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 255, 0), 2)
+        cv2.putText(frame, f"{prefix} {label}: {score:.2f}", (x0, y0 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+    return frame
+
+
+
+
+
+######################################################
+############### ANNOTATED VIDEO WRITER ###############
+######################################################
+
+
+########## WRITER PROCESS ##########
+
+def _writer_process(path, width, height, fps, slots, frames_name, detections_name, table_name, condition, closing): # function run in the writer process
+
+    frames_memory = shared_memory.SharedMemory(name=frames_name)
+    detections_memory = shared_memory.SharedMemory(name=detections_name)
+    table_memory = shared_memory.SharedMemory(name=table_name)
+    frames = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=frames_memory.buf)
+    detections = np.ndarray((slots, WRITER_MAX_DETECTIONS), dtype=TRACK_DTYPE, buffer=detections_memory.buf)
+    table = np.ndarray((slots, TABLE_COLUMNS), dtype=np.int64, buffer=table_memory.buf)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*WRITER_FOURCC), fps, (width, height))
+
+    try:
+
+        while True:
+
+            ##### take the oldest ready slot #####
+
+            with condition:
+
+                while True:
+
+                    ready = np.flatnonzero(table[:, TABLE_STATE] == SLOT_READY)
+
+                    if ready.size or closing.is_set():
+
+                        break
+
+                    condition.wait(0.5)
+
+                if not ready.size: # closing and nothing left to write
+
+                    break
+
+                slot = ready[np.argmin(table[ready, TABLE_SEQUENCE])]
+                table[slot, TABLE_STATE] = SLOT_BUSY
+                count = int(table[slot, TABLE_DETECTIONS])
+                frame = frames[slot, :table[slot, TABLE_HEIGHT], :table[slot, TABLE_WIDTH]]
+                frame_detections = detections[slot, :count]
+
+                if not table[slot, TABLE_TRACKED]: # plain detections, drop the unused track columns so classes are drawn
+
+                    frame_detections = frame_detections[list(DETECTION_DTYPE.names)]
+
+            ##### draw and encode outside the lock #####
+
+            if frame.shape[0] != height or frame.shape[1] != width: # reduced-scale decodes are scaled up here, not in the loop
+
+                frame_detections = scale_detections(frame_detections, width / frame.shape[1], height / frame.shape[0])
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+
+            draw_detections(frame, frame_detections)
+            writer.write(frame)
+            del frame, frame_detections # release the slot views before handing the slot back
+
+            with condition:
+
+                table[slot, TABLE_STATE] = SLOT_FREE
+
+    finally:
+
+        writer.release()
+        del frames, detections, table # release views before closing the mappings
+        frames_memory.close()
+        detections_memory.close()
+        table_memory.close()
+
+
+########## ANNOTATED VIDEO WRITER ##########
+
+class AnnotatedVideoWriter: # class handing frames and detections to a separate drawing and encoding process
+
+    """
+    Optional annotated-video sink. Frames and detection arrays are copied into
+    shared-memory slots and a separate process draws the boxes and encodes the video, so
+    the inference and control loops never pay for overlays or encoding. Frames up to
+    width x height are accepted and smaller ones (reduced-scale decodes) are scaled up by
+    the writer process. When every slot is waiting, submit() overwrites the oldest waiting
+    frame (counted in frames_dropped) instead of blocking.
+
+    Start it before any other threads exist: the writer process is forked, since a spawned
+    child would re-import control_logic.py and start the robot again.
+    """
+
+    ##### initialize writer #####
+
+    def __init__(self, path, width, height, fps=30, slots=WRITER_SLOTS): # function to allocate shared slots
+
+        self.path = path # output video path
+        self.width = width # video width, largest frame width accepted
+        self.height = height # video height, largest frame height accepted
+        self.fps = fps # output framerate
+        self.slots = slots # number of shared frame slots
+        self.context = multiprocessing.get_context("fork")
+        self.condition = self.context.Condition() # guards the slot table and wakes the writer
+        self.closing = self.context.Event() # tells the writer to finish
+
+        self.frames_memory = shared_memory.SharedMemory(create=True, size=slots * height * width * 3)
+        self.detections_memory = shared_memory.SharedMemory(create=True, size=slots * WRITER_MAX_DETECTIONS * TRACK_DTYPE.itemsize)
+        self.table_memory = shared_memory.SharedMemory(create=True, size=slots * TABLE_COLUMNS * 8)
+        self.frames = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=self.frames_memory.buf)
+        self.detections = np.ndarray((slots, WRITER_MAX_DETECTIONS), dtype=TRACK_DTYPE, buffer=self.detections_memory.buf) # wide enough for tracks
+        self.table = np.ndarray((slots, TABLE_COLUMNS), dtype=np.int64, buffer=self.table_memory.buf)
+        self.table[:] = 0
+        self.process = None # writer process
+
+        ##### statistics #####
+
+        self.frames_submitted = 0 # frames handed to the writer
+        self.frames_dropped = 0 # waiting frames overwritten because the writer fell behind
+
+    ##### start and stop #####
+
+    def start(self): # function to fork the writer process
+
+        self.process = self.context.Process(
+            target=_writer_process,
+            args=(
+                self.path, self.width, self.height, self.fps, self.slots,
+                self.frames_memory.name, self.detections_memory.name, self.table_memory.name,
+                self.condition, self.closing,
+            ),
+            name="annotated-writer",
+            daemon=True,
+        )
+        self.process.start()
+        logging.info(f"Annotated video writer started, writing {self.path}.\n")
+
+        return self
+
+    def stop(self, timeout=5.0): # function to let the writer finish queued frames and free shared memory
+
+        if self.process is not None:
+
+            self.closing.set()
+
+            with self.condition:
+
+                self.condition.notify_all()
+
+            self.process.join(timeout)
+
+            if self.process.is_alive():
+
+                self.process.terminate()
+
+            self.process = None
+
+        del self.frames, self.detections, self.table # release views before closing the mappings
+
+        for memory in (self.frames_memory, self.detections_memory, self.table_memory):
+
+            memory.close()
+            memory.unlink()
+
+        logging.info(f"Annotated video writer got {self.frames_submitted} frames, dropped {self.frames_dropped}.\n")
+
+    ##### submit frame #####
+
+    def submit(self, frame, detections, sequence): # function to queue a BGR frame and its DETECTION_DTYPE detections or TRACK_DTYPE tracks
+
+        frame_height, frame_width = frame.shape[:2]
+
+        if frame_height > self.height or frame_width > self.width:
+
+            logging.warning(f"WARNING (annotated_writer.py): Frame is {frame_width}x{frame_height}, larger than {self.width}x{self.height}, skipping.\n")
+            return False
+
+        ##### claim a slot #####
+
+        with self.condition:
+
+            states = self.table[:, TABLE_STATE]
+            free = np.flatnonzero(states == SLOT_FREE)
+
+            if free.size:
+
+                slot = free[0]
+
+            else: # drop the oldest frame still waiting for the writer
+
+                ready = np.flatnonzero(states == SLOT_READY)
+
+                if not ready.size: # writer holds the only other slot
+
+                    self.frames_dropped += 1
+                    return False
+
+                slot = ready[np.argmin(self.table[ready, TABLE_SEQUENCE])]
+                self.frames_dropped += 1
+
+            self.table[slot, TABLE_STATE] = SLOT_WRITING
+
+        ##### copy outside the lock #####
+
+        count = min(len(detections), WRITER_MAX_DETECTIONS)
+        tracked = 'track_id' in detections.dtype.names
+        fields = list((TRACK_DTYPE if tracked else DETECTION_DTYPE).names)
+        self.frames[slot, :frame_height, :frame_width] = frame
+        self.detections[slot, :count][fields] = detections[:count][fields]
+
+        with self.condition:
+
+            self.table[slot, TABLE_SEQUENCE] = sequence
+            self.table[slot, TABLE_DETECTIONS] = count
+            self.table[slot, TABLE_HEIGHT] = frame_height
+            self.table[slot, TABLE_WIDTH] = frame_width
+            self.table[slot, TABLE_TRACKED] = tracked
+            self.table[slot, TABLE_STATE] = SLOT_READY
+            self.condition.notify()
+
+        self.frames_submitted += 1
+
+        return True
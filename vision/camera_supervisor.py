@@ -0,0 +1,344 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import threading # import threading for the stderr drain and stall watchdog
+import time # import time for stall detection and downtime
+import logging # import logging for debugging
+
+##### import necessary functions #####
+
+from vision.frame_source import FrameSource, RpicamFrameSource # import camera frame source
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### supervisor hyperparameters #####
+
+CAMERA_STALL_TIMEOUT = 3.0 # seconds without a frame before the camera counts as stalled
+CAMERA_BACKOFF_INITIAL = 0.5 # seconds to wait before the first restart
+CAMERA_BACKOFF_MAX = 10.0 # longest wait between restarts
+CAMERA_STDERR_CHUNK = 4096 # bytes read from rpicam-vid stderr at a time
+
+
+
+
+
+#################################################
+############### CAMERA SUPERVISOR ###############
+#################################################
+
+
+########## DRAIN STDERR ##########
+
+def drain_camera_stderr(process): # function to log rpicam-vid stderr so the pipe never fills up
+
+    """
+    Reads rpicam-vid stderr until the process exits. Per-frame progress lines (starting
+    with #) are discarded; libcamera warnings and errors are forwarded to the log.
+    """
+
+    pending = b""
+
+    try:
+
+        while True:
+
+            chunk = process.stderr.read(CAMERA_STDERR_CHUNK)
+
+            if not chunk: # process exited
+
+                break
+
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop() # keep an unfinished line for the next chunk
+
+            for line in lines:
+
+                text = line.decode(errors="replace").strip()
+
+                if not text or text.startswith("#"): # skip blank and per-frame progress lines
+
+                    continue
+
+                if "ERROR" in text:
+
+                    logging.error(f"ERROR (rpicam-vid): {text}")
+
+                elif "WARN" in text:
+
+                    logging.warning(f"WARNING (rpicam-vid): {text}")
+
+                else:
+
+                    logging.debug(f"rpicam-vid: {text}")
+
+    except (OSError, ValueError): # pipe closed underneath us during shutdown
+
+        pass
+
+
+########## CAMERA SUPERVISOR ##########
+
+class CameraSupervisor(FrameSource): # class keeping rpicam-vid alive behind a frame source
+
+    """
+    FrameSource that owns an RpicamFrameSource and keeps it running. rpicam-vid stderr is
+    drained on a background thread, a watchdog kills the camera when no frame arrived for
+    stall_timeout seconds, and read() transparently restarts the camera with exponential
+    backoff when it dies or stalls, so consumers (and the servos and receiver decoders
+    around them) never have to be torn down. Sequence numbers keep counting across restarts.
+    reconfigure() only records the new settings; the watchdog thread stops the camera,
+    so the caller (usually the control loop) never waits on the old process.
+    """
+
+    ##### initialize supervisor #####
+
+    def __init__(self, width=640, height=480, framerate=30, codec="mjpeg", stall_timeout=CAMERA_STALL_TIMEOUT, max_restarts=None): # function to store supervisor settings
+
+        super().__init__(width, height, codec)
+
+        self.framerate = framerate # camera framerate
+        self.stall_timeout = stall_timeout # seconds without a frame before a restart
+        self.max_restarts = max_restarts # give up after this many restarts, None to never give up
+        self.camera = None # running RpicamFrameSource
+        self.stop_event = threading.Event() # set to stop supervising
+        self.wake_event = threading.Event() # wakes the watchdog early, to stop the camera for a reconfigure
+        self.watchdog = None # stall watchdog thread
+        self.backoff = CAMERA_BACKOFF_INITIAL # wait before the next restart
+        self.sequence_offset = 0 # frames produced by previous camera processes
+        self.last_frame_time = None # monotonic time of the last frame
+        self.reconfigure_requested = False # the watchdog still has to stop the camera for new settings
+        self.reconfigure_pending = False # the camera was stopped to relaunch it with new settings
+
+        ##### statistics #####
+
+        self.restarts = 0 # number of camera restarts
+        self.stalls = 0 # number of restarts caused by a stall
+        self.downtime = 0.0 # seconds spent without frames while restarting
+        self.down_since = None # monotonic time the current outage began
+        self.reconfigures = 0 # number of relaunches with new settings
+
+    ##### launch camera #####
+
+    def _launch(self, kill_existing): # function to start a fresh camera process and its stderr drain
+
+        camera = RpicamFrameSource(self.width, self.height, self.framerate, self.codec, kill_existing)
+        camera.start()
+
+        threading.Thread(
+            target=drain_camera_stderr, args=(camera.process,), name="camera-stderr", daemon=True
+        ).start()
+
+        self.camera = camera
+        self.last_frame_time = time.monotonic() # startup counts towards the stall timeout
+
+    ##### start supervising #####
+
+    def start(self): # function to launch the camera, raises RuntimeError if it cannot start at all
+
+        self.stop_event.clear()
+        self._launch(kill_existing=True) # clear strays left behind by a previous run once
+
+        self.watchdog = threading.Thread(target=self._watch, name="camera-watchdog", daemon=True)
+        self.watchdog.start()
+
+        return self
+
+    ##### stall watchdog #####
+
+    def _watch(self): # function to kill the camera when frames stop arriving or its settings changed
+
+        while not self.stop_event.is_set():
+
+            self.wake_event.wait(self.stall_timeout / 4)
+            self.wake_event.clear()
+
+            if self.stop_event.is_set():
+
+                break
+
+            camera = self.camera
+
+            if self.reconfigure_requested:
+
+                self.reconfigure_requested = False
+
+                if camera is not None: # between restarts the next launch picks up the new settings anyway
+
+                    self.reconfigure_pending = True # read() relaunches without backoff once the pipe closes
+                    self.last_frame_time = None # not a stall
+                    camera.stop(timeout=1.0)
+
+                continue
+
+            if camera is None or self.last_frame_time is None:
+
+                continue
+
+            if time.monotonic() - self.last_frame_time > self.stall_timeout:
+
+                logging.warning(f"WARNING (camera_supervisor.py): No frame for {self.stall_timeout}s, restarting camera.\n")
+                self.stalls += 1
+                self.down_since = self.last_frame_time # the outage began with the last frame
+                self.last_frame_time = None # do not fire again until the camera is relaunched
+                camera.stop(timeout=1.0) # closing the pipe makes the blocked read() return
+
+    ##### restart camera #####
+
+    def _restart(self): # function to relaunch the camera with backoff, returns False once supervision ends
+
+        if self.down_since is None:
+
+            self.down_since = time.monotonic()
+
+        if self.camera is not None:
+
+            self.camera.stop(timeout=1.0)
+            self.camera = None
+
+        while not self.stop_event.is_set():
+
+            if self.max_restarts is not None and self.restarts >= self.max_restarts:
+
+                logging.error(f"ERROR (camera_supervisor.py): Camera failed after {self.restarts} restarts, giving up.\n")
+                return False
+
+            if self.stop_event.wait(self.backoff): # interruptible backoff
+
+                return False
+
+            self.backoff = min(self.backoff * 2, CAMERA_BACKOFF_MAX)
+            self.restarts += 1
+
+            try:
+
+                self._launch(kill_existing=False) # only our own process was running
+                logging.info(f"Camera restarted (restart {self.restarts}).\n")
+                return True
+
+            except RuntimeError as e:
+
+                logging.error(f"ERROR (camera_supervisor.py): Failed to restart camera: {e}\n")
+
+        return False
+
+    ##### change settings #####
+
+    def reconfigure(self, width, height, framerate): # function to have the watchdog relaunch the camera at another resolution and framerate, returns at once
+
+        self.width = width
+        self.height = height
+        self.framerate = framerate
+        self.reconfigures += 1
+        self.reconfigure_requested = True
+        self.wake_event.set() # stopping the camera can take a second, the caller does not wait for it
+        logging.info(f"Reconfiguring camera to {width}x{height} at {framerate} fps.\n")
+
+    ##### read frame #####
+
+    def read(self): # function to return the next frame, restarting the camera as often as needed
+
+        while not self.stop_event.is_set():
+
+            camera = self.camera
+            frame = None
+
+            if camera is not None:
+
+                try:
+
+                    frame = camera.read()
+
+                except (OSError, ValueError) as e: # pipe torn down by the watchdog
+
+                    logging.debug(f"Camera read failed: {e}")
+
+            if frame is not None:
+
+                now = time.monotonic()
+                self.last_frame_time = now
+
+                if self.down_since is not None: # first frame after an outage
+
+                    outage = now - self.down_since
+                    self.downtime += outage
+                    self.down_since = None
+                    self.backoff = CAMERA_BACKOFF_INITIAL
+                    logging.info(f"Camera recovered after {outage:.2f}s.\n")
+
+                self.sequence = self.sequence_offset + frame.sequence
+
+                return frame._replace(sequence=self.sequence)
+
+            if self.stop_event.is_set():
+
+                break
+
+            self.sequence_offset = self.sequence
+
+            if self.reconfigure_pending: # stopped on purpose, relaunch straight away
+
+                self.reconfigure_pending = False
+
+                try:
+
+                    self._launch(kill_existing=False)
+                    continue
+
+                except RuntimeError as e:
+
+                    logging.error(f"ERROR (camera_supervisor.py): Failed to relaunch camera with new settings: {e}\n")
+
+            logging.warning("WARNING (camera_supervisor.py): Camera stopped sending data.\n")
+
+            if not self._restart():
+
+                break
+
+        return None
+
+    ##### stop supervising #####
+
+    def stop(self): # function to stop the camera and the watchdog
+
+        self.stop_event.set()
+        self.wake_event.set()
+
+        if self.camera is not None:
+
+            self.camera.stop()
+
+        if self.down_since is not None:
+
+            self.downtime += time.monotonic() - self.down_since
+            self.down_since = None
+
+    ##### report statistics #####
+
+    def stats(self): # function to summarize restarts and downtime
+
+        return {
+            'restarts': self.restarts,
+            'stalls': self.stalls,
+            'downtime': round(self.downtime, 3),
+            'reconfigures': self.reconfigures,
+        }
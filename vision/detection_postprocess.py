@@ -0,0 +1,184 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import numpy as np # import numpy for vectorized post-processing
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### detection record, one per detected object #####
+
+DETECTION_DTYPE = np.dtype([
+    ('class', '<i4'), # model label
+    ('score', '<f4'), # confidence 0-1
+    ('x0', '<f4'), # left edge in frame pixels
+    ('y0', '<f4'), # top edge in frame pixels
+    ('x1', '<f4'), # right edge in frame pixels
+    ('y1', '<f4'), # bottom edge in frame pixels
+])
+
+##### post-processing hyperparameters #####
+
+DETECTION_CONFIDENCE = 0.5 # detections below this confidence are dropped
+DETECTION_NMS_IOU = 0.45 # overlapping boxes of the same class above this IoU are suppressed
+
+##### raw ssd output columns #####
+
+RAW_IMAGE_ID = 0 # image in the batch, -1 marks the end of the valid rows
+RAW_LABEL = 1
+RAW_CONFIDENCE = 2
+RAW_BOX = slice(3, 7) # xmin, ymin, xmax, ymax normalized to 0-1
+
+
+
+
+
+########################################################
+############### DETECTION POSTPROCESSING ###############
+########################################################
+
+
+########## IOU MATRIX ##########
+
+def iou_matrix(boxes_a, boxes_b): # function to compute the IoU of every box in one set against every box in another
+
+    """
+    (N, M) IoU matrix of (N, 4) and (M, 4) arrays of (x0, y0, x1, y1) boxes, in one broadcast.
+    """
+
+    ax0, ay0, ax1, ay1 = boxes_a.T
+    bx0, by0, bx1, by1 = boxes_b.T
+    width = np.clip(np.minimum(ax1[:, None], bx1) - np.maximum(ax0[:, None], bx0), 0, None)
+    height = np.clip(np.minimum(ay1[:, None], by1) - np.maximum(ay0[:, None], by0), 0, None)
+    intersection = width * height
+    areas_a = (ax1 - ax0) * (ay1 - ay0)
+    areas_b = (bx1 - bx0) * (by1 - by0)
+
+    return intersection / np.maximum(areas_a[:, None] + areas_b - intersection, 1e-9)
+
+
+def detection_boxes(detections): # function to return the boxes of a DETECTION_DTYPE array as an (N, 4) float array
+
+    return np.stack((detections['x0'], detections['y0'], detections['x1'], detections['y1']), axis=1)
+
+
+########## NON-MAXIMUM SUPPRESSION ##########
+
+def non_max_suppression(boxes, scores, classes, iou_threshold=DETECTION_NMS_IOU): # function to pick the best box of every overlapping group
+
+    """
+    Greedy per-class NMS. The IoU of every pair is computed in one broadcast and pairs of
+    different classes are masked out, so the remaining loop only walks the boxes in score
+    order flagging rows of a precomputed boolean matrix. Returns the indices of the kept
+    boxes, highest score first.
+    """
+
+    order = np.argsort(-scores, kind="stable")
+    boxes = boxes[order]
+    classes = classes[order]
+    overlaps = (iou_matrix(boxes, boxes) > iou_threshold) & (classes[:, None] == classes)
+    suppressed = np.zeros(len(order), dtype=bool)
+
+    for i in range(len(order)):
+
+        if not suppressed[i]:
+
+            suppressed[i + 1:] |= overlaps[i, i + 1:]
+
+    return order[~suppressed]
+
+
+########## VALID ROWS ##########
+
+def valid_rows(output): # function to return the raw rows before the first -1 end marker as an (N, 7) view
+
+    rows = output.reshape(-1, output.shape[-1])
+    end = np.flatnonzero(rows[:, RAW_IMAGE_ID] < 0)
+
+    return rows[:end[0]] if end.size else rows # rows after the marker are leftovers, not detections
+
+
+########## POSTPROCESS DETECTIONS ##########
+
+def postprocess_detections(output, frame_size, confidence_threshold=DETECTION_CONFIDENCE, iou_threshold=DETECTION_NMS_IOU): # function to turn raw ssd output into detections
+
+    """
+    Converts person-detection-0200 output ([1, 1, N, 7] rows of image_id, label, confidence
+    and a normalized box) into a DETECTION_DTYPE array for a frame of frame_size
+    (width, height): cutting the rows at the first image_id of -1, confidence filtering,
+    scaling to pixels, clipping to the frame and NMS, all as array operations. Detections are sorted by score, highest first. Pass
+    iou_threshold=None to skip NMS.
+    """
+
+    rows = valid_rows(output)
+    rows = rows[rows[:, RAW_CONFIDENCE] > confidence_threshold]
+    width, height = frame_size
+
+    boxes = rows[:, RAW_BOX] * np.array([width, height, width, height], dtype=np.float32)
+    np.clip(boxes[:, 0::2], 0, width, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, height, out=boxes[:, 1::2])
+    classes = rows[:, RAW_LABEL].astype(np.int32)
+    scores = rows[:, RAW_CONFIDENCE]
+
+    if iou_threshold is None:
+
+        keep = np.argsort(-scores, kind="stable")
+
+    else:
+
+        keep = non_max_suppression(boxes, scores, classes, iou_threshold)
+
+    detections = np.empty(len(keep), dtype=DETECTION_DTYPE)
+    detections['class'] = classes[keep]
+    detections['score'] = scores[keep]
+    detections['x0'] = boxes[keep, 0]
+    detections['y0'] = boxes[keep, 1]
+    detections['x1'] = boxes[keep, 2]
+    detections['y1'] = boxes[keep, 3]
+
+    return detections
+
+
+########## SCALE DETECTIONS ##########
+
+def scale_detections(detections, scale_x, scale_y): # function to map detections onto a resized frame
+
+    scaled = detections.copy()
+    scaled['x0'] *= scale_x
+    scaled['x1'] *= scale_x
+    scaled['y0'] *= scale_y
+    scaled['y1'] *= scale_y
+
+    return scaled
+
+
+########## OFFSET DETECTIONS ##########
+
+def offset_detections(detections, offset_x, offset_y): # function to map detections from a crop back onto the full frame
+
+    shifted = detections.copy()
+    shifted['x0'] += offset_x
+    shifted['x1'] += offset_x
+    shifted['y0'] += offset_y
+    shifted['y1'] += offset_y
+
+    return shifted
@@ -0,0 +1,180 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import os # import os to truncate torn chunks and sync the file
+import logging # import logging for debugging
+import numpy as np # import numpy for the columns
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### stored detection row, one per detection #####
+
+STORED_DETECTION_DTYPE = np.dtype([
+    ('frame', '<u8'), # camera sequence number
+    ('timestamp', '<f8'), # time.monotonic() at capture
+    ('class', '<i4'), # model label
+    ('score', '<f4'), # confidence 0-1
+    ('x0', '<f4'), # left edge in frame pixels
+    ('y0', '<f4'), # top edge in frame pixels
+    ('x1', '<f4'), # right edge in frame pixels
+    ('y1', '<f4'), # bottom edge in frame pixels
+])
+
+##### chunk header, one per analysed frame range #####
+
+CHUNK_MAGIC = 0x43544544 # "DETC"
+
+CHUNK_HEADER_DTYPE = np.dtype([
+    ('magic', '<u4'), # CHUNK_MAGIC, anything else is a torn write
+    ('segment', '<u4'), # recording segment number
+    ('start', '<u4'), # first index position analysed
+    ('end', '<u4'), # index position after the last one analysed
+    ('rows', '<u4'), # detections in the chunk
+])
+
+
+
+
+
+###############################################
+############### DETECTION STORE ###############
+###############################################
+
+
+########## DETECTION STORE ##########
+
+class DetectionStore: # class appending analysed frame ranges to a columnar detections file
+
+    """
+    Append-only detections file for offline analysis. Every analysed frame range is one
+    chunk: a CHUNK_HEADER_DTYPE header naming the range (segment and index positions),
+    followed by the chunk's detections stored column by column (all frames, then all
+    timestamps, then all classes and so on). Ranges without any detection still get a
+    chunk, so the file also records what was analysed.
+
+    Opening an existing file reads back the finished ranges and cuts off a chunk torn by
+    a crash, so an interrupted analysis resumes where it stopped. Chunks are appended in
+    whatever order ranges finish; load_detections() sorts rows by frame.
+    """
+
+    ##### open store #####
+
+    def __init__(self, path): # function to open or create the file and recover its finished ranges
+
+        self.path = path # detections file
+        self.done = set() # (segment, start, end) ranges already stored
+        self.rows = 0 # detections stored
+        good = 0 # end of the last complete chunk
+
+        if os.path.exists(path):
+
+            with open(path, "rb") as store_file:
+
+                for header, _ in _chunks(store_file):
+
+                    self.done.add((int(header['segment']), int(header['start']), int(header['end'])))
+                    self.rows += int(header['rows'])
+                    good = store_file.tell()
+
+            if good != os.path.getsize(path):
+
+                logging.warning(f"WARNING (detection_store.py): Dropping {os.path.getsize(path) - good} bytes of a torn chunk in {path}.\n")
+
+        self.file = open(path, "ab")
+        self.file.truncate(good)
+
+    ##### append range #####
+
+    def append(self, segment, start, end, detections): # function to store the STORED_DETECTION_DTYPE rows of one analysed range
+
+        header = np.zeros(1, dtype=CHUNK_HEADER_DTYPE)
+        header[0] = (CHUNK_MAGIC, segment, start, end, len(detections))
+        self.file.write(header.tobytes())
+
+        for name in STORED_DETECTION_DTYPE.names:
+
+            self.file.write(np.ascontiguousarray(detections[name]).tobytes())
+
+        self.file.flush()
+        self.done.add((segment, start, end))
+        self.rows += len(detections)
+
+    ##### close store #####
+
+    def close(self): # function to sync and close the file
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+########## READ CHUNKS ##########
+
+def _chunks(store_file): # function to yield (header, detections) of every complete chunk
+
+    while True:
+
+        raw_header = store_file.read(CHUNK_HEADER_DTYPE.itemsize)
+
+        if len(raw_header) != CHUNK_HEADER_DTYPE.itemsize: # end of file or torn header
+
+            return
+
+        header = np.frombuffer(raw_header, dtype=CHUNK_HEADER_DTYPE)
+
+        if header[0]['magic'] != CHUNK_MAGIC:
+
+            return
+
+        rows = int(header[0]['rows'])
+        detections = np.empty(rows, dtype=STORED_DETECTION_DTYPE)
+
+        for name in STORED_DETECTION_DTYPE.names:
+
+            column_dtype = STORED_DETECTION_DTYPE.fields[name][0]
+            column = store_file.read(rows * column_dtype.itemsize)
+
+            if len(column) != rows * column_dtype.itemsize: # torn chunk
+
+                return
+
+            detections[name] = np.frombuffer(column, dtype=column_dtype)
+
+        yield header[0], detections
+
+
+########## LOAD DETECTIONS ##########
+
+def load_detections(path): # function to read every stored detection, sorted by frame
+
+    with open(path, "rb") as store_file:
+
+        chunks = [detections for _, detections in _chunks(store_file)]
+
+    if not chunks:
+
+        return np.zeros(0, dtype=STORED_DETECTION_DTYPE)
+
+    detections = np.concatenate(chunks)
+
+    return detections[np.argsort(detections['frame'], kind="stable")]
@@ -0,0 +1,200 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import threading # import threading to drain the camera off the control thread
+import logging # import logging for debugging
+
+##### import necessary functions #####
+
+from vision.frame_source import Frame, FrameSource # import frame record and frame source interface
+
+
+
+
+
+#############################################
+############### FRAME MAILBOX ###############
+#############################################
+
+
+########## FRAME MAILBOX ##########
+
+class FrameMailbox: # class holding only the newest frame
+
+    """
+    Single-slot, latest-frame-wins mailbox between the capture thread and its consumers.
+    publish() never blocks on a consumer; a frame that is replaced before anyone took it
+    is counted as dropped.
+    """
+
+    ##### initialize mailbox #####
+
+    def __init__(self): # function to create an empty mailbox
+
+        self.condition = threading.Condition() # lock + wakeup for waiting consumers
+        self.frame = None # newest frame
+        self.taken = True # whether the newest frame was already taken
+        self.published = 0 # number of frames published
+        self.dropped = 0 # number of frames replaced before being taken
+
+    ##### publish frame #####
+
+    def publish(self, frame): # function to replace the slot with a newer frame
+
+        with self.condition:
+
+            if not self.taken: # if the previous frame was never consumed...
+
+                self.dropped += 1
+
+            self.frame = frame
+            self.taken = False
+            self.published += 1
+            self.condition.notify_all()
+
+    ##### count dropped frames #####
+
+    def drop(self, count=1): # function to account for frames superseded before publishing
+
+        with self.condition:
+
+            self.dropped += count
+
+    ##### take frame #####
+
+    def take(self): # function to take the newest frame if it has not been taken yet
+
+        with self.condition:
+
+            if self.taken: # if there is nothing new...
+
+                return None
+
+            self.taken = True
+
+            return self.frame
+
+    ##### wait for frame #####
+
+    def wait(self, timeout=None): # function to block until a new frame arrives, then take it
+
+        with self.condition:
+
+            if self.taken: # if there is nothing new, wait for the capture thread
+
+                self.condition.wait(timeout)
+
+            if self.taken: # if the wait timed out...
+
+                return None
+
+            self.taken = True
+
+            return self.frame
+
+    ##### peek frame #####
+
+    def peek(self): # function to read the newest frame without marking it taken
+
+        with self.condition:
+
+            return self.frame
+
+
+
+
+
+#####################################################
+############### CAMERA CAPTURE THREAD ###############
+#####################################################
+
+
+########## CAMERA CAPTURE THREAD ##########
+
+class CameraCaptureThread(threading.Thread): # class to drain a frame source on its own thread
+
+    """
+    Continuously reads a FrameSource so the rpicam-vid pipe never backs up, and publishes
+    only the newest frame to a FrameMailbox. Gaps in the source's sequence numbers are
+    frames that completed together with a newer one and are counted as dropped.
+    """
+
+    ##### initialize capture thread #####
+
+    def __init__(self, source, mailbox=None, taps=None): # function to set up the capture thread
+
+        super().__init__(name="camera-capture", daemon=True)
+
+        self.source = source # started FrameSource to drain
+        self.mailbox = mailbox if mailbox is not None else FrameMailbox() # mailbox to publish into
+        self.taps = list(taps) if taps else [] # non-blocking callbacks that see every captured frame, e.g. FrameRecorder.record
+        self.sequence = 0 # sequence number of the last captured frame
+        self.stop_event = threading.Event() # set to stop the thread
+        self.ended = False # set when the source stops producing frames
+
+    ##### capture loop #####
+
+    def run(self): # function to drain the frame source until stopped
+
+        try:
+
+            while not self.stop_event.is_set():
+
+                frame = self.source.read()
+
+                if frame is None: # if camera stopped sending data...
+
+                    logging.error("ERROR (frame_capture.py): Camera process stopped sending data.\n")
+                    break
+
+                if frame.sequence - self.sequence > 1: # older frames that were never published
+
+                    self.mailbox.drop(frame.sequence - self.sequence - 1)
+
+                self.sequence = frame.sequence
+
+                for tap in self.taps: # hand the original frame to recorders before consumers see it
+
+                    tap(frame)
+
+                self.mailbox.publish(frame)
+
+        except Exception as e: # if the pipe broke...
+
+            if not self.stop_event.is_set():
+
+                logging.error(f"ERROR (frame_capture.py): Camera capture failed: {e}\n")
+
+        finally:
+
+            self.ended = True
+
+            with self.mailbox.condition: # wake any consumer waiting on a frame that will never come
+
+                self.mailbox.condition.notify_all()
+
+    ##### stop capture #####
+
+    def stop(self, timeout=1.0): # function to stop the thread, stop the source first to unblock reads
+
+        self.stop_event.set()
+        self.join(timeout)
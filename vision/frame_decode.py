@@ -0,0 +1,195 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import struct # import struct to read jpeg headers
+import logging # import logging for debugging
+import numpy as np # import numpy to wrap frame bytes
+import cv2 # import opencv for jpeg decoding
+
+##### import necessary functions #####
+
+from vision.yuv_reader import i420_to_bgr # import raw frame colour conversion
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### dct-domain decode scales, largest reduction first #####
+
+DECODE_SCALES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+    (1, cv2.IMREAD_COLOR),
+)
+
+##### jpeg start of frame markers that carry the image size #####
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+##### person-detection-0200 input size #####
+
+MODEL_INPUT_SIZE = (256, 256) # (width, height)
+
+
+
+
+
+############################################
+############### DECODE SCALE ###############
+############################################
+
+
+########## READ JPEG SIZE ##########
+
+def jpeg_dimensions(frame_data): # function to read (width, height) from the start of frame segment without decoding, None if there is none
+
+    data = memoryview(frame_data)
+    offset = 2 # skip start of image marker
+
+    while offset + 4 <= len(data):
+
+        if data[offset] != 0xFF: # if header is corrupt...
+
+            return None
+
+        marker = data[offset + 1]
+
+        if marker == 0xFF: # fill byte
+
+            offset += 1
+            continue
+
+        length = struct.unpack_from(">H", data, offset + 2)[0]
+
+        if marker in JPEG_SOF_MARKERS:
+
+            height, width = struct.unpack_from(">HH", data, offset + 5)
+
+            return width, height
+
+        if marker == 0xDA: # start of scan reached without a frame header
+
+            return None
+
+        offset += 2 + length
+
+    return None
+
+
+########## SELECT DECODE SCALE ##########
+
+def select_decode_scale(frame_size, target_size=MODEL_INPUT_SIZE): # function to pick the largest dct-domain reduction whose output still covers target_size, returns (scale, imread_flag)
+
+    width, height = frame_size
+    target_width, target_height = target_size
+
+    for scale, flag in DECODE_SCALES:
+
+        if width // scale >= target_width and height // scale >= target_height:
+
+            return scale, flag
+
+    return DECODE_SCALES[-1]
+
+
+########## DECODED FRAME SIZE ##########
+
+def decoded_frame_size(frame_size, codec="mjpeg", target_size=MODEL_INPUT_SIZE): # function to predict the (width, height) FrameDecoder.decode returns, e.g. to bake preprocessing for it
+
+    if codec == "yuv420": # raw frames are resized straight to the model input
+
+        return target_size
+
+    width, height = frame_size
+    scale, _ = select_decode_scale(frame_size, target_size)
+
+    return -(-width // scale), -(-height // scale) # libjpeg rounds scaled sizes up
+
+
+
+
+
+#############################################
+############### FRAME DECODER ###############
+#############################################
+
+
+########## FRAME DECODER ##########
+
+class FrameDecoder: # class decoding camera frames at the smallest size the model can use
+
+    """
+    Decodes JPEG frames straight to the smallest resolution that still covers the model
+    input, letting libjpeg skip most of the IDCT work. Full resolution is only decoded when
+    a preview consumer asks for it. Raw I420 frames (flat arrays from a yuv420 FrameSource)
+    are resized plane by plane to the model input before the colour conversion, which
+    needs frame_size (width, height) of the camera frames.
+    """
+
+    ##### initialize decoder #####
+
+    def __init__(self, target_size=MODEL_INPUT_SIZE, frame_size=None): # function to store the model input and camera frame sizes
+
+        self.target_size = target_size # (width, height) decoded frames must cover
+        self.frame_size = frame_size # camera frame size
+        self.scaled_size = None # encoded frame size the decode scale was picked for
+        self.yuv_buffers = {} # preallocated I420 buffers for raw frames
+        self.scale = 1 # current dct-domain reduction
+        self.flag = cv2.IMREAD_COLOR # imread flag of the current reduction
+
+    ##### change decode size #####
+
+    def set_target_size(self, target_size): # function to change the size decoded frames must cover, e.g. to decode at a lower scale under load
+
+        self.target_size = target_size
+        self.scaled_size = None # re-pick the decode scale on the next frame
+
+    def _update_scale(self, frame_data): # function to re-pick the decode scale when the camera resolution changes
+
+        frame_size = jpeg_dimensions(frame_data)
+
+        if frame_size is not None and frame_size != self.scaled_size:
+
+            self.scaled_size = frame_size
+            self.scale, self.flag = select_decode_scale(frame_size, self.target_size)
+            logging.info(f"Decoding {frame_size[0]}x{frame_size[1]} frames at 1/{self.scale} scale.\n")
+
+    ##### decode frame #####
+
+    def decode(self, frame_data, full_resolution=False): # function to decode a JPEG or flat I420 frame to BGR, every pixel for preview consumers, None if decoding fails
+
+        if isinstance(frame_data, np.ndarray): # raw frame, nothing to decode
+
+            width, height = self.frame_size
+            size = None if full_resolution else self.target_size
+
+            return i420_to_bgr(frame_data, width, height, size, self.yuv_buffers)
+
+        buffer = np.frombuffer(frame_data, dtype=np.uint8)
+
+        if full_resolution:
+
+            return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+        self._update_scale(frame_data)
+
+        return cv2.imdecode(buffer, self.flag)
@@ -0,0 +1,310 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import os # import os for recording paths
+import mmap # import mmap for zero-copy replay
+import queue # import queue to hand frames to the writer thread
+import threading # import threading for the background writer
+import time # import time to name sessions
+import logging # import logging for debugging
+import numpy as np # import numpy for the frame index
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### index record, one per frame #####
+
+INDEX_DTYPE = np.dtype([
+    ('frame', '<u8'), # camera sequence number
+    ('timestamp', '<f8'), # time.monotonic() at capture
+    ('offset', '<u8'), # byte offset of the JPEG in the segment file
+    ('length', '<u4'), # JPEG length in bytes
+])
+
+##### recorder hyperparameters #####
+
+RECORDER_QUEUE_SIZE = 120 # frames buffered for the writer thread, about 4 s at 30 fps
+RECORDER_BATCH_SIZE = 30 # frames written per batch
+RECORDER_SEGMENT_BYTES = 512 * 1024 * 1024 # start a new segment after this many bytes
+RECORDER_STOP_POLL = 0.5 # seconds stop() waits for queue room before checking the writer is still alive
+
+
+
+
+
+##############################################
+############### FRAME RECORDER ###############
+##############################################
+
+
+########## FRAME RECORDER ##########
+
+class FrameRecorder: # class appending the camera's original JPEGs to indexed segment files
+
+    """
+    Records the camera's original JPEG bytes without decoding or re-encoding them. Frames
+    are appended to segment_NNNN.mjpeg (itself a plain MJPEG stream FileFrameSource can
+    replay) together with segment_NNNN.idx, a packed INDEX_DTYPE array of
+    (frame, timestamp, offset, length). record() only puts the frame on a bounded queue;
+    a background thread writes in batches, and frames are dropped (and counted) rather
+    than ever blocking the caller. Once the writer fails (e.g. the disk is full) every
+    further frame is dropped, and stop() never waits on a queue nobody drains.
+    """
+
+    ##### initialize recorder #####
+
+    def __init__(self, directory, segment_bytes=RECORDER_SEGMENT_BYTES, queue_size=RECORDER_QUEUE_SIZE): # function to create a recording session
+
+        self.directory = os.path.join(directory, time.strftime("session_%Y%m%d_%H%M%S")) # one directory per run
+        self.segment_bytes = segment_bytes # segment rotation size
+        self.queue = queue.Queue(maxsize=queue_size) # frames waiting to be written
+        self.thread = None # background writer
+        self.segment = -1 # current segment number
+        self.data_file = None # current segment file
+        self.index_file = None # current index file
+        self.offset = 0 # bytes written to the current segment
+        self.failed = False # the writer stopped on a disk error, frames are no longer queued
+
+        ##### statistics #####
+
+        self.frames_written = 0 # frames written to disk
+        self.frames_dropped = 0 # frames dropped because the writer fell behind
+        self.bytes_written = 0 # JPEG bytes written to disk
+
+    ##### start and stop #####
+
+    def start(self): # function to create the session directory and start the writer thread
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._write_loop, name="frame-recorder", daemon=True)
+        self.thread.start()
+        logging.info(f"Recording camera frames to {self.directory}.\n")
+
+        return self
+
+    def stop(self): # function to flush queued frames and close the segment
+
+        if self.thread is not None:
+
+            while self.thread.is_alive(): # a writer that died on a disk error never takes the sentinel
+
+                try:
+
+                    self.queue.put(None, timeout=RECORDER_STOP_POLL) # sentinel, written after every queued frame
+                    break
+
+                except queue.Full:
+
+                    continue
+
+            self.thread.join()
+            self.thread = None
+
+        logging.info(f"Recorder wrote {self.frames_written} frames ({self.bytes_written} bytes), dropped {self.frames_dropped}.\n")
+
+    ##### record frame #####
+
+    def record(self, frame): # function to queue a Frame for writing, never blocks
+
+        if self.failed: # nothing writes the queue anymore
+
+            self.frames_dropped += 1
+            return
+
+        try:
+
+            self.queue.put_nowait(frame)
+
+        except queue.Full: # if the disk cannot keep up...
+
+            self.frames_dropped += 1
+
+    ##### segment files #####
+
+    def _open_segment(self): # function to close the current segment and open the next one
+
+        self._close_segment()
+        self.segment += 1
+        base = os.path.join(self.directory, f"segment_{self.segment:04d}")
+        self.data_file = open(f"{base}.mjpeg", "wb")
+        self.index_file = open(f"{base}.idx", "wb")
+        self.offset = 0
+
+    def _close_segment(self): # function to close the current segment files
+
+        if self.data_file is not None:
+
+            self.data_file.close()
+            self.index_file.close()
+            self.data_file = None
+            self.index_file = None
+
+    ##### writer thread #####
+
+    def _write_loop(self): # function to write frames in batches until the sentinel arrives
+
+        index = np.zeros(RECORDER_BATCH_SIZE, dtype=INDEX_DTYPE) # reused batch of index records
+        running = True
+
+        try:
+
+            while running:
+
+                batch = []
+                item = self.queue.get() # block for the first frame of a batch
+
+                while True:
+
+                    if item is None: # stop after this batch, frames a tap queued behind the sentinel are dropped
+
+                        running = False
+                        break
+
+                    batch.append(item)
+
+                    if len(batch) >= RECORDER_BATCH_SIZE:
+
+                        break
+
+                    try: # then take whatever else is already queued
+
+                        item = self.queue.get_nowait()
+
+                    except queue.Empty:
+
+                        break
+
+                self._write_batch(batch, index)
+
+        except OSError as e: # if the disk is full or gone...
+
+            self.failed = True
+            logging.error(f"ERROR (frame_recorder.py): Failed to write recording: {e}\n")
+
+        finally:
+
+            self._close_segment()
+
+    def _write_batch(self, batch, index): # function to append a batch of frames and their index records
+
+        count = 0
+
+        for frame in batch:
+
+            if self.data_file is None or self.offset + len(frame.data) > self.segment_bytes:
+
+                if count: # flush index records that belong to the old segment
+
+                    self.index_file.write(index[:count].tobytes())
+                    count = 0
+
+                self._open_segment()
+
+            self.data_file.write(frame.data)
+            index[count] = (frame.sequence, frame.timestamp, self.offset, len(frame.data))
+            count += 1
+            self.offset += len(frame.data)
+            self.bytes_written += len(frame.data)
+            self.frames_written += 1
+
+        if count:
+
+            self.index_file.write(index[:count].tobytes())
+
+        if self.data_file is not None: # keep the index usable if the robot loses power
+
+            self.data_file.flush()
+            self.index_file.flush()
+
+
+
+
+
+################################################
+############### RECORDING READER ###############
+################################################
+
+
+########## RECORDING READER ##########
+
+class RecordingReader: # class giving random access to a recorded segment
+
+    """
+    Memory-maps one recorded segment and its index. frame(i) returns the i-th JPEG as a
+    memoryview slice of the mapping (no copy), find(frame_number) seeks by camera
+    sequence number.
+    """
+
+    ##### open segment #####
+
+    def __init__(self, segment_path): # function to map a segment_NNNN.mjpeg file and load its index
+
+        base = os.path.splitext(segment_path)[0]
+        self.index = np.fromfile(f"{base}.idx", dtype=INDEX_DTYPE)
+        self.file = open(f"{base}.mjpeg", "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.index.size else None
+        self.view = memoryview(self.map) if self.map is not None else None
+
+    def __len__(self):
+
+        return len(self.index)
+
+    ##### read frames #####
+
+    def frame(self, position): # function to return the JPEG at an index position
+
+        record = self.index[position]
+        offset = int(record['offset'])
+
+        return self.view[offset:offset + int(record['length'])]
+
+    def find(self, frame_number): # function to return the index position of a camera sequence number
+
+        position = int(np.searchsorted(self.index['frame'], frame_number))
+
+        if position >= len(self.index) or self.index['frame'][position] != frame_number:
+
+            return None
+
+        return position
+
+    ##### close segment #####
+
+    def close(self): # function to release the mapping
+
+        if self.view is not None:
+
+            self.view.release()
+            self.map.close()
+
+        self.file.close()
+
+
+########## LIST SEGMENTS ##########
+
+def list_segments(session_directory): # function to return a session's segment files in order
+
+    return sorted(
+        os.path.join(session_directory, name)
+        for name in os.listdir(session_directory)
+        if name.startswith("segment_") and name.endswith(".mjpeg")
+    )
@@ -0,0 +1,423 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import collections # import collections for the frame record
+import subprocess # import subprocess for camera process timeouts
+import time # import time for timestamps and replay pacing
+import logging # import logging for debugging
+import numpy as np # import numpy for synthetic frames
+import cv2 # import opencv to encode synthetic frames
+
+##### import necessary functions #####
+
+from initialize.initialize_camera import start_camera_process # import the one rpicam-vid launcher
+from vision.mjpeg_splitter import MJPEGSplitter # import MJPEG frame splitter
+from vision.yuv_reader import YUV420Reader, yuv420_frame_size # import raw frame reader
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### frame record #####
+
+# sequence counts every frame the source produced (gaps are frames superseded before being handed out),
+# timestamp is time.monotonic() when the frame was captured, data is JPEG bytes or a flat I420 array
+Frame = collections.namedtuple('Frame', ['sequence', 'timestamp', 'data'])
+
+##### supported codecs #####
+
+FRAME_CODECS = ("mjpeg", "yuv420")
+
+
+
+
+
+############################################
+############### FRAME SOURCE ###############
+############################################
+
+
+########## FRAME SOURCE ##########
+
+class FrameSource: # base class for everything that produces camera frames
+
+    """
+    Common interface for camera frame producers. start() opens the source, read() blocks
+    until the next frame is available and returns it as a Frame (or None once the source
+    is exhausted), stop() releases it. MJPEG frames are bytes; YUV420 frames are flat
+    uint8 arrays from a rotating pool, valid until the pool wraps.
+    """
+
+    ##### initialize frame source #####
+
+    def __init__(self, width, height, codec="mjpeg"): # function to store the frame format
+
+        if codec not in FRAME_CODECS:
+
+            raise ValueError(f"Unsupported codec {codec}, expected one of {FRAME_CODECS}")
+
+        self.width = width # frame width
+        self.height = height # frame height
+        self.codec = codec # mjpeg or yuv420
+        self.sequence = 0 # sequence number of the last frame handed out
+
+    ##### source lifecycle #####
+
+    def start(self): # function to open the source
+
+        return self
+
+    def read(self): # function to return the next Frame, or None at end of stream
+
+        raise NotImplementedError
+
+    def stop(self): # function to release the source
+
+        pass
+
+    ##### iterate frames #####
+
+    def __iter__(self): # function to iterate frames until the source ends
+
+        while True:
+
+            frame = self.read()
+
+            if frame is None:
+
+                return
+
+            yield frame
+
+    ##### context manager #####
+
+    def __enter__(self): # function to start the source for a with block
+
+        return self.start()
+
+    def __exit__(self, *exc_info): # function to stop the source when the with block ends
+
+        self.stop()
+
+
+########## STREAM FRAME SOURCE ##########
+
+class StreamFrameSource(FrameSource): # base class for sources backed by a byte stream
+
+    """
+    Reads MJPEG through MJPEGSplitter or raw I420 through YUV420Reader from any binary
+    stream with readinto. With latest_only, only the newest frame completed by each read
+    is handed out and the sequence number skips over the older ones; otherwise every
+    frame is handed out in order.
+    """
+
+    latest_only = False # live sources override this to drop frames that are already stale
+
+    ##### attach stream #####
+
+    def _attach(self, stream): # function to set up the splitter or reader for a stream
+
+        self.stream = stream
+        self.splitter = MJPEGSplitter() if self.codec == "mjpeg" else None
+        self.reader = YUV420Reader(stream, self.width, self.height) if self.codec == "yuv420" else None
+        self.pending = None # frames completed by the last read and not handed out yet
+
+    ##### read next frame #####
+
+    def _read_stream(self): # function to read the next frame from the stream
+
+        if self.reader is not None: # raw frames need no splitting
+
+            data = self.reader.read()
+
+            if data is None:
+
+                return None
+
+            self.sequence += 1
+
+            return Frame(self.sequence, time.monotonic(), data)
+
+        while True:
+
+            if self.pending is not None: # hand out frames from the last read in order
+
+                for data in self.pending:
+
+                    self.sequence += 1
+
+                    # copy out of the splitter buffer, which is reused by the next read
+                    return Frame(self.sequence, time.monotonic(), bytes(data))
+
+                self.pending = None
+
+            if self.splitter.fill_from(self.stream) == 0: # if the stream ended...
+
+                return None
+
+            if not self.latest_only:
+
+                self.pending = self.splitter.frames()
+                continue
+
+            newest = None
+            completed = 0
+
+            for newest in self.splitter.frames(): # keep only the newest frame of this read
+
+                completed += 1
+
+            if newest is not None:
+
+                self.sequence += completed
+
+                return Frame(self.sequence, time.monotonic(), bytes(newest))
+
+    ##### read frame #####
+
+    def read(self): # function to return the next frame from the stream, or None once it ends
+
+        return self._read_stream()
+
+
+########## RPICAM FRAME SOURCE ##########
+
+class RpicamFrameSource(StreamFrameSource): # class reading frames from rpicam-vid
+
+    latest_only = True # a live camera only ever needs its newest frame
+
+    ##### initialize rpicam source #####
+
+    def __init__(self, width=640, height=480, framerate=30, codec="mjpeg", kill_existing=True): # function to store camera settings
+
+        super().__init__(width, height, codec)
+
+        self.framerate = framerate # camera framerate
+        self.kill_existing = kill_existing # clear stray camera processes before launching
+        self.process = None # rpicam-vid process
+
+    ##### start camera #####
+
+    def start(self): # function to launch rpicam-vid and attach to its stdout
+
+        self.process = start_camera_process(self.width, self.height, self.framerate, self.codec, self.kill_existing)
+
+        if self.process is None:
+
+            raise RuntimeError("Failed to start camera process")
+
+        self._attach(self.process.stdout)
+
+        return self
+
+    ##### stop camera #####
+
+    def stop(self, timeout=2.0): # function to terminate rpicam-vid, which also unblocks any pending read
+
+        if self.process is not None and self.process.poll() is None:
+
+            self.process.terminate()
+
+            try: # give rpicam-vid a chance to release the camera cleanly
+
+                self.process.wait(timeout)
+
+            except subprocess.TimeoutExpired:
+
+                logging.warning("WARNING (frame_source.py): rpicam-vid ignored SIGTERM, killing it.\n")
+                self.process.kill()
+                self.process.wait()
+
+
+########## FILE FRAME SOURCE ##########
+
+class FileFrameSource(StreamFrameSource): # class replaying a recorded MJPEG or YUV420 file
+
+    """
+    Replays a recording made with rpicam-vid -o. framerate paces the replay at the
+    recording's native rate; framerate=None replays as fast as the pipeline can take it.
+    """
+
+    ##### initialize file source #####
+
+    def __init__(self, path, width=640, height=480, codec=None, framerate=30, loop=False): # function to store replay settings
+
+        if codec is None: # guess the codec from the file extension
+
+            codec = "yuv420" if path.endswith((".yuv", ".i420", ".raw")) else "mjpeg"
+
+        super().__init__(width, height, codec)
+
+        self.path = path # recording path
+        self.framerate = framerate # replay rate, None for unthrottled
+        self.loop = loop # restart from the beginning at end of file
+        self.file = None # open recording
+        self.next_frame_time = None # monotonic time the next frame is due
+
+    ##### open recording #####
+
+    def start(self): # function to open the recording
+
+        self.file = open(self.path, "rb", buffering=0)
+        self._attach(self.file)
+        self.next_frame_time = time.monotonic()
+
+        if self.codec == "yuv420" and self.file.seek(0, 2) % yuv420_frame_size(self.width, self.height):
+
+            logging.warning(f"WARNING (frame_source.py): {self.path} is not a whole number of {self.width}x{self.height} frames.\n")
+
+        self.file.seek(0)
+
+        return self
+
+    ##### replay next frame #####
+
+    def read(self): # function to return the next recorded frame at the replay rate
+
+        frame = self._read_stream()
+
+        if frame is None and self.loop: # rewind and continue
+
+            self.file.seek(0)
+            self._attach(self.file)
+            frame = self._read_stream()
+
+        if frame is None:
+
+            return None
+
+        if self.framerate: # wait until the frame is due at the native rate
+
+            delay = self.next_frame_time - time.monotonic()
+
+            if delay > 0:
+
+                time.sleep(delay)
+
+            self.next_frame_time = max(self.next_frame_time, time.monotonic() - 1.0) + 1.0 / self.framerate
+
+            frame = frame._replace(timestamp=time.monotonic())
+
+        return frame
+
+    ##### close recording #####
+
+    def stop(self): # function to close the recording
+
+        if self.file is not None:
+
+            self.file.close()
+            self.file = None
+
+
+########## SYNTHETIC FRAME SOURCE ##########
+
+class SyntheticFrameSource(FrameSource): # class generating frames in memory
+
+    """
+    Generates a moving test pattern in memory, encoded once up front so reading costs
+    nothing but the hand-off. Useful to benchmark and regression-test the vision pipeline
+    on a machine without a camera.
+    """
+
+    ##### initialize synthetic source #####
+
+    def __init__(self, width=640, height=480, codec="mjpeg", frame_count=None, framerate=None, pattern_frames=30, seed=0): # function to pre-render the pattern
+
+        super().__init__(width, height, codec)
+
+        self.frame_count = frame_count # number of frames before the source ends, None for endless
+        self.framerate = framerate # generation rate, None for unthrottled
+        self.next_frame_time = None # monotonic time the next frame is due
+
+        rng = np.random.default_rng(seed)
+        base = rng.integers(0, 255, (max(height // 16, 1), max(width // 16, 1), 3), dtype=np.uint8)
+        base = cv2.resize(base, (width, height), interpolation=cv2.INTER_CUBIC) # smooth, camera-like content
+        self.frames = []
+
+        for i in range(pattern_frames): # pan the pattern so consecutive frames differ
+
+            image = np.roll(base, i * 8, axis=1)
+
+            if codec == "mjpeg":
+
+                self.frames.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes())
+
+            else:
+
+                self.frames.append(cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420).reshape(-1))
+
+    ##### start generator #####
+
+    def start(self): # function to reset the generator
+
+        self.sequence = 0
+        self.next_frame_time = time.monotonic()
+
+        return self
+
+    ##### generate next frame #####
+
+    def read(self): # function to hand out the next pre-rendered frame
+
+        if self.frame_count is not None and self.sequence >= self.frame_count:
+
+            return None
+
+        if self.framerate:
+
+            if self.next_frame_time is None:
+
+                self.next_frame_time = time.monotonic()
+
+            delay = self.next_frame_time - time.monotonic()
+
+            if delay > 0:
+
+                time.sleep(delay)
+
+            self.next_frame_time += 1.0 / self.framerate
+
+        data = self.frames[self.sequence % len(self.frames)]
+        self.sequence += 1
+
+        return Frame(self.sequence, time.monotonic(), data)
+
+
+########## CREATE FRAME SOURCE ##########
+
+def create_frame_source(spec, width=640, height=480, codec=None, framerate=30): # function to build a source from a string
+
+    """
+    Builds a FrameSource from a short description, so scripts can take it on the command line:
+    "camera" for rpicam-vid, "synthetic" for the in-memory generator, anything else is a
+    recording path. framerate=None replays recordings unthrottled.
+    """
+
+    if spec == "camera":
+
+        return RpicamFrameSource(width, height, framerate or 30, codec or "mjpeg")
+
+    if spec == "synthetic":
+
+        return SyntheticFrameSource(width, height, codec or "mjpeg", framerate=framerate)
+
+    return FileFrameSource(spec, width, height, codec, framerate)
@@ -0,0 +1,196 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import collections # import collections for the result record
+import threading # import threading to hand results from callbacks to the caller
+import time # import time for latency measurement
+import logging # import logging for debugging
+import numpy as np # import numpy for the preallocated input
+import cv2 # import opencv to fit mismatched frames into the input
+from openvino.runtime import AsyncInferQueue, Tensor # import openvino's pool of infer requests and tensors
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### inference result record #####
+
+# sequence is the source frame sequence number, context is whatever the caller submitted with the input
+# (usually the decoded frame), output is a copy of output 0, submitted and completed are time.monotonic()
+InferenceResult = collections.namedtuple('InferenceResult', ['sequence', 'context', 'output', 'submitted', 'completed'])
+
+
+
+
+
+################################################
+############### INFERENCE ENGINE ###############
+################################################
+
+
+########## FRAME INFER REQUEST ##########
+
+class FrameInferRequest: # class running synchronous inference on decoded frames through one reused input
+
+    """
+    Synchronous inference for a model compiled with baked-in preprocessing
+    (load_and_compile_model(..., frame_size=...)). The input tensor wraps a preallocated
+    uint8 [1, height, width, 3] array, so each frame costs one copy into it and no Python
+    side conversion. A frame of another size is resized straight into the buffer instead.
+    The returned output is a view into the request, valid until the next infer().
+    """
+
+    ##### initialize request #####
+
+    def __init__(self, compiled_model): # function to create the request and its shared input buffer
+
+        self.request = compiled_model.create_infer_request()
+        self.buffer = np.zeros(tuple(compiled_model.input(0).shape), dtype=np.uint8) # reused NHWC input
+        self.request.set_input_tensor(Tensor(self.buffer, shared_memory=True))
+        self.frame_size = (self.buffer.shape[2], self.buffer.shape[1]) # (width, height) the model takes
+
+    ##### run inference #####
+
+    def infer(self, frame): # function to run inference on a decoded BGR frame
+
+        if frame.shape[:2] == self.buffer.shape[1:3]:
+
+            np.copyto(self.buffer[0], frame)
+
+        else: # if the decode scale changed...
+
+            cv2.resize(frame, self.frame_size, dst=self.buffer[0], interpolation=cv2.INTER_LINEAR)
+
+        self.request.infer()
+
+        return self.request.get_output_tensor(0).data
+
+
+########## ASYNC INFERENCE ENGINE ##########
+
+class AsyncInferenceEngine: # class keeping several infer requests in flight
+
+    """
+    Pipelines inference over an AsyncInferQueue with depth requests in flight, so the
+    caller captures and preprocesses the next frame while the device works on earlier
+    ones. submit() only blocks when every request is busy. Completion callbacks copy the
+    output out of the request and ready() hands results back strictly in submission order,
+    each tagged with its source frame sequence number. depth=None uses the device's
+    optimal number of infer requests.
+    """
+
+    ##### initialize engine #####
+
+    def __init__(self, compiled_model, depth=None): # function to create the infer request pool
+
+        if depth is None:
+
+            try:
+
+                depth = compiled_model.get_property("OPTIMAL_NUMBER_OF_INFER_REQUESTS")
+
+            except RuntimeError: # if the plugin does not report it...
+
+                depth = 2
+
+        self.depth = depth # infer requests in flight
+        self.queue = AsyncInferQueue(compiled_model, depth) # pool of infer requests
+        self.queue.set_callback(self._completed)
+        self.lock = threading.Condition() # guards completed results and wakes waiting callers
+        self.completed = {} # finished results by submission index
+        self.submitted = 0 # submission index of the next request
+        self.delivered = 0 # submission index of the next result to hand out
+        self.errors = 0 # requests that failed
+
+        logging.info(f"Inference engine running {depth} requests in flight.\n")
+
+    ##### submit input #####
+
+    def submit(self, input_blob, sequence, context=None): # function to start inference, blocks while every request is busy
+
+        index = self.submitted
+        self.submitted += 1
+        self.queue.start_async({0: input_blob}, (index, sequence, context, time.monotonic()))
+
+        return index
+
+    ##### completion callback #####
+
+    def _completed(self, request, userdata): # function called on an openvino thread when a request finishes
+
+        index, sequence, context, submitted = userdata
+
+        try:
+
+            output = request.get_output_tensor(0).data.copy() # the request is reused as soon as this returns
+
+        except RuntimeError as e:
+
+            logging.error(f"ERROR (inference_engine.py): Inference failed for frame {sequence}: {e}\n")
+            self.errors += 1
+            output = None
+
+        with self.lock:
+
+            self.completed[index] = InferenceResult(sequence, context, output, submitted, time.monotonic())
+            self.lock.notify_all()
+
+    ##### collect results #####
+
+    def ready(self): # function to return every result that is next in submission order, never blocks
+
+        results = []
+
+        with self.lock:
+
+            while self.delivered in self.completed:
+
+                results.append(self.completed.pop(self.delivered))
+                self.delivered += 1
+
+        return results
+
+    def next(self, timeout=None): # function to wait for the next result in submission order
+
+        with self.lock:
+
+            if self.delivered == self.submitted: # nothing in flight
+
+                return None
+
+            if not self.lock.wait_for(lambda: self.delivered in self.completed, timeout):
+
+                return None
+
+            self.delivered += 1
+
+            return self.completed.pop(self.delivered - 1)
+
+    def drain(self): # function to wait for every request in flight and return their results in order
+
+        self.queue.wait_all()
+
+        return self.ready()
+
+    @property
+    def in_flight(self): # function to return the number of submitted results not handed out yet
+
+        return self.submitted - self.delivered
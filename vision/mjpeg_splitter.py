@@ -0,0 +1,209 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+import logging # import logging for debugging
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### jpeg markers #####
+
+JPEG_SOI = b'\xff\xd8' # start of image marker
+JPEG_EOI = b'\xff\xd9' # end of image marker
+
+##### splitter hyperparameters #####
+
+SPLITTER_CAPACITY = 1 << 20 # 1 MiB, several 1280x720 MJPEG frames
+SPLITTER_READ_SIZE = 65536 # maximum bytes pulled from the camera pipe per read
+
+
+
+
+
+##############################################
+############### MJPEG SPLITTER ###############
+##############################################
+
+
+########## MJPEG SPLITTER ##########
+
+class MJPEGSplitter: # class to split an MJPEG byte stream into single JPEG frames
+
+    """
+    Splits an MJPEG byte stream into JPEG frames using one preallocated buffer.
+
+    Incoming bytes are written (or read straight from the pipe with readinto) behind a
+    write cursor, and a scan cursor remembers how far the buffer has already been searched
+    so every byte is scanned once. Completed frames are handed out as memoryview slices of
+    the buffer; a view is only valid until the next feed() or fill_from() call, so decode
+    or copy it before pulling more data. When the write cursor reaches the end of the
+    buffer, the unconsumed tail (at most one partial frame) wraps back to the front.
+    """
+
+    #####  initialize splitter #####
+
+    def __init__(self, capacity=SPLITTER_CAPACITY): # function to preallocate the frame buffer
+
+        self.capacity = capacity # set buffer capacity
+        self.buffer = bytearray(capacity) # preallocate buffer
+        self.view = memoryview(self.buffer) # zero-copy view over the buffer
+        self.read_pos = 0 # first byte not yet consumed
+        self.write_pos = 0 # first free byte
+        self.scan_pos = 0 # first byte not yet searched for a marker
+        self.frame_start = -1 # start of the frame being assembled, -1 if none
+
+        ##### statistics #####
+
+        self.frames_out = 0 # number of complete frames handed out
+        self.bytes_in = 0 # number of bytes received
+        self.overflows = 0 # number of oversized frames dropped
+
+    ##### make room for incoming bytes #####
+
+    def _reserve(self, size): # function to return how many bytes can be written behind the write cursor
+
+        if self.capacity - self.write_pos >= size: # if there is already room...
+
+            return size
+
+        if self.read_pos > 0: # if consumed bytes sit at the front, wrap the partial frame back to the front
+
+            pending = self.write_pos - self.read_pos
+            shift = self.read_pos
+            self.view[0:pending] = self.view[self.read_pos:self.write_pos]
+            self.read_pos = 0
+            self.write_pos = pending
+            self.scan_pos -= shift
+
+            if self.frame_start >= 0: # keep partial frame start aligned with the move
+
+                self.frame_start -= shift
+
+        free = self.capacity - self.write_pos
+
+        if free == 0: # if a single frame fills the whole buffer...
+
+            logging.warning("WARNING (mjpeg_splitter.py): Frame larger than splitter capacity, dropping it.\n")
+            self.overflows += 1
+            self.reset()
+            free = self.capacity
+
+        return min(size, free)
+
+    ##### feed bytes #####
+
+    def feed(self, chunk): # function to append an already read chunk to the buffer
+
+        chunk = memoryview(chunk)
+
+        while len(chunk): # copy in pieces so an almost full buffer can wrap between them
+
+            size = self._reserve(len(chunk))
+            self.view[self.write_pos:self.write_pos + size] = chunk[:size]
+            self.write_pos += size
+            self.bytes_in += size
+            chunk = chunk[size:]
+
+    ##### read bytes straight from a stream #####
+
+    def fill_from(self, stream, size=SPLITTER_READ_SIZE): # function to read a stream directly into the buffer
+
+        """
+        Reads up to size bytes from stream (camera_process.stdout) into the buffer.
+        Returns the number of bytes read, 0 on end of stream.
+        """
+
+        size = self._reserve(size)
+        count = stream.readinto(self.view[self.write_pos:self.write_pos + size])
+
+        if not count: # if stream is closed...
+
+            return 0
+
+        self.write_pos += count
+        self.bytes_in += count
+
+        return count
+
+    ##### split frames #####
+
+    def frames(self): # function to yield every complete frame found in the new bytes
+
+        """
+        Yields memoryview slices for each complete JPEG frame in the buffer. Only bytes
+        added since the last call are scanned, and markers split across two chunks are
+        found by stepping the scan cursor back one byte.
+        """
+
+        buffer = self.buffer
+
+        while True:
+
+            if self.frame_start < 0: # if no frame has started yet...
+
+                start = buffer.find(JPEG_SOI, max(self.scan_pos - 1, self.read_pos), self.write_pos)
+
+                if start < 0: # if no start marker, throw away garbage but keep a possible half marker
+
+                    self.read_pos = max(self.read_pos, self.write_pos - 1)
+                    self.scan_pos = self.write_pos
+                    return
+
+                self.frame_start = start
+                self.read_pos = start
+                self.scan_pos = start + 2
+
+            end = buffer.find(JPEG_EOI, max(self.scan_pos - 1, self.frame_start + 2), self.write_pos)
+
+            if end < 0: # if frame is incomplete, wait for more bytes
+
+                self.scan_pos = self.write_pos
+                return
+
+            end += 2
+            frame = self.view[self.frame_start:end]
+
+            self.frame_start = -1
+            self.read_pos = end
+            self.scan_pos = end
+            self.frames_out += 1
+
+            yield frame
+
+    ##### latest frame #####
+
+    def latest_frame(self): # function to return only the newest complete frame
+
+        frame = None
+
+        for frame in self.frames(): # drain every complete frame, keeping the last
+
+            pass
+
+        return frame
+
+    ##### reset splitter #####
+
+    def reset(self): # function to throw away all buffered bytes
+
+        self.read_pos = 0
+        self.write_pos = 0
+        self.scan_pos = 0
+        self.frame_start = -1
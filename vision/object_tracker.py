@@ -0,0 +1,250 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import numpy as np # import numpy for the batched kalman filter
+
+##### import necessary functions #####
+
+from vision.detection_postprocess import DETECTION_DTYPE, detection_boxes, iou_matrix # import detection record and iou
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### track record, one per tracked object #####
+
+TRACK_DTYPE = np.dtype(DETECTION_DTYPE.descr + [
+    ('track_id', '<i4'), # stable id, never reused
+    ('misses', '<i4'), # frames since the track last matched a detection
+])
+
+##### tracker hyperparameters #####
+
+TRACKER_DETECT_INTERVAL = 5 # run the detector at least every this many frames
+TRACKER_IOU_THRESHOLD = 0.3 # smallest IoU between a predicted track and a detection to match them
+TRACKER_MAX_MISSES = 15 # frames a track survives without a matching detection
+TRACKER_CONFIDENCE_DECAY = 0.9 # track confidence multiplier per predicted frame
+TRACKER_REDETECT_CONFIDENCE = 0.4 # run the detector early once any track decays below this
+TRACKER_POSITION_NOISE = 1.0 / 20 # process and measurement noise on position, relative to box height
+TRACKER_VELOCITY_NOISE = 1.0 / 160 # process noise on velocity, relative to box height
+
+##### constant velocity model over (cx, cy, w, h, vcx, vcy, vw, vh) #####
+
+KALMAN_TRANSITION = np.eye(8, dtype=np.float64)
+KALMAN_TRANSITION[:4, 4:] = np.eye(4) # one frame per step
+
+
+
+
+
+############################################
+############### KALMAN BOXES ###############
+############################################
+
+
+########## BOX CONVERSION ##########
+
+def boxes_to_measurements(boxes): # function to convert (x0, y0, x1, y1) boxes to (cx, cy, w, h)
+
+    return np.column_stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2,
+                            boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]))
+
+
+def states_to_boxes(states): # function to convert kalman states back to (x0, y0, x1, y1) boxes
+
+    half_width = np.maximum(states[:, 2], 0) / 2
+    half_height = np.maximum(states[:, 3], 0) / 2
+
+    return np.column_stack((states[:, 0] - half_width, states[:, 1] - half_height,
+                            states[:, 0] + half_width, states[:, 1] + half_height))
+
+
+########## NOISE ##########
+
+def _noise(heights, position_only=False): # function to build per-track diagonal noise covariances scaled by box height
+
+    position = (TRACKER_POSITION_NOISE * heights) ** 2
+    columns = [position] * 4
+
+    if not position_only:
+
+        columns += [(TRACKER_VELOCITY_NOISE * heights) ** 2] * 4
+
+    diagonal = np.column_stack(columns)
+    noise = np.zeros(diagonal.shape + (diagonal.shape[1],))
+    index = np.arange(diagonal.shape[1])
+    noise[:, index, index] = diagonal
+
+    return noise
+
+
+
+
+
+##############################################
+############### OBJECT TRACKER ###############
+##############################################
+
+
+########## OBJECT TRACKER ##########
+
+class ObjectTracker: # class following detections between detector runs
+
+    """
+    Multi-object tracker on top of postprocess_detections output. Every track carries a
+    constant-velocity Kalman filter over its box centre and size; all filters are
+    predicted and updated together as batched array operations. Detections are
+    associated to predicted tracks greedily by IoU (same class only), unmatched
+    detections start new tracks with fresh ids, and tracks unmatched for max_misses
+    frames are dropped.
+
+    step(detections) is called once per frame, with the detector's output on frames
+    where it ran and None in between; needs_detection() says when the detector should
+    run next: every detect_interval frames, or earlier once a track's confidence has
+    decayed below redetect_confidence.
+    """
+
+    ##### initialize tracker #####
+
+    def __init__(self, detect_interval=TRACKER_DETECT_INTERVAL, iou_threshold=TRACKER_IOU_THRESHOLD, max_misses=TRACKER_MAX_MISSES, redetect_confidence=TRACKER_REDETECT_CONFIDENCE): # function to create an empty tracker
+
+        self.detect_interval = detect_interval # longest run of frames without the detector
+        self.iou_threshold = iou_threshold # association threshold
+        self.max_misses = max_misses # frames a track may go unmatched
+        self.redetect_confidence = redetect_confidence # confidence that triggers an early detection
+        self.states = np.zeros((0, 8)) # kalman state per track
+        self.covariances = np.zeros((0, 8, 8)) # kalman covariance per track
+        self.tracks = np.zeros(0, dtype=TRACK_DTYPE) # live tracks, boxes follow the states
+        self.next_id = 1 # id of the next new track
+        self.frames_since_detection = 0 # frames stepped without detections
+
+        ##### statistics #####
+
+        self.detector_runs = 0 # frames stepped with detections
+        self.frames = 0 # frames stepped
+
+    ##### detection schedule #####
+
+    def needs_detection(self): # function to decide whether the detector should run on the next frame
+
+        if self.detector_runs == 0 or self.frames_since_detection + 1 >= self.detect_interval:
+
+            return True
+
+        return bool(len(self.tracks)) and self.tracks['score'].min() < self.redetect_confidence
+
+    ##### advance one frame #####
+
+    def step(self, detections=None): # function to predict every track one frame ahead and correct it with detections
+
+        self.frames += 1
+        self._predict()
+
+        if detections is None:
+
+            self.frames_since_detection += 1
+            self.tracks['score'] *= TRACKER_CONFIDENCE_DECAY
+
+        else:
+
+            self.frames_since_detection = 0
+            self.detector_runs += 1
+            self._update(detections)
+
+        ##### drop lost tracks and publish boxes #####
+
+        alive = self.tracks['misses'] <= self.max_misses
+        self.states = self.states[alive]
+        self.covariances = self.covariances[alive]
+        self.tracks = self.tracks[alive]
+        boxes = states_to_boxes(self.states)
+        self.tracks['x0'], self.tracks['y0'], self.tracks['x1'], self.tracks['y1'] = boxes.T
+
+        return self.tracks.copy()
+
+    ##### kalman predict #####
+
+    def _predict(self): # function to run the batched kalman prediction
+
+        if not len(self.states):
+
+            return
+
+        self.states = self.states @ KALMAN_TRANSITION.T
+        self.covariances = KALMAN_TRANSITION @ self.covariances @ KALMAN_TRANSITION.T + _noise(self.states[:, 3])
+        self.tracks['misses'] += 1
+
+    ##### associate and correct #####
+
+    def _update(self, detections): # function to match detections to tracks, correct matches and start new tracks
+
+        measurements = boxes_to_measurements(detection_boxes(detections).astype(np.float64))
+        matched_detections = np.zeros(len(detections), dtype=bool)
+
+        if len(self.tracks) and len(detections):
+
+            ##### greedy iou association, best pairs first #####
+
+            iou = iou_matrix(states_to_boxes(self.states), detection_boxes(detections))
+            iou[self.tracks['class'][:, None] != detections['class']] = 0 # never match across classes
+            track_index, detection_index = np.nonzero(iou >= self.iou_threshold)
+            order = np.argsort(-iou[track_index, detection_index], kind="stable")
+            matched_tracks = np.zeros(len(self.tracks), dtype=bool)
+            pairs = []
+
+            for track, detection in zip(track_index[order].tolist(), detection_index[order].tolist()):
+
+                if not matched_tracks[track] and not matched_detections[detection]:
+
+                    matched_tracks[track] = matched_detections[detection] = True
+                    pairs.append((track, detection))
+
+            ##### batched kalman update of matched tracks #####
+
+            if pairs:
+
+                tracks, matches = np.array(pairs).T
+                covariances = self.covariances[tracks]
+                innovation_covariance = covariances[:, :4, :4] + _noise(self.states[tracks, 3], position_only=True)
+                gain = covariances[:, :, :4] @ np.linalg.inv(innovation_covariance)
+                residual = measurements[matches] - self.states[tracks, :4]
+                self.states[tracks] += (gain @ residual[:, :, None])[:, :, 0]
+                self.covariances[tracks] = covariances - gain @ covariances[:, :4, :]
+                self.tracks['score'][tracks] = detections['score'][matches]
+                self.tracks['misses'][tracks] = 0
+
+        ##### start tracks for unmatched detections #####
+
+        new = np.flatnonzero(~matched_detections)
+
+        if new.size:
+
+            states = np.zeros((new.size, 8))
+            states[:, :4] = measurements[new]
+            covariances = _noise(measurements[new, 3]) * 10 # unknown velocity, trust the first boxes loosely
+            tracks = np.zeros(new.size, dtype=TRACK_DTYPE)
+            tracks['class'] = detections['class'][new]
+            tracks['score'] = detections['score'][new]
+            tracks['track_id'] = np.arange(self.next_id, self.next_id + new.size)
+            self.next_id += new.size
+            self.states = np.concatenate((self.states, states))
+            self.covariances = np.concatenate((self.covariances, covariances))
+            self.tracks = np.concatenate((self.tracks, tracks))
@@ -0,0 +1,295 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import threading # import threading to serve clients off the control thread
+import time # import time for client frame pacing
+import logging # import logging for debugging
+import json # import json to serve metrics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # import http server
+from urllib.parse import urlparse, parse_qs # import url parsing for client options
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### preview hyperparameters #####
+
+PREVIEW_HOST = "127.0.0.1" # interface the preview is served on, the stream is unauthenticated so only this machine by default
+PREVIEW_PORT = 8080 # port the preview is served on
+PREVIEW_BOUNDARY = "frame" # multipart boundary between JPEG frames
+PREVIEW_CLIENT_TIMEOUT = 5.0 # seconds a client thread waits for a frame before re-checking for shutdown
+
+
+
+
+
+##################################################
+############### PREVIEW FRAME SLOT ###############
+##################################################
+
+
+########## PREVIEW FRAME SLOT ##########
+
+class PreviewFrameSlot: # class holding the newest JPEG for every preview client
+
+    """
+    Holds the newest JPEG together with a sequence number. Each client remembers the last
+    sequence it sent and waits for a newer one, so a slow client skips frames instead of
+    queueing them, and publish() never waits on any client.
+    """
+
+    ##### initialize slot #####
+
+    def __init__(self): # function to create an empty slot
+
+        self.condition = threading.Condition() # lock + wakeup for client threads
+        self.jpeg = None # newest JPEG bytes
+        self.sequence = 0 # sequence of the newest JPEG
+
+    ##### publish frame #####
+
+    def publish(self, jpeg): # function to replace the newest JPEG
+
+        with self.condition:
+
+            self.jpeg = jpeg
+            self.sequence += 1
+            self.condition.notify_all()
+
+    ##### wait for newer frame #####
+
+    def wait_newer(self, sequence, timeout): # function to wait for a frame newer than sequence
+
+        with self.condition:
+
+            if self.sequence <= sequence: # if the client already sent the newest frame...
+
+                self.condition.wait(timeout)
+
+            return self.sequence, self.jpeg
+
+
+
+
+
+##############################################
+############### PREVIEW SERVER ###############
+##############################################
+
+
+########## REQUEST HANDLER ##########
+
+class PreviewRequestHandler(BaseHTTPRequestHandler): # class to stream the preview to one client
+
+    ##### serve client #####
+
+    def do_GET(self): # function to stream multipart JPEGs until the client disconnects
+
+        request = urlparse(self.path)
+
+        if request.path == "/metrics":
+
+            self.send_metrics()
+            return
+
+        if request.path not in ("/", "/stream.mjpg"):
+
+            self.send_error(404)
+            return
+
+        ##### per client frame skipping policy #####
+
+        options = parse_qs(request.query)
+
+        try:
+
+            max_fps = float(options.get("fps", ["0"])[0]) # ?fps=5 limits a client over a slow link
+
+        except ValueError: # if the client sent something that is not a number...
+
+            self.send_error(400, "fps must be a number")
+            return
+
+        min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={PREVIEW_BOUNDARY}")
+        self.end_headers()
+
+        server = self.server
+        sent_sequence = 0
+        last_sent = 0.0
+        server.client_connected()
+
+        try:
+
+            while not server.stopping:
+
+                sequence, jpeg = server.slot.wait_newer(sent_sequence, PREVIEW_CLIENT_TIMEOUT)
+
+                if sequence <= sent_sequence or jpeg is None: # if the camera stalled...
+
+                    continue
+
+                if min_interval and time.monotonic() - last_sent < min_interval: # if client is rate limited...
+
+                    time.sleep(min_interval - (time.monotonic() - last_sent))
+                    continue # pick up whatever is newest after the pause
+
+                skipped = sequence - sent_sequence - 1 # frames published since the last one sent, counted once when sending
+
+                if sent_sequence and skipped > 0:
+
+                    server.count_skipped(skipped)
+
+                self.wfile.write(
+                    f"--{PREVIEW_BOUNDARY}\r\n"
+                    f"Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                )
+                self.wfile.write(jpeg) # original camera bytes, no re-encode
+                self.wfile.write(b"\r\n")
+
+                sent_sequence = sequence
+                last_sent = time.monotonic()
+
+        except (BrokenPipeError, ConnectionResetError): # if the client went away...
+
+            pass
+
+        finally:
+
+            server.client_disconnected()
+
+    ##### serve metrics #####
+
+    def send_metrics(self): # function to answer with every registered metrics provider as json
+
+        try:
+
+            body = json.dumps({name: provider() for name, provider in list(self.server.metrics.items())}).encode()
+
+        except Exception as e: # a provider failed, report it instead of killing the handler
+
+            logging.error(f"ERROR (preview_server.py): Failed to collect metrics: {e}\n")
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    ##### route http logs to the robot log #####
+
+    def log_message(self, format, *args): # function to keep http access logs out of stderr
+
+        logging.debug(f"Preview {self.address_string()}: {format % args}")
+
+
+########## PREVIEW SERVER ##########
+
+class PreviewServer(ThreadingHTTPServer): # class serving the camera's JPEGs as an MJPEG stream
+
+    """
+    Small local HTTP server streaming the camera's original JPEG bytes to any number of
+    clients at http://<host>:<port>/stream.mjpg. Each client runs on its own thread and
+    only ever sends the newest frame, so a slow viewer drops frames rather than stalling
+    the robot. http://<host>:<port>/metrics returns the stats of every provider added
+    with add_metrics() as json. Nothing is authenticated, so it only listens on
+    PREVIEW_HOST (loopback) unless host is set wider on purpose, e.g. "0.0.0.0" on a
+    trusted network; otherwise reach it through an SSH tunnel.
+    """
+
+    daemon_threads = True # client threads die with the robot
+    allow_reuse_address = True # allow quick restarts on the same port
+
+    ##### initialize server #####
+
+    def __init__(self, host=PREVIEW_HOST, port=PREVIEW_PORT): # function to bind the preview server
+
+        super().__init__((host, port), PreviewRequestHandler)
+
+        self.slot = PreviewFrameSlot() # newest frame shared by every client
+        self.stopping = False # set when the server shuts down
+        self.thread = None # thread running serve_forever
+        self.stats_lock = threading.Lock() # protects the client statistics
+        self.clients = 0 # number of connected clients
+        self.frames_skipped = 0 # frames skipped across all clients
+        self.metrics = {} # name -> function returning json serializable stats
+
+    ##### start and stop #####
+
+    def start(self): # function to serve clients on a background thread
+
+        self.thread = threading.Thread(target=self.serve_forever, name="preview-server", daemon=True)
+        self.thread.start()
+        logging.info(f"Preview server streaming on {self.server_address[0]}:{self.server_address[1]}.\n")
+
+    def stop(self): # function to stop serving and release the port
+
+        self.stopping = True
+
+        with self.slot.condition: # wake clients so they notice the shutdown
+
+            self.slot.condition.notify_all()
+
+        if self.thread is not None: # shutdown() waits for serve_forever, only call it if serving
+
+            self.shutdown()
+
+        self.server_close()
+
+    ##### publish frame #####
+
+    def publish(self, jpeg): # function called by the control loop with the camera's JPEG bytes
+
+        self.slot.publish(jpeg)
+
+    ##### metrics #####
+
+    def add_metrics(self, name, provider): # function to serve provider() under name at /metrics
+
+        self.metrics[name] = provider
+
+    ##### client statistics #####
+
+    def client_connected(self): # function to count a new client
+
+        with self.stats_lock:
+
+            self.clients += 1
+
+    def client_disconnected(self): # function to count a client leaving
+
+        with self.stats_lock:
+
+            self.clients -= 1
+
+    def count_skipped(self, count): # function to count frames a slow client skipped
+
+        with self.stats_lock:
+
+            self.frames_skipped += count
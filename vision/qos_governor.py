@@ -0,0 +1,318 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import collections # import collections for level records and latency windows
+import threading # import threading to guard the metrics the preview thread reads
+import time # import time for loop and stage timing
+import logging # import logging for debugging
+import numpy as np # import numpy for latency percentiles
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### quality level and transition records #####
+
+# inference_stride runs inference on every nth frame, decode_reduction divides the size decoded frames must cover,
+# camera is (width, height, framerate) to restart the camera at, None for the settings it was started with
+QoSLevel = collections.namedtuple('QoSLevel', ['name', 'inference_stride', 'decode_reduction', 'camera'])
+
+# time is time.monotonic(), miss_ratio, p95_ms (loop time) and result_p95_ms (vision result latency) describe the window that caused the transition
+QoSTransition = collections.namedtuple('QoSTransition', ['time', 'from_level', 'to_level', 'miss_ratio', 'p95_ms', 'result_p95_ms'])
+
+##### quality levels, best first #####
+
+QOS_LEVELS = (
+    QoSLevel("full", 1, 1, None),
+    QoSLevel("skip inference", 2, 1, None),
+    QoSLevel("low decode", 2, 2, None),
+    QoSLevel("low camera", 2, 2, (320, 240, 15)),
+)
+
+##### governor hyperparameters #####
+
+QOS_LOOP_DEADLINE = 1.0 / 30 # seconds one loop may take, one frame at 30 fps
+QOS_WINDOW = 60 # loops judged together before the level may change
+QOS_STEP_DOWN_MISSES = 0.2 # step down once more than this fraction of a window missed the deadline
+QOS_STEP_UP_HEADROOM = 0.5 # a window has headroom without misses and with its p95 loop time and result latency below this fraction of their budgets
+QOS_STEP_UP_WINDOWS = 3 # windows in a row with headroom before stepping up, so the governor does not oscillate
+QOS_STAGE_HISTORY = 300 # latencies kept per stage for the metrics
+
+
+
+
+
+############################################
+############### QOS GOVERNOR ###############
+############################################
+
+
+########## QOS GOVERNOR ##########
+
+class QoSGovernor: # class trading vision quality for loop time
+
+    """
+    Watches how long each loop and each vision result takes against a deadline and sheds
+    vision work when either is over budget. Levels (QOS_LEVELS) are walked one step at a
+    time: first inference only runs on every other frame, then frames are decoded at a
+    lower DCT scale, and finally the camera is restarted at a lower resolution and
+    framerate.
+    Every window of loops is judged as a whole: too many deadline misses step down at
+    once, while stepping back up takes several windows in a row without misses and with
+    enough headroom. Each step clears the window, so a new level is always judged on
+    its own loops.
+
+    With a VisionWorker the loop itself only copies frames and results, so the work the
+    levels shed happens in the worker and is judged through result(): a result misses
+    when the worker took longer from capture to publish than the time until the next
+    frame it is handed (deadline times the inference stride), since the worker then falls
+    behind and frames are overwritten before it gets to them.
+
+    Usage: begin_loop() at the top of the loop, t = stage(name, t) after each stage,
+    should_infer(sequence) before inference, result(latency) for every vision result and
+    end_loop() at the bottom. Only work the levels can shed counts against the deadline:
+    stages recorded with budgeted=False (servo writes, blocking gaits) are timed for the
+    metrics but taken out of the loop time. decoder (FrameDecoder), vision (VisionWorker,
+    which takes the inference stride, decode reduction and camera size) and camera
+    (CameraSupervisor) are optional; levels only change what they are given. level,
+    transitions and stats() are the metrics; stats() may be called from another thread,
+    e.g. the preview server's /metrics.
+    """
+
+    ##### initialize governor #####
+
+    def __init__(self, deadline=QOS_LOOP_DEADLINE, levels=QOS_LEVELS, window=QOS_WINDOW, decoder=None, camera=None, vision=None): # function to start at full quality
+
+        self.deadline = deadline # seconds one loop may take
+        self.levels = levels # quality levels, best first
+        self.window = window # loops judged together
+        self.decoder = decoder # FrameDecoder whose decode scale is lowered
+        self.vision = vision # VisionWorker whose inference stride and decode scale are lowered
+        self.camera = camera # CameraSupervisor that is restarted at lower settings
+        self.base_target_size = decoder.target_size if decoder is not None else None # decode target at full quality
+        self.base_camera = (camera.width, camera.height, camera.framerate) if camera is not None else None # camera settings at full quality
+        self.index = 0 # index of the current level
+        self.loop_start = None # monotonic time the current loop began
+        self.loop_excluded = 0.0 # seconds of the current loop spent in stages outside the budget
+        self.window_times = [] # loop durations of the current window
+        self.window_misses = 0 # deadline misses in the current window
+        self.window_results = [] # vision result latencies of the current window
+        self.window_result_misses = 0 # vision results over their budget in the current window
+        self.headroom_windows = 0 # windows in a row with headroom
+        self.stage_times = {} # stage name -> recent latencies in seconds
+        self.stats_lock = threading.Lock() # protects stage_times and transitions while stats() copies them
+
+        ##### statistics #####
+
+        self.loops = 0 # loops measured
+        self.deadline_misses = 0 # loops over the deadline
+        self.results = 0 # vision results measured
+        self.result_misses = 0 # vision results over their budget
+        self.transitions = [] # every QoSTransition so far
+
+    ##### current level #####
+
+    @property
+    def level(self): # function to return the current QoSLevel
+
+        return self.levels[self.index]
+
+    ##### time loop #####
+
+    def begin_loop(self, now=None): # function to mark the start of a loop, returns the time for stage()
+
+        self.loop_start = time.monotonic() if now is None else now
+        self.loop_excluded = 0.0
+
+        return self.loop_start
+
+    def stage(self, name, start, now=None, budgeted=True): # function to record a stage that began at start, returns now for the next stage
+
+        now = time.monotonic() if now is None else now
+        self._record(name, now - start)
+
+        if not budgeted: # no level makes this stage faster, so it cannot miss the deadline either
+
+            self.loop_excluded += now - start
+
+        return now
+
+    def end_loop(self, now=None): # function to close the loop, count a miss and judge the window once it is full
+
+        if self.loop_start is None:
+
+            return
+
+        now = time.monotonic() if now is None else now
+        duration = now - self.loop_start - self.loop_excluded
+        self.loop_start = None
+        self.loops += 1
+        self.window_times.append(duration)
+
+        if duration > self.deadline:
+
+            self.deadline_misses += 1
+            self.window_misses += 1
+
+        if len(self.window_times) >= self.window:
+
+            self._judge_window(now)
+
+    def _record(self, name, seconds): # function to keep a latency for the stage metrics
+
+        with self.stats_lock:
+
+            times = self.stage_times.get(name)
+
+            if times is None:
+
+                times = self.stage_times[name] = collections.deque(maxlen=QOS_STAGE_HISTORY)
+
+            times.append(seconds)
+
+    ##### time vision results #####
+
+    @property
+    def result_budget(self): # function to return the seconds the vision worker may take per frame at the current level
+
+        return self.deadline * self.level.inference_stride # the next frame it is handed arrives this much later
+
+    def result(self, latency): # function to record the capture-to-publish latency of a vision result, e.g. result.completed - result.timestamp
+
+        self._record("vision result", latency)
+        self.results += 1
+        self.window_results.append(latency)
+
+        if latency > self.result_budget:
+
+            self.result_misses += 1
+            self.window_result_misses += 1
+
+    ##### skip inference #####
+
+    def should_infer(self, sequence): # function to decide whether inference runs on a frame at the current level
+
+        return sequence % self.level.inference_stride == 0
+
+    ##### judge window #####
+
+    def _judge_window(self, now): # function to step down or up on a full window
+
+        miss_ratio = self.window_misses / len(self.window_times)
+        p95 = float(np.percentile(self.window_times, 95))
+        result_p95 = 0.0
+
+        if self.window_results: # the worker's own misses count as much as the loop's
+
+            miss_ratio = max(miss_ratio, self.window_result_misses / len(self.window_results))
+            result_p95 = float(np.percentile(self.window_results, 95))
+
+        headroom = (
+            not self.window_misses and not self.window_result_misses
+            and p95 < QOS_STEP_UP_HEADROOM * self.deadline and result_p95 < QOS_STEP_UP_HEADROOM * self.result_budget
+        )
+        self.headroom_windows = self.headroom_windows + 1 if headroom else 0
+
+        if miss_ratio > QOS_STEP_DOWN_MISSES and self.index + 1 < len(self.levels):
+
+            self._apply(self.index + 1, now, miss_ratio, p95, result_p95)
+
+        elif self.headroom_windows >= QOS_STEP_UP_WINDOWS and self.index > 0:
+
+            self._apply(self.index - 1, now, miss_ratio, p95, result_p95)
+
+        self.window_times = []
+        self.window_misses = 0
+        self.window_results = []
+        self.window_result_misses = 0
+
+    ##### change level #####
+
+    def _apply(self, index, now, miss_ratio, p95, result_p95): # function to switch to another level and reconfigure what it affects
+
+        stepping_down = index > self.index
+        self.headroom_windows = 0
+        old, new = self.levels[self.index], self.levels[index]
+        self.index = index
+        transition = QoSTransition(now, old.name, new.name, round(miss_ratio, 3), round(p95 * 1000, 2), round(result_p95 * 1000, 2))
+
+        with self.stats_lock:
+
+            self.transitions.append(transition)
+
+        message = f"QoS {old.name} -> {new.name} ({miss_ratio:.0%} deadline misses, p95 loop {p95 * 1000:.1f} ms, p95 vision result {result_p95 * 1000:.1f} ms).\n"
+
+        if stepping_down:
+
+            logging.warning(f"WARNING (qos_governor.py): {message}")
+
+        else:
+
+            logging.info(message)
+
+        if self.decoder is not None and old.decode_reduction != new.decode_reduction:
+
+            width, height = self.base_target_size
+            self.decoder.set_target_size((width // new.decode_reduction, height // new.decode_reduction))
+
+        if self.vision is not None and (old.inference_stride, old.decode_reduction) != (new.inference_stride, new.decode_reduction):
+
+            self.vision.set_quality(new.inference_stride, new.decode_reduction)
+
+        if self.camera is not None and old.camera != new.camera:
+
+            width, height, framerate = new.camera or self.base_camera
+
+            if self.vision is not None: # announced first, so the worker knows the new frames when they arrive
+
+                self.vision.set_camera_size(width, height)
+
+            self.camera.reconfigure(width, height, framerate)
+
+    ##### report statistics #####
+
+    def stats(self): # function to summarize the level, transitions, deadline misses and stage latencies
+
+        with self.stats_lock: # snapshot, the control thread keeps appending
+
+            stage_times = {name: list(times) for name, times in self.stage_times.items()}
+            transitions = list(self.transitions)
+
+        stages = {}
+
+        for name, times in stage_times.items():
+
+            milliseconds = np.array(times) * 1000
+            stages[name] = {
+                'mean_ms': round(float(milliseconds.mean()), 3),
+                'p95_ms': round(float(np.percentile(milliseconds, 95)), 3),
+            }
+
+        return {
+            'level': self.index,
+            'level_name': self.level.name,
+            'loops': self.loops,
+            'deadline_misses': self.deadline_misses,
+            'results': self.results,
+            'result_misses': self.result_misses,
+            'transitions': [transition._asdict() for transition in transitions],
+            'stages': stages,
+        }
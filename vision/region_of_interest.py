@@ -0,0 +1,126 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import numpy as np # import numpy for box bounds
+
+##### import necessary functions #####
+
+from vision.frame_decode import MODEL_INPUT_SIZE # import model input size to size regions
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### region hyperparameters #####
+
+ROI_FULL_SCAN_INTERVAL = 10 # every this many frames the whole frame is scanned for new people
+ROI_PADDING = 0.5 # margin added on every side of the detections, relative to their extent
+
+
+
+
+
+##################################################
+############### REGION OF INTEREST ###############
+##################################################
+
+
+########## REGION OF INTEREST ##########
+
+class RegionOfInterest: # class picking the part of the frame the detector looks at
+
+    """
+    Crops the detector input to a padded square around the previous frame's detections,
+    so people cover more of the 256x256 model input than in a squashed full frame.
+    Regions are square (the model input is) and never smaller than the model input, so
+    crops are only ever scaled down. The whole frame is scanned when there is nothing to
+    follow, when the padded detections do not fit a square inside the frame, and every
+    full_scan_interval frames so people entering the scene are picked up.
+
+    Usage: region = roi.plan(frame_size) before inference, offset the detections by the
+    region's corner, then roi.update(detections) with full-frame boxes.
+    """
+
+    ##### initialize region #####
+
+    def __init__(self, full_scan_interval=ROI_FULL_SCAN_INTERVAL, padding=ROI_PADDING, min_size=min(MODEL_INPUT_SIZE)): # function to start with a full scan
+
+        self.full_scan_interval = full_scan_interval # longest run of cropped frames
+        self.padding = padding # relative margin around the detections
+        self.min_size = min_size # smallest region side in frame pixels
+        self.bounds = None # (x0, y0, x1, y1) around the last detections, None if there were none
+        self.region = None # (x0, y0, x1, y1) of the last planned region
+        self.frames_since_scan = 0 # frames cropped since the last full scan
+
+        ##### statistics #####
+
+        self.frames = 0 # regions planned
+        self.full_scans = 0 # regions covering the whole frame
+
+    ##### plan region #####
+
+    def plan(self, frame_size): # function to pick the region of the next frame to run the detector on
+
+        self.frames += 1
+        width, height = frame_size
+        self.region = (0, 0, width, height)
+
+        if self.bounds is None or self.frames_since_scan + 1 >= self.full_scan_interval: # nothing to follow or scan due
+
+            return self._full_scan()
+
+        x0, y0, x1, y1 = self.bounds
+        center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+        side = max(x1 - x0, y1 - y0) * (1 + 2 * self.padding)
+        side = int(np.ceil(max(side, self.min_size)))
+
+        if side >= min(width, height): # a square crop would cut people off or gain nothing
+
+            return self._full_scan()
+
+        ##### shift the square inside the frame #####
+
+        left = int(np.clip(round(center_x - side / 2), 0, width - side))
+        top = int(np.clip(round(center_y - side / 2), 0, height - side))
+        self.frames_since_scan += 1
+        self.region = (left, top, left + side, top + side)
+
+        return self.region
+
+    def _full_scan(self): # function to plan the whole frame
+
+        self.frames_since_scan = 0
+        self.full_scans += 1
+
+        return self.region
+
+    ##### update detections #####
+
+    def update(self, detections): # function to remember where the people are, in full-frame pixels
+
+        if len(detections):
+
+            self.bounds = (float(detections['x0'].min()), float(detections['y0'].min()),
+                           float(detections['x1'].max()), float(detections['y1'].max()))
+
+        else:
+
+            self.bounds = None
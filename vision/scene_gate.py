@@ -0,0 +1,118 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import numpy as np # import numpy for thumbnail differences
+import cv2 # import opencv to shrink frames
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### gate hyperparameters #####
+
+SCENE_THUMBNAIL_SIZE = (64, 48) # (width, height) of the grayscale thumbnail frames are compared at
+SCENE_CHANGE_THRESHOLD = 4.0 # mean absolute grayscale difference (0-255) that counts as a change
+SCENE_REFRESH_INTERVAL = 30 # frames a result may be reused before inference is forced, about 1 s at 30 fps
+
+
+
+
+
+#################################################
+############### SCENE CHANGE GATE ###############
+#################################################
+
+
+########## SCENE CHANGE GATE ##########
+
+class SceneChangeGate: # class deciding whether a frame is worth running inference on
+
+    """
+    Cheap change detector placed in front of inference. Each frame is shrunk to a small
+    grayscale thumbnail and compared with the thumbnail of the frame the current result
+    came from, so slow drift still adds up to a change. While the scene is static the last
+    result is reused and its age (frames since it was computed) counts up; once the age
+    reaches refresh_interval inference runs anyway.
+
+    Usage: if gate.should_infer(frame): gate.store(infer(frame)), then use gate.result
+    and gate.age either way. When results come back frames later (an async engine), keep
+    gate.thumbnail.copy() with the submission and hand it to store() with the result.
+    """
+
+    ##### initialize gate #####
+
+    def __init__(self, threshold=SCENE_CHANGE_THRESHOLD, refresh_interval=SCENE_REFRESH_INTERVAL, thumbnail_size=SCENE_THUMBNAIL_SIZE): # function to allocate thumbnail buffers
+
+        self.threshold = threshold # mean difference that counts as a change
+        self.refresh_interval = refresh_interval # longest reuse of one result in frames
+        self.thumbnail_size = thumbnail_size # comparison resolution
+        width, height = thumbnail_size
+        self.small = np.empty((height, width, 3), dtype=np.uint8) # reused shrunken frame
+        self.thumbnail = np.empty((height, width), dtype=np.uint8) # reused thumbnail of the current frame
+        self.reference = np.empty((height, width), dtype=np.uint8) # thumbnail the result was computed on
+        self.difference = np.empty((height, width), dtype=np.uint8) # reused difference buffer
+        self.result = None # last inference result
+        self.age = 0 # frames since the result was computed
+
+        ##### statistics #####
+
+        self.frames_checked = 0 # frames passed through the gate
+        self.inferences_skipped = 0 # frames that reused the last result
+
+    ##### check frame #####
+
+    def should_infer(self, frame): # function to compare a BGR frame with the reference thumbnail
+
+        self.frames_checked += 1
+        cv2.resize(frame, self.thumbnail_size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.thumbnail)
+
+        if self.result is None or self.age + 1 >= self.refresh_interval: # nothing to reuse or result too old
+
+            return True
+
+        cv2.absdiff(self.thumbnail, self.reference, dst=self.difference)
+
+        if cv2.mean(self.difference)[0] > self.threshold: # if the scene changed...
+
+            return True
+
+        self.age += 1
+        self.inferences_skipped += 1
+
+        return False
+
+    ##### store result #####
+
+    def store(self, result, thumbnail=None): # function to keep a fresh result and the thumbnail of its frame, the latest checked one by default, as the new reference
+
+        self.result = result
+        self.age = 0
+        self.reference[:] = self.thumbnail if thumbnail is None else thumbnail
+
+        return result
+
+    ##### reset gate #####
+
+    def reset(self): # function to force inference on the next frame, e.g. after the robot moved
+
+        self.result = None
+        self.age = 0
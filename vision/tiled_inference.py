@@ -0,0 +1,174 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import numpy as np # import numpy for the batch buffer and tile offsets
+from openvino.runtime import Tensor # import openvino tensors to share the batch buffer
+
+##### import necessary functions #####
+
+from vision.frame_decode import MODEL_INPUT_SIZE # import model input size as the tile size
+from vision.detection_postprocess import postprocess_detections, valid_rows, DETECTION_CONFIDENCE, DETECTION_NMS_IOU, RAW_IMAGE_ID, RAW_BOX # import detection post-processing
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### tiling hyperparameters #####
+
+TILE_SIZE = MODEL_INPUT_SIZE[0] # square tiles, fed to the model without resizing
+TILE_OVERLAP = 64 # smallest overlap between neighbouring tiles in pixels, so people on a seam appear whole in one tile
+
+
+
+
+
+###########################################
+############### TILE LAYOUT ###############
+###########################################
+
+
+########## TILE POSITIONS ##########
+
+def tile_positions(length, tile_size=TILE_SIZE, overlap=TILE_OVERLAP): # function to spread tiles evenly along one axis
+
+    if length <= tile_size: # one tile, padded past the frame edge
+
+        return np.zeros(1, dtype=np.int64)
+
+    count = int(np.ceil((length - overlap) / (tile_size - overlap)))
+
+    return np.round(np.linspace(0, length - tile_size, count)).astype(np.int64)
+
+
+########## TILE LAYOUT ##########
+
+def tile_layout(frame_size, tile_size=TILE_SIZE, overlap=TILE_OVERLAP): # function to list the tile origins covering a frame
+
+    """
+    (N, 2) array of (x, y) tile origins covering a frame of frame_size (width, height)
+    with tiles of tile_size overlapping by at least overlap pixels, row by row. N is the
+    batch size the model has to be compiled for.
+    """
+
+    width, height = frame_size
+    xs = tile_positions(width, tile_size, overlap)
+    ys = tile_positions(height, tile_size, overlap)
+
+    return np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+
+
+
+
+###############################################
+############### TILED INFERENCE ###############
+###############################################
+
+
+########## TILED INFER REQUEST ##########
+
+class TiledInferRequest: # class running one batched inference over the tiles of a full resolution frame
+
+    """
+    Long-range detection on full resolution frames. The frame is cut into overlapping
+    TILE_SIZE tiles that the model sees at native resolution, all of them in one batched
+    request. The model must be compiled with load_and_compile_model(...,
+    frame_size=(TILE_SIZE, TILE_SIZE), batch_size=len(tile_layout(frame_size))).
+
+    The tile layout and the copies into the shared uint8 [N, TILE_SIZE, TILE_SIZE, 3]
+    batch buffer are worked out once per resolution, so a frame costs N slice copies.
+    postprocess() moves every tile's boxes into frame coordinates and runs NMS across
+    tiles, merging people seen twice on a seam.
+    """
+
+    ##### initialize request #####
+
+    def __init__(self, compiled_model, tile_size=TILE_SIZE, overlap=TILE_OVERLAP): # function to create the request and its shared batch buffer
+
+        self.request = compiled_model.create_infer_request()
+        self.buffer = np.zeros(tuple(compiled_model.input(0).shape), dtype=np.uint8) # reused NHWC batch
+        self.request.set_input_tensor(Tensor(self.buffer, shared_memory=True))
+        self.tile_size = tile_size # tile side in pixels
+        self.overlap = overlap # smallest overlap between tiles
+        self.layouts = {} # (width, height) -> (tile origins, copy plan)
+        self.frame_size = None # (width, height) of the last frame
+
+    ##### plan tiles #####
+
+    def _prepare(self, frame_size): # function to work out the tile origins and slice copies for a resolution
+
+        if frame_size in self.layouts:
+
+            return self.layouts[frame_size]
+
+        origins = tile_layout(frame_size, self.tile_size, self.overlap)
+
+        if len(origins) != len(self.buffer):
+
+            raise ValueError(f"{frame_size[0]}x{frame_size[1]} frames need {len(origins)} tiles, the model takes a batch of {len(self.buffer)}")
+
+        copies = []
+
+        for index, (x, y) in enumerate(origins.tolist()): # frame slice -> buffer view, clipped at the frame edge
+
+            width = min(self.tile_size, frame_size[0] - x)
+            height = min(self.tile_size, frame_size[1] - y)
+            copies.append(((slice(y, y + height), slice(x, x + width)), self.buffer[index, :height, :width]))
+
+        self.buffer[:] = 0 # padding past the frame edge stays black
+        self.layouts[frame_size] = (origins, copies)
+
+        return self.layouts[frame_size]
+
+    ##### run inference #####
+
+    def infer(self, frame): # function to run batched inference on the tiles of a decoded BGR frame
+
+        self.frame_size = (frame.shape[1], frame.shape[0])
+        _, copies = self._prepare(self.frame_size)
+
+        for source, destination in copies:
+
+            np.copyto(destination, frame[source])
+
+        self.request.infer()
+
+        return self.request.get_output_tensor(0).data
+
+    ##### merge tiles #####
+
+    def postprocess(self, output, frame_size=None, confidence_threshold=DETECTION_CONFIDENCE, iou_threshold=DETECTION_NMS_IOU): # function to merge tile detections into frame detections
+
+        """
+        Rewrites every row's tile-normalized box as a frame-normalized one, then hands the
+        rows to postprocess_detections for thresholding, scaling, clipping and NMS across
+        all tiles. output is not modified, so a stored result can be postprocessed again.
+        """
+
+        frame_size = self.frame_size if frame_size is None else frame_size
+        origins, _ = self._prepare(frame_size)
+        rows = valid_rows(output).copy() # the valid rows of every tile, before the end marker
+        width, height = frame_size
+        scale = np.array([width, height, width, height], dtype=np.float32)
+        offsets = origins[rows[:, RAW_IMAGE_ID].astype(np.int64)][:, [0, 1, 0, 1]]
+        rows[:, RAW_BOX] = (rows[:, RAW_BOX] * self.tile_size + offsets) / scale
+
+        return postprocess_detections(rows, frame_size, confidence_threshold, iou_threshold)
@@ -0,0 +1,425 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import collections # import collections for the result record
+import multiprocessing # import multiprocessing for the vision process
+from multiprocessing import shared_memory # import shared memory for frame and detection handoff
+import time # import time for result timestamps
+import logging # import logging for debugging
+import numpy as np # import numpy for shared buffers
+
+##### import necessary functions #####
+
+from initialize.initialize_opencv import load_and_compile_model # import model loader
+from vision.frame_decode import FrameDecoder, decoded_frame_size, jpeg_dimensions, MODEL_INPUT_SIZE # import reduced-scale decoder
+from vision.yuv_reader import yuv420_frame_size # import raw frame size
+from vision.inference_engine import FrameInferRequest # import reused infer request
+from vision.detection_postprocess import DETECTION_DTYPE, postprocess_detections, scale_detections # import detection record and post-processing
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### vision result record #####
+
+# sequence and timestamp are those of the camera frame the detections came from, completed is
+# time.monotonic() when the worker published them, detections is a DETECTION_DTYPE array in the
+# pixels of that frame and frame_size is its (width, height), which changes when the camera is reconfigured
+VisionResult = collections.namedtuple('VisionResult', ['sequence', 'timestamp', 'completed', 'detections', 'frame_size'])
+
+##### worker hyperparameters #####
+
+VISION_MAX_DETECTIONS = 200 # detections per frame, person-detection-0200 outputs at most 200
+VISION_POLL_TIMEOUT = 0.5 # seconds the worker waits for a frame before re-checking for shutdown
+
+##### double buffer header columns #####
+
+HEADER_VERSION = 0 # odd while the slot is being written
+HEADER_SEQUENCE = 1 # sequence of the data in the slot, 0 while empty
+HEADER_COUNT = 2 # valid items in the slot
+HEADER_TIMESTAMP = 3 # frame timestamp in nanoseconds
+HEADER_COMPLETED = 4 # publish time in nanoseconds
+HEADER_WIDTH = 5 # width of the frame the data belongs to, 0 if not given
+HEADER_HEIGHT = 6 # height of the frame the data belongs to, 0 if not given
+HEADER_COLUMNS = 7
+
+
+
+
+
+####################################################
+############### SHARED DOUBLE BUFFER ###############
+####################################################
+
+
+########## SHARED DOUBLE BUFFER ##########
+
+class SharedDoubleBuffer: # class passing the newest array between processes without pickling
+
+    """
+    Single producer, single consumer, latest-wins handoff of a variable length array
+    through shared memory. The producer alternates between two slots, so it never writes
+    the slot the consumer most likely reads. Each slot carries a version counter that is
+    odd while the slot is written (a seqlock): the consumer copies the newest slot and
+    keeps the copy only if the version did not move meanwhile, so neither side ever
+    waits on a lock.
+
+    The creating process owns the memory (close() unlinks it); the other process attaches
+    by name.
+    """
+
+    ##### initialize buffer #####
+
+    def __init__(self, capacity, dtype, name=None): # function to create the shared slots, or attach to them by name
+
+        self.capacity = capacity # items per slot
+        self.dtype = np.dtype(dtype) # item type
+        self.owner = name is None # whether close() unlinks the memory
+        size = HEADER_COLUMNS * 2 * 8 + 2 * capacity * self.dtype.itemsize
+
+        if self.owner:
+
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+
+        else:
+
+            self.memory = shared_memory.SharedMemory(name=name)
+
+        self.name = self.memory.name # name the other process attaches with
+        self.header = np.ndarray((2, HEADER_COLUMNS), dtype=np.int64, buffer=self.memory.buf)
+        self.slots = np.ndarray((2, capacity), dtype=self.dtype, buffer=self.memory.buf, offset=self.header.nbytes)
+        self.next_slot = 0 # slot the producer writes next
+
+        if self.owner:
+
+            self.header[:] = 0
+
+    ##### publish #####
+
+    def publish(self, data, sequence, timestamp=0.0, completed=0.0, frame_size=(0, 0)): # function to write data into the free slot, returns False if it does not fit
+
+        if len(data) > self.capacity:
+
+            return False
+
+        slot = self.next_slot
+        header = self.header[slot]
+        header[HEADER_VERSION] += 1 # odd, readers discard this slot
+        self.slots[slot, :len(data)] = data
+        header[HEADER_SEQUENCE] = sequence
+        header[HEADER_COUNT] = len(data)
+        header[HEADER_TIMESTAMP] = int(timestamp * 1e9)
+        header[HEADER_COMPLETED] = int(completed * 1e9)
+        header[HEADER_WIDTH], header[HEADER_HEIGHT] = frame_size
+        header[HEADER_VERSION] += 1 # even again, slot is consistent
+        self.next_slot = 1 - slot
+
+        return True
+
+    ##### read latest #####
+
+    def read_latest(self, after_sequence=0): # function to copy the newest slot newer than after_sequence, returns (sequence, timestamp, completed, data, frame_size) or None
+
+        for slot in np.argsort(-self.header[:, HEADER_SEQUENCE]).tolist(): # newest first
+
+            header = self.header[slot]
+            version = int(header[HEADER_VERSION])
+            sequence = int(header[HEADER_SEQUENCE])
+
+            if sequence <= after_sequence: # nothing newer in this or the older slot
+
+                return None
+
+            if version % 2: # producer is writing it
+
+                continue
+
+            count = int(header[HEADER_COUNT])
+            timestamp = int(header[HEADER_TIMESTAMP]) / 1e9
+            completed = int(header[HEADER_COMPLETED]) / 1e9
+            frame_size = (int(header[HEADER_WIDTH]), int(header[HEADER_HEIGHT]))
+            data = self.slots[slot, :count].copy()
+
+            if int(header[HEADER_VERSION]) == version and int(header[HEADER_SEQUENCE]) == sequence: # not overwritten while copying
+
+                return sequence, timestamp, completed, data, frame_size
+
+        return None
+
+    ##### release #####
+
+    def close(self): # function to drop the views and the mapping, unlinking it in the owner
+
+        del self.header, self.slots # release views before closing the mapping
+        self.memory.close()
+
+        if self.owner:
+
+            self.memory.unlink()
+
+
+
+
+
+#############################################
+############### VISION WORKER ###############
+#############################################
+
+
+########## WORKER PROCESS ##########
+
+def _vision_process(model_xml_path, device_name, width, height, codec, frames_name, frames_capacity, results_name, frame_ready, closing, decode_reduction, camera_size): # function run in the vision process
+
+    frames = SharedDoubleBuffer(frames_capacity, np.uint8, frames_name)
+    results = SharedDoubleBuffer(VISION_MAX_DETECTIONS, DETECTION_DTYPE, results_name)
+
+    try:
+
+        ##### load the model in the child, the control process never touches it #####
+
+        compiled_model, _, _ = load_and_compile_model(model_xml_path, device_name, decoded_frame_size((width, height), codec))
+
+        if compiled_model is None:
+
+            logging.error("ERROR (vision_worker.py): Vision worker has no model, exiting.\n")
+            raise SystemExit(1) # non-zero exit code, the control process reports it
+
+        decoder = FrameDecoder(frame_size=(width, height))
+        request = FrameInferRequest(compiled_model)
+        last_sequence = 0
+        reduction = 1 # decode reduction the decoder is set to
+        raw_sizes = {yuv420_frame_size(width, height): (width, height)} # raw frame bytes -> (width, height) for every camera size announced so far
+
+        while not closing.is_set():
+
+            ##### take the newest frame #####
+
+            if not frame_ready.wait(VISION_POLL_TIMEOUT):
+
+                continue
+
+            frame_ready.clear()
+            latest = frames.read_latest(last_sequence)
+
+            if latest is None:
+
+                continue
+
+            last_sequence, timestamp, _, data, _ = latest
+
+            ##### find the frame size, the camera may have been reconfigured #####
+
+            if codec == "yuv420": # frames still in flight at the old size are told apart by their length
+
+                with camera_size.get_lock():
+
+                    size = tuple(camera_size)
+
+                raw_sizes.setdefault(yuv420_frame_size(*size), size)
+                frame_size = raw_sizes.get(len(data))
+
+                if frame_size is None:
+
+                    logging.debug(f"Vision worker skipped a {len(data)} byte frame of no announced camera size.")
+                    continue
+
+                decoder.frame_size = frame_size
+
+            else:
+
+                frame_size = jpeg_dimensions(data) or (width, height)
+
+            ##### decode, infer and post-process #####
+
+            if decode_reduction.value != reduction: # the qos governor changed the decode scale
+
+                reduction = decode_reduction.value
+                decoder.set_target_size((MODEL_INPUT_SIZE[0] // reduction, MODEL_INPUT_SIZE[1] // reduction))
+
+            frame = decoder.decode(data if codec == "yuv420" else memoryview(data))
+
+            if frame is None:
+
+                continue
+
+            detections = postprocess_detections(request.infer(frame), (frame.shape[1], frame.shape[0]))
+            detections = scale_detections(detections, frame_size[0] / frame.shape[1], frame_size[1] / frame.shape[0]) # report boxes in camera pixels
+            results.publish(detections[:VISION_MAX_DETECTIONS], last_sequence, timestamp, time.monotonic(), frame_size)
+
+    except Exception as e:
+
+        logging.error(f"ERROR (vision_worker.py): Vision worker failed: {e}\n")
+        raise SystemExit(1)
+
+    finally:
+
+        frames.close()
+        results.close()
+
+
+########## VISION WORKER ##########
+
+class VisionWorker: # class running decode, inference and post-processing in their own process
+
+    """
+    Moves the whole vision stack out of the control process, so decoding and OpenCV/
+    OpenVINO work never hold the GIL the pigpio callbacks and servo writes need. The
+    control loop submit()s camera frames into a shared double buffer and picks up the
+    newest detections with latest(); both calls are a copy and never wait for the worker.
+    Frames the worker did not get to are simply overwritten, so it always works on the
+    newest one. Nothing is pickled: frames and detection arrays only ever travel through
+    shared memory, tagged with the frame's sequence number. Boxes are in the pixels of the
+    frame they came from, whose size each result carries: JPEG frames are measured from
+    their header, raw frames need set_camera_size() whenever the camera is reconfigured.
+
+    Start it before any other threads exist: the worker process is forked, since a spawned
+    child would re-import control_logic.py and start the robot again. If the worker dies
+    (e.g. its model fails to compile), latest() logs it once and sets failed instead of
+    quietly returning nothing forever.
+    """
+
+    ##### initialize worker #####
+
+    def __init__(self, model_xml_path, width=640, height=480, codec="mjpeg", device_name="MYRIAD"): # function to allocate the shared buffers
+
+        self.model_xml_path = model_xml_path # model the worker loads
+        self.device_name = device_name # preferred inference device
+        self.width = width # camera frame width at start, the shared buffer is sized for it
+        self.height = height # camera frame height at start
+        self.codec = codec # mjpeg or yuv420
+        self.context = multiprocessing.get_context("fork")
+        self.frame_ready = self.context.Event() # wakes the worker when a frame was submitted
+        self.closing = self.context.Event() # tells the worker to finish
+        self.frames = SharedDoubleBuffer(width * height * 3, np.uint8) # room for a raw or jpeg frame
+        self.results = SharedDoubleBuffer(VISION_MAX_DETECTIONS, DETECTION_DTYPE)
+        self.process = None # vision process
+        self.last_result_sequence = 0 # sequence of the last result handed out
+        self.inference_stride = 1 # only every nth frame is handed to the worker
+        self.failed = False # the vision process exited on its own
+        self.decode_reduction = self.context.Value('i', 1, lock=False) # divides the size the worker decodes frames to
+        self.camera_size = self.context.Array('i', [width, height]) # current camera (width, height), to read raw frames
+
+        ##### statistics #####
+
+        self.frames_submitted = 0 # frames handed to the worker
+        self.frames_oversized = 0 # frames too large for the shared buffer
+        self.frames_strided = 0 # frames left out by the inference stride
+        self.results_read = 0 # results handed out by latest()
+
+    ##### start and stop #####
+
+    def start(self): # function to fork the vision process
+
+        self.process = self.context.Process(
+            target=_vision_process,
+            args=(
+                self.model_xml_path, self.device_name, self.width, self.height, self.codec,
+                self.frames.name, self.frames.capacity, self.results.name,
+                self.frame_ready, self.closing, self.decode_reduction, self.camera_size,
+            ),
+            name="vision-worker",
+            daemon=True,
+        )
+        self.process.start()
+        logging.info("Vision worker started.\n")
+
+        return self
+
+    def stop(self, timeout=5.0): # function to stop the vision process and free shared memory
+
+        if self.process is not None:
+
+            self.closing.set()
+            self.frame_ready.set() # wake the worker so it notices
+            self.process.join(timeout)
+
+            if self.process.is_alive():
+
+                self.process.terminate()
+                self.process.join(timeout)
+
+            self.process = None
+
+        self.frames.close()
+        self.results.close()
+        logging.info(f"Vision worker got {self.frames_submitted} frames ({self.frames_oversized} too large, {self.frames_strided} left out), returned {self.results_read} results.\n")
+
+    ##### change quality #####
+
+    def set_quality(self, inference_stride, decode_reduction): # function to take a qos level's inference stride and decode reduction
+
+        self.inference_stride = inference_stride
+        self.decode_reduction.value = decode_reduction # the worker re-picks its decode scale on the next frame
+        logging.info(f"Vision worker inferring every {inference_stride} frames at 1/{decode_reduction} decode size.\n")
+
+    def set_camera_size(self, width, height): # function to tell the worker the camera's frame size after a reconfigure
+
+        with self.camera_size.get_lock(): # the worker never sees half of an update
+
+            self.camera_size[:] = [width, height]
+
+    ##### submit frame #####
+
+    def submit(self, frame): # function to hand a camera Frame to the worker, replacing any frame it has not started on
+
+        if frame.sequence % self.inference_stride: # shed by the qos governor, not even copied
+
+            self.frames_strided += 1
+            return False
+
+        data = frame.data if isinstance(frame.data, np.ndarray) else np.frombuffer(frame.data, dtype=np.uint8)
+
+        if not self.frames.publish(data, frame.sequence, frame.timestamp):
+
+            self.frames_oversized += 1
+            return False
+
+        self.frame_ready.set()
+        self.frames_submitted += 1
+
+        return True
+
+    ##### read result #####
+
+    def latest(self): # function to return the newest VisionResult not handed out yet, or None
+
+        latest = self.results.read_latest(self.last_result_sequence)
+
+        if latest is None:
+
+            if not self.failed and self.process is not None and not self.process.is_alive(): # no result will ever come
+
+                self.failed = True
+                logging.error(f"ERROR (vision_worker.py): Vision process exited (code {self.process.exitcode}), no more detections.\n")
+
+            return None
+
+        self.last_result_sequence = latest[0]
+        self.results_read += 1
+
+        return VisionResult(*latest)
+
+    ##### worker state #####
+
+    @property
+    def alive(self): # function to check whether the vision process is still running
+
+        return self.process is not None and self.process.is_alive()
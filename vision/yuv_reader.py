@@ -0,0 +1,154 @@
+##################################################################################
+# Copyright (c) 2024 Matthew Thomas Beck                                         #
+#                                                                                #
+# All rights reserved. This code and its associated files may not be reproduced, #
+# modified, distributed, or otherwise used, in part or in whole, by any person   #
+# or entity without the express written permission of the copyright holder,      #
+# Matthew Thomas Beck.                                                           #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### import necessary libraries #####
+
+import numpy as np # import numpy for preallocated frames
+import cv2 # import opencv for colour conversion
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### reader hyperparameters #####
+
+YUV_POOL_SIZE = 4 # number of preallocated frames handed out in rotation
+
+
+
+
+
+###################################################
+############### YUV420 FRAME READER ###############
+###################################################
+
+
+########## FRAME SIZE ##########
+
+def yuv420_frame_size(width, height): # function to return the bytes in one planar I420 frame as written by rpicam-vid --codec yuv420
+
+    return width * height + 2 * ((width // 2) * (height // 2)) # widths that are a multiple of 64 have no row padding
+
+
+########## YUV420 READER ##########
+
+class YUV420Reader: # class reading raw I420 frames into a pool of preallocated arrays
+
+    """
+    Reads fixed-size YUV420 frames with readinto straight into a rotating pool of
+    preallocated NumPy arrays. Nothing is parsed or decoded; a returned frame stays valid
+    until the pool wraps around, pool_size reads later. stream is any binary stream with
+    readinto, e.g. camera_process.stdout or an open file.
+    """
+
+    ##### initialize reader #####
+
+    def __init__(self, stream, width, height, pool_size=YUV_POOL_SIZE): # function to preallocate the frame pool
+
+        self.stream = stream # binary stream frames are read from
+        self.width = width # frame width
+        self.height = height # frame height
+        self.frame_size = yuv420_frame_size(width, height) # bytes per frame
+        self.pool = [np.empty(self.frame_size, dtype=np.uint8) for _ in range(pool_size)] # frames handed out in rotation
+        self.views = [memoryview(frame) for frame in self.pool] # readinto targets
+        self.index = 0 # pool frame filled next
+        self.frames_read = 0 # frames read so far
+        self.resized = {} # preallocated I420 buffers keyed by output size
+
+    ##### read frame #####
+
+    def read(self): # function to fill the next pool frame, returns the flat uint8 I420 frame or None at end of stream
+
+        view = self.views[self.index]
+        filled = 0
+
+        while filled < self.frame_size: # pipes hand out partial reads
+
+            count = self.stream.readinto(view[filled:])
+
+            if not count:
+
+                return None
+
+            filled += count
+
+        frame = self.pool[self.index]
+        self.index = (self.index + 1) % len(self.pool)
+        self.frames_read += 1
+
+        return frame
+
+    ##### frame views #####
+
+    def y_plane(self, frame): # function to return the (height, width) luma of a frame from read(), no copy
+
+        return frame[:self.width * self.height].reshape(self.height, self.width)
+
+    def to_bgr(self, frame, size=None): # function to convert a frame from read() to BGR, see i420_to_bgr
+
+        return i420_to_bgr(frame, self.width, self.height, size, self.resized)
+
+
+########## COLOUR CONVERSION ##########
+
+def i420_to_bgr(frame, width, height, size=None, buffers=None): # function to convert a flat I420 frame to BGR
+
+    """
+    When size (width, height, both even) is given the planes are resized first, so the
+    colour conversion only touches the pixels the model will see. buffers, if given, is a
+    dict of preallocated I420 buffers keyed by output size that is reused across calls.
+    """
+
+    if size is None:
+
+        return cv2.cvtColor(frame.reshape(height * 3 // 2, width), cv2.COLOR_YUV2BGR_I420)
+
+    out_width, out_height = size
+    luma_size = width * height
+    chroma_width, chroma_height = width // 2, height // 2
+    chroma_size = chroma_width * chroma_height
+
+    resized = buffers.get(size) if buffers is not None else None
+
+    if resized is None:
+
+        resized = np.empty(out_width * out_height * 3 // 2, dtype=np.uint8)
+
+        if buffers is not None:
+
+            buffers[size] = resized
+
+    out_luma = out_width * out_height
+    out_chroma = (out_width // 2) * (out_height // 2)
+
+    cv2.resize(
+        frame[:luma_size].reshape(height, width), (out_width, out_height),
+        dst=resized[:out_luma].reshape(out_height, out_width), interpolation=cv2.INTER_LINEAR
+    )
+
+    for plane in range(2): # resize U then V
+
+        source = frame[luma_size + plane * chroma_size:luma_size + (plane + 1) * chroma_size]
+        target = resized[out_luma + plane * out_chroma:out_luma + (plane + 1) * out_chroma]
+        cv2.resize(
+            source.reshape(chroma_height, chroma_width), (out_width // 2, out_height // 2),
+            dst=target.reshape(out_height // 2, out_width // 2), interpolation=cv2.INTER_LINEAR
+        )
+
+    return cv2.cvtColor(resized.reshape(out_height * 3 // 2, out_width), cv2.COLOR_YUV2BGR_I420)